@@ -0,0 +1,331 @@
+""" Benchmark suite for `calculate_survival_probability` of all scenario types.
+
+Synthetic asset sets of increasing size are generated around Santa Rosa, CA and
+every scenario is evaluated with offline fixtures: the fire perimeter, hurricane
+track and flood gauges are synthetic, and elevations normally read from the
+local DEM tiles are sampled from a synthetic terrain raster.
+
+Results are written to a JSON file with one record per scenario and asset count,
+holding the time spent in each stage, the survival probability throughput, the
+peak memory traced while calculating survival probabilities and the spans and
+counters recorded by `erad.utils.instrumentation` during the timed evaluations.
+
+Usage:
+    python benchmarks/scenario_benchmarks.py --sizes 1000 10000 100000 1000000
+    python benchmarks/scenario_benchmarks.py --baseline old.json --output new.json
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from importlib import metadata
+from pathlib import Path
+from unittest import mock
+import argparse
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+
+from shapely import LineString, MultiPolygon, Point, Polygon, box
+import pandas as pd
+import numpy as np
+
+from erad.scenarios.common import AssetTable, AssetTypes, synthetic_assets
+from erad.scenarios.earthquake_scenario import EarthquakeScenario
+from erad.scenarios.fire_scenario import FireScenario
+from erad.scenarios.flood_scenario import FloodScenario
+from erad.scenarios.wind_scenario import Hurricane, HurricaneStatus, WindScenario
+from erad.utils.elevation import ElevationProvider
+from erad.utils.instrumentation import registry
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+SCENARIOS = ["earthquake", "fire", "wind", "flood"]
+
+# Region covered by the synthetic assets as (lon_min, lat_min, lon_max, lat_max)
+BOUNDS = (-122.95, 38.40, -122.65, 38.60)
+TIMESTAMP = datetime(2020, 1, 1)
+
+
+def benchmark_assets(size: int, seed: int = 0) -> AssetTable:
+    """Generates `size` assets split evenly over all asset types within `BOUNDS`."""
+    asset_types = [asset_type.name for asset_type in AssetTypes]
+    counts = {
+        asset_type: size // len(asset_types) + (i < size % len(asset_types))
+        for i, asset_type in enumerate(asset_types)
+    }
+    return synthetic_assets(box(*BOUNDS), counts, seed=seed, as_table=True)
+
+
+def synthetic_elevation(latitude: float, longitude: float) -> float:
+    """Smooth synthetic terrain in feet standing in for the local DEM tiles."""
+    return float(
+        30
+        + 20 * np.sin(np.radians(latitude) * 400)
+        + 15 * np.cos(np.radians(longitude) * 300)
+    )
+
+
+@contextmanager
+def offline_elevation(folder: Path, resolution: float = 0.001):
+    """Serves elevation requests from a raster of `synthetic_elevation` written to `folder`."""
+    import rasterio
+    from rasterio.transform import from_origin
+
+    lon_min, lat_min, lon_max, lat_max = BOUNDS
+    columns = int(np.ceil((lon_max - lon_min) / resolution)) + 1
+    rows = int(np.ceil((lat_max - lat_min) / resolution)) + 1
+    longitude = lon_min + resolution * np.arange(columns)
+    latitude = lat_max - resolution * np.arange(rows)
+    values = np.vectorize(synthetic_elevation)(*np.meshgrid(latitude, longitude, indexing="ij"))
+
+    path = folder / "synthetic_dem.tif"
+    west, north = lon_min - resolution / 2, lat_max + resolution / 2
+    with rasterio.open(
+        path, "w", driver="GTiff", height=rows, width=columns, count=1, dtype="float32",
+        crs="epsg:4326", transform=from_origin(west, north, resolution, resolution),
+    ) as dataset:
+        dataset.write(values.astype(np.float32), 1)
+
+    provider = ElevationProvider(path, cache_directory=folder / "elevation", units="ft")
+    with mock.patch("erad.scenarios.flood_scenario.default_elevation_provider", lambda: provider):
+        yield
+
+
+def earthquake_scenario(folder: Path) -> EarthquakeScenario:
+    return EarthquakeScenario(
+        Point(-122.8, 38.5), None, TIMESTAMP, Magnitude=6.5, Depth=20.0
+    )
+
+
+def fire_scenario(folder: Path) -> FireScenario:
+    perimeter = Polygon(
+        [(-122.85, 38.45), (-122.78, 38.44), (-122.72, 38.50), (-122.76, 38.56), (-122.84, 38.53)]
+    )
+    return FireScenario(MultiPolygon([perimeter]), None, TIMESTAMP)
+
+
+def wind_scenario(folder: Path) -> WindScenario:
+    track = [
+        HurricaneStatus(
+            timestamp=TIMESTAMP + timedelta(hours=3 * i),
+            wind_speed_mph=110 - 5 * i,
+            pressure_mb=950 + 3 * i,
+            longitude=-123.4 + 0.1 * i,
+            latitude=38.0 + 0.08 * i,
+            landfall_mi=0,
+        )
+        for i in range(12)
+    ]
+    hurricane = Hurricane(sid="BENCHMARK", name="BENCHMARK", track=track)
+    return WindScenario(
+        LineString([(s.longitude, s.latitude) for s in track]), None, hurricane
+    )
+
+
+def flood_scenario(folder: Path) -> FloodScenario:
+    """Builds a flood scenario from synthetic gauge files written to `folder`."""
+    rng = np.random.default_rng(1)
+    lon_min, lat_min, lon_max, lat_max = BOUNDS
+    gauges = pd.DataFrame(
+        {
+            "GaugeLID": [f"GAUGE{i}" for i in range(12)],
+            "Longitude": rng.uniform(lon_min, lon_max, 12),
+            "Latitude": rng.uniform(lat_min, lat_max, 12),
+        }
+    )
+    gauges["elevation"] = [
+        synthetic_elevation(lat, lon) for lon, lat in zip(gauges.Longitude, gauges.Latitude)
+    ]
+    gauges["geometry"] = [
+        Point(lat, lon).wkt for lon, lat in zip(gauges.Longitude, gauges.Latitude)
+    ]
+    index = pd.date_range(TIMESTAMP, periods=8, freq="15min")
+    levels = pd.DataFrame(
+        rng.uniform(2, 12, (len(index), len(gauges))), index=index, columns=gauges.GaugeLID
+    )
+
+    files = {
+        "file_gaugues": folder / "gauges.csv",
+        "file_levels": folder / "levels.csv",
+        "file_flow": folder / "flows.csv",
+    }
+    gauges.to_csv(files["file_gaugues"], index=False)
+    levels.to_csv(files["file_levels"])
+    levels.to_csv(files["file_flow"])
+
+    # The flood polygon is in (lat, lon) order like the ones built by `asset_list`
+    polygon = Polygon(
+        [(lat_min, lon_min), (lat_min, lon_max), (lat_max, lon_max), (lat_max, lon_min)]
+    )
+    return FloodScenario(MultiPolygon([polygon]), None, TIMESTAMP, **files)
+
+
+BUILDERS = {
+    "earthquake": (earthquake_scenario, lambda scenario: (None,)),
+    "fire": (fire_scenario, lambda scenario: (None, False)),
+    "wind": (wind_scenario, lambda scenario: ()),
+    "flood": (flood_scenario, lambda scenario: (scenario.valid_timepoints[0],)),
+}
+
+
+def run_case(name: str, size: int, folder: Path, repeat: int = 1, trace_memory: bool = True) -> dict:
+    """Benchmarks one scenario at one asset count.
+
+    Args:
+        name (str): Scenario type, one of `SCENARIOS`
+        size (int): Number of synthetic assets
+        folder (Path): Folder for fixture files
+        repeat (int): Number of timed evaluations, the fastest one is reported
+        trace_memory (bool): Set to false to skip the traced evaluation for peak memory
+
+    Returns:
+        dict: Stage times in seconds, throughput in assets per second and peak memory in MB
+    """
+    build_scenario, arguments = BUILDERS[name]
+    stages = {}
+
+    start = time.perf_counter()
+    assets = benchmark_assets(size)
+    stages["generate_assets"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scenario = build_scenario(folder)
+    stages["build_scenario"] = time.perf_counter() - start
+
+    registry.reset()
+    survival_times = []
+    for _ in range(repeat):
+        table = assets.base_copy()
+        start = time.perf_counter()
+        table = scenario.calculate_survival_probability(table, *arguments(scenario))
+        survival_times.append(time.perf_counter() - start)
+    stages["survival_probability"] = min(survival_times)
+    profile = registry.profile()
+
+    start = time.perf_counter()
+    table.to_dict()
+    stages["to_dict"] = time.perf_counter() - start
+
+    peak_memory_mb = None
+    if trace_memory:
+        table = assets.base_copy()
+        tracemalloc.start()
+        scenario.calculate_survival_probability(table, *arguments(scenario))
+        peak_memory_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+
+    return {
+        "scenario": name,
+        "assets": size,
+        "status": "ok",
+        "stages": stages,
+        "throughput_assets_per_s": size / stages["survival_probability"],
+        "peak_memory_mb": peak_memory_mb,
+        "spans": profile["spans"],
+        "counters": profile["counters"],
+    }
+
+
+def environment() -> dict:
+    try:
+        version = metadata.version("NREL-erad")
+    except metadata.PackageNotFoundError:
+        version = None
+    return {
+        "erad": version,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def run(
+    sizes=SIZES,
+    scenarios=SCENARIOS,
+    repeat: int = 1,
+    time_limit: float = 300,
+    trace_memory: bool = True,
+) -> dict:
+    """Runs the benchmark suite.
+
+    Once the survival probability stage of a scenario takes longer than
+    `time_limit` seconds, larger asset counts of that scenario are skipped.
+
+    Returns:
+        dict: Environment description and one result record per scenario and size
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as folder, offline_elevation(Path(folder)):
+        for name in scenarios:
+            too_slow = False
+            for size in sorted(sizes):
+                if too_slow:
+                    results.append({"scenario": name, "assets": size, "status": "skipped"})
+                    continue
+                result = run_case(name, size, Path(folder), repeat, trace_memory)
+                too_slow = result["stages"]["survival_probability"] > time_limit
+                results.append(result)
+                print(
+                    f"{name:>10} {size:>9} assets "
+                    f"{result['stages']['survival_probability']:9.3f} s "
+                    f"{result['throughput_assets_per_s']:12.0f} assets/s"
+                )
+    return {"environment": environment(), "results": results}
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """Returns throughput of `results` relative to `baseline` for cases present in both."""
+    reference = {
+        (r["scenario"], r["assets"]): r["throughput_assets_per_s"]
+        for r in baseline["results"]
+        if r["status"] == "ok"
+    }
+    ratios = []
+    for r in results["results"]:
+        key = (r["scenario"], r["assets"])
+        if r["status"] == "ok" and key in reference:
+            ratios.append(
+                {
+                    "scenario": r["scenario"],
+                    "assets": r["assets"],
+                    "throughput_ratio": r["throughput_assets_per_s"] / reference[key],
+                }
+            )
+    return ratios
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--repeat", type=int, default=1, help="Timed evaluations per case")
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=300,
+        help="Skip larger sizes once a scenario takes longer than this many seconds",
+    )
+    parser.add_argument("--no-memory", action="store_true", help="Skip peak memory tracing")
+    parser.add_argument("--baseline", type=Path, help="Earlier results to compare against")
+    parser.add_argument("--output", type=Path, default=Path("scenario_benchmarks.json"))
+    args = parser.parse_args(args)
+
+    results = run(args.sizes, args.scenarios, args.repeat, args.time_limit, not args.no_memory)
+    if args.baseline:
+        results["baseline"] = str(args.baseline)
+        results["comparison"] = compare(results, json.loads(args.baseline.read_text()))
+        for ratio in results["comparison"]:
+            print(
+                f"{ratio['scenario']:>10} {ratio['assets']:>9} assets "
+                f"{ratio['throughput_ratio']:6.2f}x baseline throughput"
+            )
+    args.output.write_text(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ DATA_FOLDER_NAME = "data"
 DATA_FOLDER = TEST_PATH / DATA_FOLDER_NAME
 
 ERAD_DB = TEST_PATH / DATA_FOLDER_NAME / "erad_data.sqlite"
+CACHE_FOLDER = Path(os.environ.get("ERAD_CACHE_DIR", Path.home() / ".cache" / "erad"))
 HISTROIC_EARTHQUAKE_TABLE = "historic_earthquakes"
 HISTROIC_HURRICANE_TABLE = "historic_hurricanes"
 HISTROIC_FIRE_TABLE = "historic_fires"
@@ -21,6 +22,9 @@ EARTHQUAKE_HISTORIC_CSV_PATH = "World_Earthquakes_1960_2016.csv"
 FLOOD_HISTORIC_SHP_PATH = "FEMA_100_Year_Flood_Zones_in_the_US\\FEMA_100_Year_Flood_Zones_in_the_US.shp"
 #FLOOD_HISTORIC_SHP_PATH = "NFHL_06_20230323.gdb"
 ELEVATION_RASTER_FILE = "land_shallow_topo_west.tif"
+ELEVATION_TILE_FOLDER = Path(os.environ.get("ERAD_DEM_DIR", DATA_FOLDER / "elevation"))
+# Folder of zipped SRTM3 `.hgt` tiles downloaded where no local DEM tile is found, disabled if empty
+ELEVATION_DOWNLOAD_URL = os.environ.get("ERAD_DEM_URL", "https://firmware.ardupilot.org/SRTM/North_America")
 
 SMARTDS_VALID_YEARS = [2016, 2017, 2018]
 SMARTDS_VALID_AREAS = ['SFO', 'GSO', 'AUS']
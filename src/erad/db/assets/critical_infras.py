@@ -8,10 +8,12 @@ import random
 
 from neo4j import GraphDatabase
 
-from erad.db.utils import _run_read_query
+from erad.db.utils import _run_read_query, _record_writes
+from erad.utils import instrumentation
 from erad.metrics.check_microgrid import node_connected_to_substation
 
 
+@instrumentation.timed("db.update_critical_infra_based_on_grid_access_fast")
 def _update_critical_infra_based_on_grid_access_fast(
     critical_infras,
     driver: GraphDatabase.driver   
@@ -55,9 +57,11 @@ def _update_critical_infra_based_on_grid_access_fast(
                         survive=1 if infra['c.name'] in nodes or int(infra['c.backup'])==1 else 0 
                     )
                 )
+        _record_writes(len(infras))
 
 
 
+@instrumentation.timed("db.update_critical_infra_based_on_grid_access")
 def _update_critical_infra_based_on_grid_access(
     critical_infras,
     driver: GraphDatabase.driver 
@@ -119,7 +123,9 @@ def _update_critical_infra_based_on_grid_access(
                         survive=int(any(connected)) 
                     )
                 )
+        _record_writes(len(infras))
 
+@instrumentation.timed("db.update_critical_infra")
 def _update_critical_infra(
         scenario,
         critical_infras,
@@ -141,7 +147,7 @@ def _update_critical_infra(
     for c_infra, data in critical_infras_items.items():
         assets[c_infra] =  {
             item["c.name"]: {
-                "coordinates": [item["c.longitude"], item["c.latitude"]]
+                "coordinates": [item["c.latitude"], item["c.longitude"]]
             } for item in data
             if all([item["c.longitude"], item["c.latitude"]])
         }
@@ -168,4 +174,5 @@ def _update_critical_infra(
                             random.random() < cdict["survival_probability"]
                         ),
                     )
-                )
\ No newline at end of file
+                )
+        _record_writes(len(survival_prob[infra]))
\ No newline at end of file
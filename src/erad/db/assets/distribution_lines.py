@@ -7,29 +7,47 @@ attribute based on event scenario.
 from datetime import datetime
 import random
 import json
+import logging
 import random
 
+import numpy as np
+
+from erad.utils import instrumentation
+from erad.utils.elevation import default_elevation_provider
+
 random.seed(20)
 
 from neo4j import GraphDatabase
 
-from erad.db.utils import _run_read_query
+from erad.db.utils import _run_read_query, _record_writes
+
+logger = logging.getLogger(__name__)
 
 
 def _create_assets(lines):
     """ Takes the list of lines and convert into
-    asset dictionary. """
+    asset dictionary. Ground elevation is sampled from the
+    local DEM tiles, NaN if none are available. """
+
+    lines = [line for line in lines if all([line["r.longitude"], line["r.latitude"]])]
+    longitude = np.array([line["r.longitude"] for line in lines], dtype=float)
+    latitude = np.array([line["r.latitude"] for line in lines], dtype=float)
+    try:
+        elevation_ft = default_elevation_provider().elevation_ft(longitude, latitude)
+    except FileNotFoundError as error:
+        logger.warning(f"Line elevations not set: {error}")
+        elevation_ft = np.full(len(lines), np.nan)
 
     return {
             line["r.name"]: {
                 "coordinates": [line["r.latitude"], line["r.longitude"]],
                 "heights_ft": float(line["r.height_m"])*3.28084,
-                "elevation_ft": random.randint(50, 400)
+                "elevation_ft": float(elevation)
             }
-            for line in lines
-            if all([line["r.longitude"], line["r.latitude"]])
+            for line, elevation in zip(lines, elevation_ft)
         }
 
+@instrumentation.timed("db.update_distribution_lines_survival")
 def _update_distribution_lines_survival(
     survival_probability,
     driver: GraphDatabase.driver   
@@ -54,6 +72,7 @@ def _update_distribution_lines_survival(
                     survive=int(random.random() < rdict.get("survival_probability", 1)),
                 )
             )
+    _record_writes(len(survival_probability))
 
 
 def _update_distribution_overhead_lines(scenario, driver: GraphDatabase.driver, timestamp: datetime):
@@ -4,11 +4,22 @@ contained within db subpackage."""
 
 from neo4j import GraphDatabase
 
+from erad.utils import instrumentation
+
 def _run_read_query(driver:GraphDatabase.driver, cypher_query: str):
     """ Runs a cypher query and returns result. """
 
-    with driver.session() as session:
+    with instrumentation.span("db.read_query"), driver.session() as session:
         result = session.read_transaction(
             lambda tx: tx.run(cypher_query).data()
         )
-    return result
\ No newline at end of file
+    instrumentation.count("db.queries_issued")
+    instrumentation.count("db.rows_read", len(result))
+    return result
+
+
+def _record_writes(rows: int) -> None:
+    """ Records single row write transactions in the instrumentation registry. """
+
+    instrumentation.count("db.queries_issued", rows)
+    instrumentation.count("db.rows_written", rows)
\ No newline at end of file
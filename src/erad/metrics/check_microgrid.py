@@ -10,7 +10,10 @@ from neo4j import GraphDatabase
 import networkx as nx
 import matplotlib.pyplot as plt
 
+from erad.utils import instrumentation
 
+
+@instrumentation.timed("metrics.create_directed_graph")
 def create_directed_graph(
     driver: GraphDatabase.driver,
 ):
@@ -66,6 +69,8 @@ def create_directed_graph(
 
         with driver.session() as session:
             result = session.read_transaction(lambda tx: tx.run(query).data())
+        instrumentation.count("db.queries_issued")
+        instrumentation.count("db.rows_read", len(result))
         relations.extend(result)
 
     graph = nx.Graph()
@@ -99,8 +104,28 @@ def node_connected_to_substation(
         if "survive" in edge_data and int(edge_data["survive"]) == 0:
             edges_to_be_removed.append(edge)
 
+    return nodes_connected_to_substation_in_graph(
+        directed_graph, substation_nodes, edges_to_be_removed
+    )
+
+
+def nodes_connected_to_substation_in_graph(
+    directed_graph: nx.DiGraph,
+    substation_nodes: List[str],
+    edges_to_be_removed: List,
+):
+    """ Gives list of nodes still connected to substation once
+    failed edges are removed from an in-memory graph.
+
+    Args:
+        directed_graph (nx.DiGraph): Directed graph of the power network,
+            left unmodified
+        substation_nodes (List[str]): Names of substation nodes
+        edges_to_be_removed (List): Edges that did not survive
+    """
+
     if edges_to_be_removed:
-        directed_graph.remove_edges_from(edges_to_be_removed)
+        directed_graph = nx.restricted_view(directed_graph, [], edges_to_be_removed)
         wcc = nx.weakly_connected_components(directed_graph)
 
         for _, weak_component in enumerate(wcc):
@@ -117,6 +142,7 @@ def node_connected_to_substation(
     return []
             
 
+@instrumentation.timed("metrics.check_for_microgrid")
 def check_for_microgrid(driver: GraphDatabase.driver, output_json_path: str):
     """Checks for possibility of microgrid in each subgraph.
 
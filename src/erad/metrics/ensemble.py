@@ -0,0 +1,250 @@
+""" Module for Monte Carlo ensembles of asset survival.
+
+A scenario gives every asset a survival probability. This module draws many
+realizations of the `survive` attribute at once and evaluates connectivity
+metrics for every realization on an in-memory graph, without writing
+realizations to the graph database.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Union
+
+import networkx as nx
+import pandas as pd
+import numpy as np
+
+from erad.metrics.check_microgrid import nodes_connected_to_substation_in_graph
+from erad.scenarios.common import AssetTable
+from erad.utils import instrumentation
+
+# Members drawn from one random stream, fixed so that results do not
+# depend on the number of workers
+MEMBERS_PER_STREAM = 64
+
+
+def _draw_members(survival_probability: np.ndarray, seed_sequence, members: int):
+    """Draws survive realizations from a single random stream."""
+    rng = np.random.default_rng(seed_sequence)
+    return rng.random((members, len(survival_probability))) < survival_probability
+
+
+@instrumentation.timed("metrics.draw_survival_realizations")
+def draw_survival_realizations(
+    survival_probability: np.ndarray,
+    members: int,
+    seed: Union[int, None] = None,
+    workers: int = 1,
+) -> np.ndarray:
+    """Draws Monte Carlo realizations of asset survival.
+
+    Members are split into blocks of `MEMBERS_PER_STREAM`, each drawn from an
+    independent stream spawned from `seed`, so the same seed gives the same
+    realizations for any number of workers.
+
+    Args:
+        survival_probability (np.ndarray): Survival probability of every asset
+        members (int): Number of ensemble members
+        seed (int): Seed of the ensemble, random if not provided
+        workers (int): Number of worker processes
+
+    Returns:
+        np.ndarray: Boolean array of shape (members, assets), true where the asset survives
+    """
+    survival_probability = np.asarray(survival_probability, dtype=float)
+    sizes = [
+        min(MEMBERS_PER_STREAM, members - start)
+        for start in range(0, members, MEMBERS_PER_STREAM)
+    ]
+    streams = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            blocks = list(
+                executor.map(
+                    _draw_members, [survival_probability] * len(sizes), streams, sizes
+                )
+            )
+    else:
+        blocks = [
+            _draw_members(survival_probability, stream, size)
+            for stream, size in zip(streams, sizes)
+        ]
+    if not blocks:
+        return np.zeros((0, len(survival_probability)), dtype=bool)
+    return np.concatenate(blocks)
+
+
+class SurvivalEnsemble:
+    """Monte Carlo realizations of the survive attribute for a set of assets.
+
+    Attributes:
+        names (np.ndarray): Asset names, one per column of `realizations`
+        survival_probability (np.ndarray): Survival probability of every asset
+        realizations (np.ndarray): Boolean array of shape (members, assets)
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        survival_probability: np.ndarray,
+        members: int,
+        seed: Union[int, None] = None,
+        workers: int = 1,
+    ) -> None:
+        """Constructor for SurvivalEnsemble.
+
+        Args:
+            names (List[str]): Asset names
+            survival_probability (np.ndarray): Survival probability of every asset
+            members (int): Number of ensemble members
+            seed (int): Seed of the ensemble, random if not provided
+            workers (int): Number of worker processes
+        """
+        self.names = np.asarray(names, dtype=object)
+        self.survival_probability = np.asarray(survival_probability, dtype=float)
+        self.realizations = draw_survival_realizations(
+            self.survival_probability, members, seed, workers
+        )
+
+    @classmethod
+    def from_assets(
+        cls,
+        assets: Union[dict, AssetTable],
+        members: int,
+        seed: Union[int, None] = None,
+        workers: int = 1,
+    ) -> "SurvivalEnsemble":
+        """Builds the ensemble from the output of any scenario.
+
+        Assets without a survival probability are assumed to survive.
+
+        Args:
+            assets (dict | AssetTable): Assets returned by `calculate_survival_probability`
+            members (int): Number of ensemble members
+            seed (int): Seed of the ensemble, random if not provided
+            workers (int): Number of worker processes
+        """
+        if isinstance(assets, AssetTable):
+            names = assets.names
+            survival_probability = np.nan_to_num(
+                assets.columns.get("survival_probability", np.ones(len(assets))), nan=1.0
+            )
+        else:
+            names, survival_probability = [], []
+            for asset_dict in assets.values():
+                for asset_name, asset_ppty in asset_dict.items():
+                    names.append(asset_name)
+                    survival_probability.append(asset_ppty.get("survival_probability", 1))
+        return cls(names, survival_probability, members, seed, workers)
+
+    @property
+    def members(self) -> int:
+        return self.realizations.shape[0]
+
+    def survive(self, member: int) -> Dict[str, int]:
+        """Returns survive attribute of every asset for a given member."""
+        return dict(zip(self.names, self.realizations[member].astype(int).tolist()))
+
+    def failed_edges(self, directed_graph: nx.DiGraph) -> List[List]:
+        """Returns the failed graph edges for every member.
+
+        Edges are matched to assets through their `name` attribute.
+
+        Args:
+            directed_graph (nx.DiGraph): Directed graph of the power network
+        """
+        column = {name: i for i, name in enumerate(self.names)}
+        edges, columns = [], []
+        for u, v, name in directed_graph.edges(data="name"):
+            if name in column:
+                edges.append((u, v))
+                columns.append(column[name])
+        failed = ~self.realizations[:, columns]
+        return [[edges[i] for i in np.flatnonzero(row)] for row in failed]
+
+
+def _connected_members(directed_graph, substation_nodes, nodes, failed_edges):
+    """Evaluates which nodes are connected to a substation for a block of members."""
+    position = {node: i for i, node in enumerate(nodes)}
+    connected = np.zeros((len(failed_edges), len(nodes)), dtype=bool)
+    for member, edges in enumerate(failed_edges):
+        member_nodes = nodes_connected_to_substation_in_graph(
+            directed_graph, substation_nodes, edges
+        )
+        connected[member, [position[node] for node in member_nodes]] = True
+    return connected
+
+
+@instrumentation.timed("metrics.connected_nodes")
+def connected_nodes(
+    directed_graph: nx.DiGraph,
+    ensemble: SurvivalEnsemble,
+    substation_nodes: List[str],
+    workers: int = 1,
+) -> pd.DataFrame:
+    """Evaluates connectivity to substations for every ensemble member.
+
+    Args:
+        directed_graph (nx.DiGraph): Directed graph of the power network, e.g.
+            from `check_microgrid.create_directed_graph`
+        ensemble (SurvivalEnsemble): Survival realizations of the line assets
+        substation_nodes (List[str]): Names of substation nodes
+        workers (int): Number of worker processes
+
+    Returns:
+        pd.DataFrame: Boolean frame with one row per member and one column per node
+    """
+    nodes = list(directed_graph.nodes())
+    failed_edges = ensemble.failed_edges(directed_graph)
+    instrumentation.count("metrics.ensemble_members", len(failed_edges))
+    blocks = [
+        failed_edges[start : start + MEMBERS_PER_STREAM]
+        for start in range(0, len(failed_edges), MEMBERS_PER_STREAM)
+    ]
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(
+                    _connected_members,
+                    [directed_graph] * len(blocks),
+                    [substation_nodes] * len(blocks),
+                    [nodes] * len(blocks),
+                    blocks,
+                )
+            )
+    else:
+        results = [
+            _connected_members(directed_graph, substation_nodes, nodes, block)
+            for block in blocks
+        ]
+    connected = np.concatenate(results) if results else np.zeros((0, len(nodes)), dtype=bool)
+    return pd.DataFrame(connected, columns=nodes)
+
+
+def customer_connectivity(
+    directed_graph: nx.DiGraph,
+    ensemble: SurvivalEnsemble,
+    substation_nodes: List[str],
+    load_list: List[str] = None,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """Ensemble counterpart of `metric.is_customer_getting_power`.
+
+    Args:
+        directed_graph (nx.DiGraph): Directed graph of the power network
+        ensemble (SurvivalEnsemble): Survival realizations of the line assets
+        substation_nodes (List[str]): Names of substation nodes
+        load_list (List[str]): Loads considered powered irrespective of connectivity
+        workers (int): Number of worker processes
+
+    Returns:
+        pd.DataFrame: Fraction of members in which each load is connected to a substation
+    """
+    if not load_list:
+        load_list = []
+
+    connected = connected_nodes(directed_graph, ensemble, substation_nodes, workers)
+    loads = [node for node in connected.columns if "load" in str(node)]
+    metric = connected[loads].mean(axis=0)
+    metric[metric.index.isin(load_list)] = 1
+    return pd.DataFrame({"load_name": loads, "metric": metric.values})
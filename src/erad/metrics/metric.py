@@ -11,7 +11,7 @@ from neo4j import GraphDatabase
 import pandas as pd
 import numpy as np
 
-from erad.utils import util
+from erad.utils import util, instrumentation
 from erad import exceptions
 
 
@@ -29,6 +29,7 @@ def validate_export_path(file_path: Union[str, Path], file_type: str):
         raise exceptions.InvalidFileTypePassed(output_path, file_type)
 
 
+@instrumentation.timed("metrics.is_customer_getting_power")
 def is_customer_getting_power(
     driver: GraphDatabase.driver, output_csv_path: str,
     load_list: List[str] = None
@@ -60,6 +61,8 @@ def is_customer_getting_power(
         result = session.read_transaction(
             lambda tx: tx.run(cypher_query).data()
         )
+        instrumentation.count("db.queries_issued")
+        instrumentation.count("db.rows_read", len(result))
 
         for item in result:
             metric_container["load_name"].append(item["c.name"])
@@ -70,6 +73,7 @@ def is_customer_getting_power(
     df.to_csv(output_csv_path)
 
 
+@instrumentation.timed("metrics.energy_resilience_by_customer")
 def energy_resilience_by_customer(
     driver: GraphDatabase.driver, output_csv_path: str,
     critical_infras: List = ["Grocery", "Hospital", "Pharmacy"]
@@ -106,6 +110,8 @@ def energy_resilience_by_customer(
             result = session.read_transaction(
                 lambda tx: tx.run(cypher_query).data()
             )
+            instrumentation.count("db.queries_issued")
+            instrumentation.count("db.rows_read", len(result))
 
             for item in result:
                 metric_container["load_name"].append(item["lo.name"])
@@ -116,6 +122,7 @@ def energy_resilience_by_customer(
     df.to_csv(output_csv_path)
 
 
+@instrumentation.timed("metrics.energy_resilience_by_income")
 def energy_resilience_by_income(
     driver: GraphDatabase.driver,
     path_to_energy_resilience_metric: str,
@@ -150,6 +157,8 @@ def energy_resilience_by_income(
         result = session.read_transaction(
             lambda tx: tx.run(cypher_query).data()
         )
+        instrumentation.count("db.queries_issued")
+        instrumentation.count("db.rows_read", len(result))
 
     resilience_metric = pd.read_csv(path_to_energy_resilience_metric)
     gamma_dict = (
@@ -7,9 +7,10 @@ Each scenario type will extend the base class to implement a given scenario
 from shapely.geometry import MultiPolygon, Polygon, LineString, Point
 from datetime import datetime
 from typing import *
+import hashlib
 import shapely
 
-from erad.scenarios.common import AssetTypes
+from erad.scenarios.common import AssetTypes, AssetTable
 
 class BaseScenario:
     
@@ -20,8 +21,11 @@ class BaseScenario:
         probability_model (dict): Dictionary mapping asset types to probability funcitons
         timestamp (datetime): Scenario occurance time 
         kwargs (dict): Additional parameters relevant for a particular scenario type
+        result_cache (ScenarioResultCache): Optional cache of survival probability results
         
     """
+
+    result_cache = None
     
     def __init__(self,  geodata : Union[MultiPolygon, Point, LineString] , probability_model : dict, timestamp : datetime, **kwargs) -> None:
         """Constructor for BaseScenario class.
@@ -78,11 +82,14 @@ class BaseScenario:
         """Method to increment simulation time for time evolviong scenarios."""
         raise NotImplementedError("Method needs to be defined in derived classes")
 
-    def calculate_survival_probability(self, assets : dict, timestamp : datetime) -> dict:
+    def calculate_survival_probability(self, assets : Union[dict, AssetTable], timestamp : datetime) -> Union[dict, AssetTable]:
         """Method to calculate survival probaility of asset types.
 
+        Results are written back as columns when an `AssetTable` is passed and as keys
+        of the per-asset dictionaries otherwise.
+
         Args:
-            assets (dict): The dictionary of all assets and their corresponding asset types
+            assets (dict | AssetTable): The dictionary or table of all assets and their corresponding asset types
         """
         raise NotImplementedError("Method needs to be defined in derived classes")
 
@@ -93,6 +100,24 @@ class BaseScenario:
     def asset_survial_probability(self, asset_type):
         raise NotImplementedError("Method needs to be defined in derived classes")
     
+    def fingerprint(self) -> str:
+        """Stable hash of the scenario inputs used to key cached results."""
+        digest = hashlib.sha256(type(self).__name__.encode())
+        for name in ["multipolygon", "origin", "front"]:
+            if hasattr(self, name):
+                digest.update(shapely.to_wkb(getattr(self, name)))
+        digest.update(repr(self.timestamp).encode())
+        digest.update(repr(sorted(getattr(self, "kwargs", {}).items())).encode())
+        for asset_type, probability_function in sorted(self.probability_model.items()):
+            digest.update(f"{asset_type}:{probability_function.fingerprint}".encode())
+        for part in self._fingerprint_parts():
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _fingerprint_parts(self) -> List[bytes]:
+        """Additional scenario specific inputs included in the fingerprint."""
+        return []
+
     def valitate_user_defined_fragility_curves(self, distributions):
         for asset_type in distributions:
             assert AssetTypes.has_asset(asset_type), f"{asset_type} is not a valid asset type. Valid options are {list(AssetTypes.__members__.keys())}"
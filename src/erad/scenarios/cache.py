@@ -0,0 +1,185 @@
+""" Module for caching scenario results on disk.
+
+Survival probabilities are stored per scenario and asset set, so re-running the
+same historic event against the same feeder reads the result columns back
+instead of recomputing them.
+"""
+
+from pathlib import Path
+from typing import Union
+import functools
+import hashlib
+import inspect
+import logging
+import os
+
+import numpy as np
+
+from erad.constants import CACHE_FOLDER
+from erad.scenarios.common import AssetTable
+from erad.utils import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class ScenarioResultCache:
+    """On-disk cache of scenario result columns with size based LRU eviction.
+
+    Every entry is a `.npz` file holding one array per result column, named
+    `<scenario fingerprint>_<asset fingerprint>_<call fingerprint>.npz`.
+
+    Attributes:
+        directory (Path): Folder holding the cached results
+        max_size_mb (float): Size above which least recently used entries are evicted
+        hits (int): Number of results read from the cache
+        misses (int): Number of results computed and written to the cache
+    """
+
+    def __init__(
+        self, directory: Union[str, Path, None] = None, max_size_mb: float = 1024
+    ) -> None:
+        """Constructor for ScenarioResultCache.
+
+        Args:
+            directory (str | Path): Folder holding the cached results. Defaults to
+                `scenarios` inside `erad.constants.CACHE_FOLDER`
+            max_size_mb (float): Size above which least recently used entries are evicted
+        """
+        if directory is None:
+            directory = CACHE_FOLDER / "scenarios"
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size_mb = max_size_mb
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npz"
+
+    def get(self, key: str) -> Union[dict, None]:
+        """Returns cached result columns for a key, None if not cached."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                columns = {name: data[name] for name in data.files}
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        # Access time is not reliable on all file systems, use mtime for recency
+        os.utime(path)
+        return columns
+
+    def put(self, key: str, columns: dict) -> None:
+        """Stores result columns for a key and evicts old entries if needed."""
+        path = self._path(key)
+        temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as f:
+            np.savez(f, **columns)
+        os.replace(temporary_path, path)
+        self.evict()
+
+    @property
+    def size_mb(self) -> float:
+        return sum(path.stat().st_size for path in self.directory.glob("*.npz")) / 1024**2
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits in `max_size_mb`."""
+        entries = [(path.stat(), path) for path in self.directory.glob("*.npz")]
+        total = sum(stat.st_size for stat, _ in entries)
+        for stat, path in sorted(entries, key=lambda entry: entry[0].st_mtime):
+            if total <= self.max_size_mb * 1024**2:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            logger.debug(f"Evicted cached scenario result {path.name}")
+
+    def invalidate(self, scenario=None, assets: Union[dict, AssetTable, None] = None) -> int:
+        """Removes cached results for a scenario, an asset set or both.
+
+        Args:
+            scenario (BaseScenario): Remove results of this scenario
+            assets (dict | AssetTable): Remove results for this set of assets
+
+        Returns:
+            int: Number of removed entries
+        """
+        scenario_key = scenario.fingerprint() if scenario is not None else "*"
+        asset_key = AssetTable.from_assets(assets).fingerprint if assets is not None else "*"
+        removed = 0
+        for path in self.directory.glob(f"{scenario_key}_{asset_key}_*.npz"):
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def clear(self) -> int:
+        """Removes all cached results."""
+        return self.invalidate()
+
+
+def cached_survival_probability(ignore: tuple = ()):
+    """Decorator caching `calculate_survival_probability` results in `scenario.result_cache`.
+
+    The key combines the scenario fingerprint, the asset fingerprint and the
+    remaining call arguments. Calls requesting a plot are always evaluated.
+    Every call is timed as the span `scenarios.<scenario class>.calculate_survival_probability`
+    of `erad.utils.instrumentation.registry`.
+
+    Args:
+        ignore (tuple): Names of arguments that do not change the result
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, assets, *args, **kwargs):
+            instrumentation.count(
+                "scenarios.assets_processed",
+                len(assets)
+                if isinstance(assets, AssetTable)
+                else sum(len(asset_dict) for asset_dict in assets.values()),
+            )
+            with instrumentation.span(
+                f"scenarios.{type(self).__name__}.calculate_survival_probability"
+            ):
+                return cached_call(self, assets, *args, **kwargs)
+
+        def cached_call(self, assets, *args, **kwargs):
+            cache = getattr(self, "result_cache", None)
+            arguments = signature.bind(self, assets, *args, **kwargs)
+            arguments.apply_defaults()
+            if cache is None or arguments.arguments.get("plot"):
+                return func(self, assets, *args, **kwargs)
+
+            arguments = {
+                name: value
+                for name, value in list(arguments.arguments.items())[2:]
+                if name not in ignore
+            }
+
+            table = AssetTable.from_assets(assets)
+            key = "_".join(
+                [
+                    self.fingerprint(),
+                    table.fingerprint,
+                    hashlib.sha256(
+                        repr((func.__qualname__, sorted(arguments.items()))).encode()
+                    ).hexdigest(),
+                ]
+            )
+            columns = cache.get(key)
+            if columns is None:
+                cache.misses += 1
+                instrumentation.count("scenarios.cache_misses")
+                result = func(self, table.base_copy(), *args, **kwargs)
+                columns = {name: result.column(name) for name in result.result_columns}
+                cache.put(key, columns)
+            else:
+                cache.hits += 1
+                instrumentation.count("scenarios.cache_hits")
+            for name, values in columns.items():
+                table.set_column(name, values)
+            return table.to_assets(assets)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,397 @@
+""" Module for looking up historic events in the ERAD database.
+
+The source tables in `erad_data.sqlite` store numbers as text, use blank strings
+for missing values and have column names with trailing spaces. The first time a
+catalog is used it builds a normalized copy of the database with typed columns,
+parsed timestamps and indexes on the event identifiers. Lookups are parameterized
+queries against that copy and parsed events are kept in memory, so building many
+scenarios in a loop only queries each event once.
+
+Example:
+    >>> from erad.scenarios.catalog import default_catalog
+    >>> track = default_catalog().hurricane_track("1980001S13173")
+"""
+
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Tuple, Union
+from datetime import datetime
+import functools
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from erad.constants import (
+    CACHE_FOLDER,
+    ERAD_DB,
+    HISTROIC_EARTHQUAKE_TABLE,
+    HISTROIC_FIRE_TABLE,
+    HISTROIC_HURRICANE_TABLE,
+)
+from erad.scenarios.utilities import geodesic_distance
+from erad.utils import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the normalized tables changes to force a rebuild
+CATALOG_VERSION = 3
+
+# Source column names (stripped of whitespace) mapped to normalized column names
+HURRICANE_COLUMNS = {
+    "SID": "sid",
+    "NAME": "name",
+    "ISO_TIME": "timestamp",
+    "LAT (degrees_north)": "latitude",
+    "LON (degrees_east)": "longitude",
+    "WMO_WIND (kts)": "wind_kts",
+    "WMO_PRES (mb)": "pressure_mb",
+    "LANDFALL (km)": "landfall_km",
+}
+EARTHQUAKE_COLUMNS = {
+    "ID": "id",
+    "Magnitude": "magnitude",
+    "Depth": "depth",
+    "Longitude": "longitude",
+    "Latitude": "latitude",
+}
+FIRE_COLUMNS = {"firename": "firename", "globalid": "globalid"}
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Lower bound of the length of one degree of latitude, keeps index range queries conservative
+KM_PER_DEGREE = 110.5
+
+
+class EarthquakeRecord(NamedTuple):
+    """Parameters of a historic earthquake."""
+
+    id: str
+    timestamp: datetime
+    magnitude: float
+    depth: float
+    longitude: float
+    latitude: float
+
+
+class EventCatalog:
+    """Indexed, typed view of the historic event tables of an ERAD database.
+
+    Attributes:
+        source (Path): Source sqlite database
+        path (Path): Normalized copy of the source database
+    """
+
+    def __init__(
+        self,
+        source: Union[str, Path] = ERAD_DB,
+        directory: Union[str, Path, None] = None,
+        cache_size: int = 1024,
+    ) -> None:
+        """Constructor for EventCatalog.
+
+        Args:
+            source (str | Path): Source sqlite database
+            directory (str | Path): Folder holding the normalized copy. Defaults to
+                `catalog` inside `erad.constants.CACHE_FOLDER`
+            cache_size (int): Number of parsed events kept in memory per event type
+        """
+        self.source = Path(source)
+        directory = Path(directory) if directory is not None else CACHE_FOLDER / "catalog"
+        self.path = directory / f"{self.source.stem}_catalog.sqlite"
+        self._lock = threading.Lock()
+        self._connection = None
+        self.hurricane_track = functools.lru_cache(maxsize=cache_size)(self._hurricane_track)
+        self.earthquake = functools.lru_cache(maxsize=cache_size)(self._earthquake)
+        self._fires = functools.lru_cache(maxsize=cache_size)(self._fire)
+
+    def source_signature(self) -> str:
+        """Identifies the version of the source database the normalized copy is built from."""
+        stat = self.source.stat()
+        return f"{CATALOG_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def is_current(self) -> bool:
+        """Returns true if the normalized copy exists and matches the source database."""
+        if not self.path.exists():
+            return False
+        try:
+            with sqlite3.connect(self.path) as conn:
+                (signature,) = conn.execute(
+                    "SELECT value FROM catalog_metadata WHERE key = 'source_signature'"
+                ).fetchone()
+        except (sqlite3.Error, TypeError):
+            return False
+        return signature == self.source_signature()
+
+    @instrumentation.timed("scenarios.catalog.build")
+    def build(self, force: bool = False) -> None:
+        """Builds the normalized copy of the source database if it is missing or stale.
+
+        Args:
+            force (bool): Rebuild even if the normalized copy is up to date
+        """
+        assert self.source.exists(), f"The data file {self.source} not found"
+        if not force and self.is_current():
+            return
+
+        logger.info(f"Building event catalog {self.path} from {self.source}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        temporary_path.unlink(missing_ok=True)
+        with sqlite3.connect(self.source) as source, sqlite3.connect(temporary_path) as target:
+            tables = {
+                row[0]
+                for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            }
+            if HISTROIC_HURRICANE_TABLE in tables:
+                self._copy_table(source, target, HISTROIC_HURRICANE_TABLE, "hurricanes", _normalize_hurricanes)
+                target.execute("CREATE INDEX hurricanes_sid ON hurricanes (sid, seq)")
+                target.execute("CREATE INDEX hurricanes_position ON hurricanes (latitude, longitude)")
+            if HISTROIC_EARTHQUAKE_TABLE in tables:
+                self._copy_table(source, target, HISTROIC_EARTHQUAKE_TABLE, "earthquakes", _normalize_earthquakes)
+                target.execute("CREATE INDEX earthquakes_id ON earthquakes (id)")
+                target.execute("CREATE INDEX earthquakes_position ON earthquakes (latitude, longitude)")
+            if HISTROIC_FIRE_TABLE in tables:
+                self._copy_table(source, target, HISTROIC_FIRE_TABLE, "fires", _normalize_fires)
+                for column in FIRE_COLUMNS.values():
+                    target.execute(f"CREATE INDEX fires_{column} ON fires ({column})")
+            target.execute("CREATE TABLE catalog_metadata (key TEXT PRIMARY KEY, value TEXT)")
+            target.execute(
+                "INSERT INTO catalog_metadata VALUES ('source_signature', ?)",
+                (self.source_signature(),),
+            )
+        os.replace(temporary_path, self.path)
+
+    @staticmethod
+    def _copy_table(source, target, source_table, table, normalize, chunksize=100_000) -> None:
+        offset = 0
+        for chunk in pd.read_sql(f'SELECT * FROM "{source_table}"', source, chunksize=chunksize):
+            chunk = normalize(chunk.rename(columns=str.strip))
+            chunk.insert(0, "seq", range(offset, offset + len(chunk)))
+            offset += len(chunk)
+            chunk.to_sql(table, target, index=False, if_exists="append")
+        if offset == 0:
+            # Empty source table, create the table so lookups fail with a clear message
+            normalize(pd.DataFrame(columns=[])).assign(seq=[]).to_sql(table, target, index=False)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Read only connection to the normalized copy, built on first use."""
+        with self._lock:
+            if self._connection is None:
+                self.build()
+                self._connection = sqlite3.connect(
+                    f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+                )
+            return self._connection
+
+    def close(self) -> None:
+        """Closes the connection and drops all parsed events kept in memory."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        self.hurricane_track.cache_clear()
+        self.earthquake.cache_clear()
+        self._fires.cache_clear()
+
+    def _query(self, query: str, parameters: tuple) -> pd.DataFrame:
+        instrumentation.count("scenarios.catalog_queries")
+        connection = self.connection
+        with self._lock:
+            return pd.read_sql(query, connection, params=parameters)
+
+    def _hurricane_track(self, sid: str) -> pd.DataFrame:
+        """Returns the track of a historic hurricane.
+
+        Track points with a missing wind speed, pressure or landfall distance are
+        dropped. The returned frame is shared between calls and should not be modified.
+
+        Args:
+            sid (str): Storm identifier, e.g. "1980001S13173"
+
+        Returns:
+            pd.DataFrame: name, timestamp, latitude, longitude, wind_kts, pressure_mb
+                and landfall_km of every track point in time order
+        """
+        track = self._query(
+            "SELECT name, timestamp, latitude, longitude, wind_kts, pressure_mb, landfall_km "
+            "FROM hurricanes WHERE sid = ? AND wind_kts IS NOT NULL "
+            "AND pressure_mb IS NOT NULL AND landfall_km IS NOT NULL ORDER BY seq",
+            (sid,),
+        )
+        if track.empty:
+            raise ValueError(
+                f"Hurricane '{sid}'  not found in column 'SID', table '{HISTROIC_HURRICANE_TABLE}' in the database"
+            )
+        track["timestamp"] = pd.to_datetime(track["timestamp"], format=TIMESTAMP_FORMAT)
+        return track
+
+    def hurricanes_near(self, bounds: Tuple[float, float, float, float], distance_km: float) -> List[str]:
+        """Returns the storms with a track point within a distance of a bounding box.
+
+        Candidates are selected with an index range query on the box expanded by
+        the distance, then kept if the geodesic distance from one of their track
+        points to the closest point of the box is within `distance_km`. Track
+        points without wind speed, pressure or landfall distance are ignored, as
+        in `hurricane_track`.
+
+        Args:
+            bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the region
+            distance_km (float): Largest distance between the track and the region
+
+        Returns:
+            List[str]: Storm identifiers in catalog order
+        """
+        lon_min, lat_min, lon_max, lat_max = bounds
+        dlat = distance_km / KM_PER_DEGREE
+        widest = min(max(abs(lat_min - dlat), abs(lat_max + dlat)), 89.0)
+        dlon = min(distance_km / (KM_PER_DEGREE * np.cos(np.radians(widest))), 180.0)
+        candidates = self._query(
+            "SELECT sid, latitude, longitude FROM hurricanes "
+            "WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ? "
+            "AND wind_kts IS NOT NULL AND pressure_mb IS NOT NULL AND landfall_km IS NOT NULL "
+            "ORDER BY seq",
+            (lat_min - dlat, lat_max + dlat, lon_min - dlon, lon_max + dlon),
+        )
+        if candidates.empty:
+            return []
+        distances = geodesic_distance(
+            candidates["longitude"].to_numpy(),
+            candidates["latitude"].to_numpy(),
+            candidates["longitude"].clip(lon_min, lon_max).to_numpy(),
+            candidates["latitude"].clip(lat_min, lat_max).to_numpy(),
+        )
+        return candidates["sid"][distances <= distance_km].unique().tolist()
+
+    def _earthquake(self, code: str) -> EarthquakeRecord:
+        """Returns the parameters of a historic earthquake.
+
+        Args:
+            code (str): Earthquake identifier, e.g. "USP000GYZK"
+        """
+        row = self._query(
+            "SELECT id, timestamp, magnitude, depth, longitude, latitude "
+            "FROM earthquakes WHERE id = ? ORDER BY seq LIMIT 1",
+            (code,),
+        )
+        assert not row.empty, f"No earthquake {code} found in the database"
+        record = row.iloc[0]
+        return EarthquakeRecord(
+            id=record["id"],
+            timestamp=datetime.strptime(record["timestamp"], TIMESTAMP_FORMAT),
+            magnitude=float(record["magnitude"]),
+            depth=float(record["depth"]),
+            longitude=float(record["longitude"]),
+            latitude=float(record["latitude"]),
+        )
+
+    def earthquakes_in(
+        self, bounds: Tuple[float, float, float, float], min_magnitude: float = 0.0
+    ) -> pd.DataFrame:
+        """Returns the historic earthquakes with an epicenter in a bounding box.
+
+        Args:
+            bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the region
+            min_magnitude (float): Smallest magnitude returned
+
+        Returns:
+            pd.DataFrame: id, timestamp, magnitude, depth, longitude and latitude of every event
+        """
+        lon_min, lat_min, lon_max, lat_max = bounds
+        events = self._query(
+            "SELECT id, timestamp, magnitude, depth, longitude, latitude FROM earthquakes "
+            "WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ? AND magnitude >= ? "
+            "AND depth IS NOT NULL ORDER BY seq",
+            (lat_min, lat_max, lon_min, lon_max, min_magnitude),
+        )
+        events["timestamp"] = pd.to_datetime(events["timestamp"], format=TIMESTAMP_FORMAT)
+        return events
+
+    def _fire(self, column: str, value: str) -> pd.DataFrame:
+        return self._query(f"SELECT * FROM fires WHERE {column} = ? ORDER BY seq", (value,)).drop(
+            columns="seq"
+        )
+
+    def fire_chunks(self, chunksize: int = 10_000) -> Iterator[pd.DataFrame]:
+        """Yields all rows of the historic fire table in catalog order.
+
+        The rows are read through a connection owned by the iterator, so other
+        lookups on the catalog can run while chunks are consumed.
+        """
+        instrumentation.count("scenarios.catalog_queries")
+        # Builds the normalized copy if needed
+        self.connection
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            for chunk in pd.read_sql("SELECT * FROM fires ORDER BY seq", connection, chunksize=chunksize):
+                yield chunk.drop(columns="seq")
+        finally:
+            connection.close()
+
+    def fires(self, column: str, value: str) -> pd.DataFrame:
+        """Returns all rows of the historic fire table matching a name or global id.
+
+        Args:
+            column (str): Either "firename" or "globalid"
+            value (str): Fire name or global id, with brackets
+        """
+        if column not in FIRE_COLUMNS:
+            raise ValueError(f"Unsupported column '{column}'. Valid options are {list(FIRE_COLUMNS)}")
+        fire_data = self._fires(column, value)
+        if fire_data.empty:
+            raise ValueError(
+                f"Fire '{value}'  not found in column '{column}', table '{HISTROIC_FIRE_TABLE}' in the database"
+            )
+        return fire_data.copy()
+
+
+def _numeric(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce")
+
+
+def _text(series: pd.Series) -> pd.Series:
+    return series.astype("string").str.strip()
+
+
+def _normalize_hurricanes(data: pd.DataFrame) -> pd.DataFrame:
+    normalized = pd.DataFrame(index=data.index)
+    for source_column, column in HURRICANE_COLUMNS.items():
+        values = data[source_column] if source_column in data else pd.Series(None, index=data.index)
+        if column in ("sid", "name"):
+            normalized[column] = _text(values)
+        elif column == "timestamp":
+            normalized[column] = pd.to_datetime(values, errors="coerce").dt.strftime(TIMESTAMP_FORMAT)
+        else:
+            normalized[column] = _numeric(values)
+    return normalized
+
+
+def _normalize_earthquakes(data: pd.DataFrame) -> pd.DataFrame:
+    normalized = pd.DataFrame(index=data.index)
+    normalized["id"] = _text(data["ID"]) if "ID" in data else pd.Series(dtype="string")
+    date = pd.to_datetime(data.get("Date", pd.Series(None, index=data.index)), errors="coerce", format="mixed")
+    time = pd.to_datetime(data.get("Time", pd.Series(None, index=data.index)), errors="coerce", format="mixed")
+    normalized["timestamp"] = (date.dt.normalize() + (time - time.dt.normalize())).dt.strftime(
+        TIMESTAMP_FORMAT
+    )
+    for source_column, column in EARTHQUAKE_COLUMNS.items():
+        if column != "id":
+            normalized[column] = _numeric(data.get(source_column, pd.Series(None, index=data.index)))
+    return normalized
+
+
+def _normalize_fires(data: pd.DataFrame) -> pd.DataFrame:
+    data = data.copy()
+    for column in FIRE_COLUMNS:
+        if column not in data:
+            data[column] = pd.Series(dtype="string")
+    return data
+
+
+@functools.lru_cache(maxsize=None)
+def default_catalog() -> EventCatalog:
+    """Returns the catalog of the database at `erad.constants.ERAD_DB`, shared by all scenarios."""
+    return EventCatalog(ERAD_DB)
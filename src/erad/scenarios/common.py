@@ -1,7 +1,10 @@
 from shapely.geometry import MultiPolygon, Point,Polygon
-from random import random,seed
+from typing import Union
 from enum import IntEnum
+import hashlib
+import pandas as pd
 import numpy as np
+import shapely
 
 
 class ScenarioTypes(IntEnum):
@@ -33,56 +36,336 @@ class AssetTypes(IntEnum):
         return asset in cls.__members__
 
 
-def asset_list(x1=41.255, y1=-117.33, x2=41.255, y2=-117.33, samples=100):
+class AssetTable:
+    """Columnar container for the assets passed to scenario classes.
 
+    Coordinates are stored as separate longitude and latitude arrays. The legacy
+    dict format `{asset_type: {asset_name: {"coordinates": (lat, lon), ...}}}` used
+    by `erad.db.assets` is converted with `from_dict` and `to_dict`.
+
+    Attributes:
+        names (np.ndarray): Asset names
+        type_names (list): Asset types present in the table
+        type_codes (np.ndarray): Index into `type_names` for every asset
+        columns (dict): Mapping of column name to NumPy array, one row per asset
+    """
+
+    base_columns = ("longitude", "latitude", "heights_ft", "elevation_ft")
+
+    def __init__(
+        self,
+        names,
+        asset_types,
+        longitude,
+        latitude,
+        heights_ft=None,
+        elevation_ft=None,
+    ) -> None:
+        """Constructor for AssetTable.
+
+        Args:
+            names (list): Asset names
+            asset_types (list): Asset type name for every asset
+            longitude (np.ndarray): Asset longitudes in degrees
+            latitude (np.ndarray): Asset latitudes in degrees
+            heights_ft (np.ndarray): Asset heights in feet, NaN where unknown
+            elevation_ft (np.ndarray): Ground elevation in feet, NaN where unknown
+        """
+        self.names = np.asarray(names, dtype=object)
+        codes, type_names = pd.factorize(np.asarray(asset_types, dtype=object))
+        self.type_codes = codes.astype(np.int32)
+        self.type_names = list(type_names)
+        size = len(self.names)
+        self.columns = {}
+        for name, values in zip(
+            self.base_columns, [longitude, latitude, heights_ft, elevation_ft]
+        ):
+            if values is None:
+                values = np.full(size, np.nan)
+            values = np.asarray(values, dtype=float)
+            assert values.shape == (size,), f"Column '{name}' should have {size} rows"
+            self.columns[name] = values
+        self.result_columns = []
+        self._index = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def longitude(self) -> np.ndarray:
+        return self.columns["longitude"]
+
+    @property
+    def latitude(self) -> np.ndarray:
+        return self.columns["latitude"]
+
+    @property
+    def heights_ft(self) -> np.ndarray:
+        return self.columns["heights_ft"]
+
+    @property
+    def elevation_ft(self) -> np.ndarray:
+        return self.columns["elevation_ft"]
+
+    @property
+    def asset_types(self) -> np.ndarray:
+        """Returns asset type name for every asset."""
+        return np.asarray(self.type_names, dtype=object)[self.type_codes]
+
+    @property
+    def points(self) -> np.ndarray:
+        """Returns asset locations as an array of shapely (lon, lat) points."""
+        return shapely.points(self.longitude, self.latitude)
+
+    @classmethod
+    def from_dict(cls, assets: dict) -> "AssetTable":
+        """Builds the table from the nested asset dictionary.
+
+        Args:
+            assets (dict): The dictionary of all assets and their corresponding asset types.
+                Coordinates are expected in (latitude, longitude) order.
+        """
+        names, asset_types, coordinates, heights, elevations = [], [], [], [], []
+        for asset_type, asset_dict in assets.items():
+            for asset_name, asset_ppty in asset_dict.items():
+                names.append(asset_name)
+                asset_types.append(asset_type)
+                coordinates.append(asset_ppty["coordinates"])
+                heights.append(asset_ppty.get("heights_ft", np.nan))
+                elevations.append(asset_ppty.get("elevation_ft", np.nan))
+        coordinates = np.asarray(coordinates, dtype=float).reshape(len(names), 2)
+        return cls(
+            names, asset_types, coordinates[:, 1], coordinates[:, 0], heights, elevations
+        )
+
+    @classmethod
+    def from_assets(cls, assets: Union[dict, "AssetTable"]) -> "AssetTable":
+        """Returns the table for assets passed either as a table or as a dictionary."""
+        if isinstance(assets, cls):
+            return assets
+        return cls.from_dict(assets)
+
+    def to_dict(self) -> dict:
+        """Converts the table and its result columns to the nested asset dictionary."""
+        assets = {asset_type: {} for asset_type in self.type_names}
+        for asset_type, index in self.groups():
+            for row in index:
+                asset = {"coordinates": (self.latitude[row], self.longitude[row])}
+                for name in ["heights_ft", "elevation_ft"]:
+                    if not np.isnan(self.columns[name][row]):
+                        asset[name] = self.columns[name][row]
+                assets[asset_type][self.names[row]] = asset
+        return self.to_assets(assets)
+
+    def to_assets(self, assets: Union[dict, "AssetTable"]) -> Union[dict, "AssetTable"]:
+        """Writes result columns back into the container the assets were passed in.
+
+        Args:
+            assets (dict | AssetTable): Assets originally passed to the scenario
+        """
+        if assets is self:
+            return self
+        for asset_type, index in self.groups():
+            asset_dict = assets[asset_type]
+            names = self.names[index]
+            for column_name in self.result_columns:
+                values = self.columns[column_name][index]
+                for asset_name, value in zip(names, values.tolist()):
+                    if values.ndim == 1 and value != value:
+                        continue
+                    asset_dict[asset_name][column_name] = value
+        return assets
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of asset names, types and base columns used to key cached results."""
+        digest = hashlib.sha256()
+        digest.update("\x1f".join(map(str, self.names)).encode())
+        digest.update("\x1f".join(map(str, self.type_names)).encode())
+        digest.update(self.type_codes.tobytes())
+        for name in self.base_columns:
+            digest.update(self.columns[name].tobytes())
+        return digest.hexdigest()
+
+    def base_copy(self) -> "AssetTable":
+        """Returns a copy of the base columns of this table without any result column."""
+        table = AssetTable.__new__(AssetTable)
+        table.names = self.names
+        table.type_codes = self.type_codes
+        table.type_names = self.type_names
+        table.columns = {name: self.columns[name].copy() for name in self.base_columns}
+        table.result_columns = []
+        table._index = self._index
+        return table
+
+    def groups(self):
+        """Yields asset type and row indices of all assets of that type."""
+        order = np.argsort(self.type_codes, kind="stable")
+        bounds = np.searchsorted(self.type_codes[order], np.arange(len(self.type_names) + 1))
+        for code, asset_type in enumerate(self.type_names):
+            yield asset_type, order[bounds[code] : bounds[code + 1]]
+
+    def row(self, asset_type: str, asset_name: str) -> int:
+        """Returns row index for a given asset."""
+        if self._index is None:
+            self._index = {
+                (self.type_names[code], name): row
+                for row, (code, name) in enumerate(zip(self.type_codes, self.names))
+            }
+        return self._index[(asset_type, asset_name)]
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns column by name."""
+        return self.columns[name]
+
+    def set_column(self, name: str, values, index: np.ndarray = None) -> None:
+        """Writes values into a result column, creating it if required.
+
+        Args:
+            name (str): Name of the column
+            values (np.ndarray): One value (or one row of values) per selected asset
+            index (np.ndarray): Rows to write, all rows when not provided
+        """
+        values = np.asarray(values, dtype=float)
+        if name not in self.columns or self.columns[name].shape[1:] != values.shape[1:]:
+            self.columns[name] = np.full((len(self),) + values.shape[1:], np.nan)
+        if index is None:
+            self.columns[name][...] = values
+        else:
+            self.columns[name][index] = values
+        if name not in self.result_columns:
+            self.result_columns.append(name)
+
+
+ASSET_PROBABILITIES = {
+    AssetTypes.substation: 1 / 10000.0,
+    AssetTypes.solar_panels : 1/500,
+    AssetTypes.buried_lines : 1/10.0,
+    AssetTypes.wind_turbines : 1/5000,
+    AssetTypes.battery_storage :1/2000,
+    AssetTypes.transmission_poles: 1 / 10.0,
+    AssetTypes.distribution_poles : 1 / 10.0,
+    AssetTypes.transmission_overhead_lines : 1/10.0,
+    AssetTypes.distribution_overhead_lines : 1/10.0,
+}
+
+HEIGHTS_FT = {
+    AssetTypes.substation.name : 3,
+    AssetTypes.solar_panels.name : 10,
+    AssetTypes.buried_lines.name : -3,
+    AssetTypes.wind_turbines.name : 25,
+    AssetTypes.battery_storage.name : 4,
+    AssetTypes.transmission_poles.name : 0,
+    AssetTypes.distribution_poles.name : 0,
+    AssetTypes.transmission_overhead_lines.name : 100,
+    AssetTypes.distribution_overhead_lines.name : 30,
+}
+
+
+def _build_assets(type_names, asset_types, ids, longitude, latitude, as_table):
+    """Builds synthetic assets named `<asset type> <id>` as a table or dictionary."""
+    names = [f"{asset_type} {i}" for asset_type, i in zip(asset_types, ids.tolist())]
+    heights_ft = pd.Series(asset_types, dtype=object).map(HEIGHTS_FT).to_numpy(dtype=float)
+    table = AssetTable(names, asset_types, longitude, latitude, heights_ft)
+    if as_table:
+        return table
+    assets = {asset_type: {} for asset_type in type_names}
+    assets.update(table.to_dict())
+    return assets
+
+
+def synthetic_assets(
+    polygon: Union[Polygon, MultiPolygon],
+    assets_per_type: Union[int, dict] = 1000,
+    seed: Union[int, None] = None,
+    as_table: bool = False,
+) -> Union[dict, "AssetTable"]:
+    """Generates assets uniformly distributed over a polygon.
+
+    Locations are drawn in vectorized batches over the polygon bounds with a seeded
+    `numpy.random.Generator` and the ones outside of the polygon are rejected.
+
+    Args:
+        polygon (Polygon | MultiPolygon): Region in (lon, lat) coordinates
+        assets_per_type (int | dict): Number of assets of every asset type, or a
+            dictionary mapping asset type names to their number of assets
+        seed (int): Seed of the random generator, random if not provided
+        as_table (bool): Set to true to return an `AssetTable` instead of a dictionary
+
+    Returns:
+        dict | AssetTable: Assets named `<asset type> <id>` with `heights_ft` set per type
+    """
+    if not isinstance(assets_per_type, dict):
+        assets_per_type = {asset_type.name: assets_per_type for asset_type in AssetTypes}
+    total = sum(assets_per_type.values())
+    assert polygon.area > 0, "Synthetic assets require a polygon with a non-zero area"
+
+    rng = np.random.default_rng(seed)
+    shapely.prepare(polygon)
+    lon_min, lat_min, lon_max, lat_max = polygon.bounds
+    inside_fraction = polygon.area / ((lon_max - lon_min) * (lat_max - lat_min))
+    longitude, latitude = np.empty(0), np.empty(0)
+    while len(longitude) < total:
+        batch = int((total - len(longitude)) / inside_fraction * 1.1) + 16
+        x = rng.uniform(lon_min, lon_max, batch)
+        y = rng.uniform(lat_min, lat_max, batch)
+        inside = shapely.contains_xy(polygon, x, y)
+        longitude = np.concatenate([longitude, x[inside]])
+        latitude = np.concatenate([latitude, y[inside]])
+
+    asset_types = np.repeat(
+        np.array(list(assets_per_type), dtype=object), list(assets_per_type.values())
+    )
+    ids = np.concatenate([np.arange(count) for count in assets_per_type.values()])
+    return _build_assets(
+        list(assets_per_type), asset_types, ids, longitude[:total], latitude[:total], as_table
+    )
+
+
+def asset_list(
+    x1=41.255,
+    y1=-117.33,
+    x2=41.255,
+    y2=-117.33,
+    samples=100,
+    seed: Union[int, None] = 3,
+    as_table: bool = False,
+):
+    """Generates synthetic assets on a `samples x samples` grid.
+
+    Every grid cell holds an asset of a given type with the probability listed in
+    `ASSET_PROBABILITIES`. The cells of every type are drawn in a single vectorized
+    call to a seeded `numpy.random.Generator`.
+
+    Args:
+        x1 (float): Latitude of the first grid corner
+        y1 (float): Longitude of the first grid corner
+        x2 (float): Latitude of the opposite grid corner
+        y2 (float): Longitude of the opposite grid corner
+        samples (int): Number of grid points along each axis
+        seed (int): Seed of the random generator, random if None
+        as_table (bool): Set to true to return an `AssetTable` instead of a dictionary
+
+    Returns:
+        tuple: Assets and a MultiPolygon enclosing the grid in (lat, lon) coordinates
+    """
     x = np.linspace(x1, x2, samples)
     y = np.linspace(y1, y2, samples)
-    
-    seed(3)
-    asset_probabilities = {
-        AssetTypes.substation: 1 / 10000.0,
-        AssetTypes.solar_panels : 1/500,
-        AssetTypes.buried_lines : 1/10.0,
-        AssetTypes.wind_turbines : 1/5000,
-        AssetTypes.battery_storage :1/2000,
-        AssetTypes.transmission_poles: 1 / 10.0,
-        AssetTypes.distribution_poles : 1 / 10.0,
-        AssetTypes.transmission_overhead_lines : 1/10.0,
-        AssetTypes.distribution_overhead_lines : 1/10.0,
-    }
-    
-    heights_ft = {
-        AssetTypes.substation.name : 3,
-        AssetTypes.solar_panels.name : 10,
-        AssetTypes.buried_lines.name : -3,
-        AssetTypes.wind_turbines.name : 25,
-        AssetTypes.battery_storage.name : 4,
-        AssetTypes.transmission_poles.name : 0,
-        AssetTypes.distribution_poles.name : 0,
-        AssetTypes.transmission_overhead_lines.name : 100,
-        AssetTypes.distribution_overhead_lines.name : 30,
-    }
-    
-    assets = {
-        AssetTypes.substation.name : {},
-        AssetTypes.solar_panels.name : {},
-        AssetTypes.buried_lines.name : {},
-        AssetTypes.wind_turbines.name : {},
-        AssetTypes.battery_storage.name :{},
-        AssetTypes.transmission_poles.name : {},
-        AssetTypes.distribution_poles.name : {},
-        AssetTypes.transmission_overhead_lines.name : {},
-        AssetTypes.distribution_overhead_lines.name : {},
-    }
-    
-    for asset_type, probability in asset_probabilities.items():
-        asset_id = 0
-        for x1 in x:
-            for y1 in y:    
-                if random() < probability:
-                    assets[asset_type.name][f"{asset_type.name} {asset_id}"] = {"coordinates" : (x1, y1), "heights_ft": heights_ft[asset_type.name]}
-                    asset_id += 1
-    
+
+    rng = np.random.default_rng(seed)
+    asset_types, ids, cells = [], [], []
+    for asset_type, probability in ASSET_PROBABILITIES.items():
+        selected = np.flatnonzero(rng.random(samples * samples) < probability)
+        asset_types.append(np.full(len(selected), asset_type.name, dtype=object))
+        ids.append(np.arange(len(selected)))
+        cells.append(selected)
+    asset_types, ids, cells = [np.concatenate(a) for a in [asset_types, ids, cells]]
+
+    # Cells are numbered with latitude varying slowest
+    assets = _build_assets(
+        [asset_type.name for asset_type in ASSET_PROBABILITIES], asset_types, ids, y[cells % samples], x[cells // samples], as_table
+    )
+
     p1 = Point(x.min(), y.min())
     p2 = Point(x.max(), y.min())
     p3 = Point(x.max(), y.max())
@@ -91,4 +374,4 @@ def asset_list(x1=41.255, y1=-117.33, x2=41.255, y2=-117.33, samples=100):
     poly = Polygon(pointList)
     mypoly = MultiPolygon([poly]) 
     
-    return assets, mypoly
\ No newline at end of file
+    return assets, mypoly
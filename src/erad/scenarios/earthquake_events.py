@@ -0,0 +1,351 @@
+""" Module for stochastic earthquake event sets.
+
+Epicenters, magnitudes and depths are sampled around a region, magnitudes from a
+truncated Gutenberg-Richter distribution. Models can be calibrated from the
+historic earthquakes in the event catalog. Event sets are evaluated against the
+assets of a feeder in batches and the expected number of failed assets and
+customers of every event is reduced into fixed-bin histograms, so memory does
+not grow with the number of events.
+
+Example:
+    >>> model = StochasticEarthquakeModel.from_catalog((-123.5, 37.5, -121.5, 39.0))
+    >>> exceedance = loss_exceedance(model, assets, events=100_000, seed=1, workers=4)
+    >>> exceedance.curve("assets")
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Tuple, Union
+import math
+
+import numpy as np
+import pandas as pd
+
+from erad.scenarios.catalog import EventCatalog, default_catalog
+from erad.scenarios.common import AssetTable
+from erad.scenarios.earthquake_scenario import EarthquakeScenario
+from erad.scenarios.utilities import geodesic_distance
+from erad.utils import instrumentation
+
+# Magnitude range covered by `EarthquakeScenario.intensity_map`
+MIN_MAGNITUDE = 2.5
+MAX_MAGNITUDE = 8.0
+KM_PER_DEGREE = 111.2
+
+
+class StochasticEarthquakeModel:
+    """Generator of random earthquakes around a region.
+
+    Attributes:
+        bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the source region
+        b_value (float): Gutenberg-Richter b value
+        min_magnitude (float): Smallest sampled magnitude
+        max_magnitude (float): Largest sampled magnitude
+        depth_km (tuple | np.ndarray): (min, max) of uniformly sampled depths, or
+            observed depths resampled with replacement
+        annual_rate (float): Yearly number of events above `min_magnitude`, None if unknown
+        epicenters (np.ndarray): Observed (longitude, latitude) epicenters that new
+            epicenters are drawn around, uniform in `bounds` if None
+        smoothing_km (float): Standard deviation of the offset from observed epicenters
+    """
+
+    def __init__(
+        self,
+        bounds: Tuple[float, float, float, float],
+        b_value: float = 1.0,
+        min_magnitude: float = 4.0,
+        max_magnitude: float = MAX_MAGNITUDE,
+        depth_km: Union[Tuple[float, float], np.ndarray] = (5.0, 30.0),
+        annual_rate: Union[float, None] = None,
+        epicenters: Union[np.ndarray, None] = None,
+        smoothing_km: float = 10.0,
+    ) -> None:
+        assert MIN_MAGNITUDE <= min_magnitude < max_magnitude <= MAX_MAGNITUDE, (
+            f"Magnitudes should be within [{MIN_MAGNITUDE}, {MAX_MAGNITUDE}] covered by the intensity map"
+        )
+        assert b_value > 0, "b value should be positive"
+        self.bounds = tuple(bounds)
+        self.b_value = b_value
+        self.min_magnitude = min_magnitude
+        self.max_magnitude = max_magnitude
+        self.depth_km = depth_km if isinstance(depth_km, tuple) else np.asarray(depth_km, dtype=float)
+        self.annual_rate = annual_rate
+        self.epicenters = None if epicenters is None else np.asarray(epicenters, dtype=float).reshape(-1, 2)
+        self.smoothing_km = smoothing_km
+
+    @classmethod
+    def from_catalog(
+        cls,
+        bounds: Tuple[float, float, float, float],
+        catalog: Union[EventCatalog, None] = None,
+        min_magnitude: float = 4.0,
+        max_magnitude: float = MAX_MAGNITUDE,
+        smoothing_km: float = 10.0,
+    ) -> "StochasticEarthquakeModel":
+        """Calibrates a model from the historic earthquakes within a region.
+
+        The b value is the Aki maximum likelihood estimate, the annual rate is the
+        number of events above `min_magnitude` over the years covered by the
+        catalog, and depths and epicenters are resampled from the observed events.
+
+        Args:
+            bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the region
+            catalog (EventCatalog): Catalog of historic events, defaults to the ERAD database
+            min_magnitude (float): Completeness magnitude of the catalog
+            max_magnitude (float): Largest sampled magnitude
+            smoothing_km (float): Standard deviation of the offset from observed epicenters
+        """
+        catalog = catalog if catalog is not None else default_catalog()
+        events = catalog.earthquakes_in(bounds, min_magnitude)
+        events = events[events["magnitude"] <= max_magnitude]
+        if len(events) < 2:
+            raise ValueError(f"At least two historic earthquakes are needed in {bounds}, found {len(events)}")
+
+        mean_excess = events["magnitude"].mean() - min_magnitude
+        b_value = math.log10(math.e) / mean_excess if mean_excess > 0 else 1.0
+        years = (events["timestamp"].max() - events["timestamp"].min()).days / 365.25
+        annual_rate = len(events) / years if years > 0 else None
+        return cls(
+            bounds,
+            b_value=b_value,
+            min_magnitude=min_magnitude,
+            max_magnitude=max_magnitude,
+            depth_km=events["depth"].to_numpy(),
+            annual_rate=annual_rate,
+            epicenters=events[["longitude", "latitude"]].to_numpy(),
+            smoothing_km=smoothing_km,
+        )
+
+    def sample_magnitudes(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Samples magnitudes from the truncated Gutenberg-Richter distribution."""
+        span = 1 - 10 ** (-self.b_value * (self.max_magnitude - self.min_magnitude))
+        return self.min_magnitude - np.log10(1 - rng.random(size) * span) / self.b_value
+
+    def sample(self, size: int, seed=None) -> pd.DataFrame:
+        """Samples events.
+
+        Args:
+            size (int): Number of events
+            seed (int | np.random.SeedSequence): Seed of the events
+
+        Returns:
+            pd.DataFrame: longitude, latitude, magnitude and depth of every event
+        """
+        rng = np.random.default_rng(seed)
+        lon_min, lat_min, lon_max, lat_max = self.bounds
+        if self.epicenters is None:
+            longitude = rng.uniform(lon_min, lon_max, size)
+            latitude = rng.uniform(lat_min, lat_max, size)
+        else:
+            origins = self.epicenters[rng.integers(len(self.epicenters), size=size)]
+            offsets = rng.normal(0, self.smoothing_km / KM_PER_DEGREE, (size, 2))
+            latitude = np.clip(origins[:, 1] + offsets[:, 1], -90, 90)
+            longitude = origins[:, 0] + offsets[:, 0] / np.maximum(np.cos(np.radians(latitude)), 0.01)
+
+        if isinstance(self.depth_km, tuple):
+            depth = rng.uniform(*self.depth_km, size)
+        else:
+            depth = rng.choice(self.depth_km, size)
+        return pd.DataFrame(
+            {
+                "longitude": longitude,
+                "latitude": latitude,
+                "magnitude": self.sample_magnitudes(rng, size),
+                "depth": depth,
+            }
+        )
+
+
+class ExceedanceHistogram:
+    """Fixed-bin histogram of event losses weighted by event rates.
+
+    Attributes:
+        edges (np.ndarray): Bin edges, losses above the last edge go to the last bin
+        weights (np.ndarray): Accumulated rate per bin
+        events (int): Number of recorded events
+        total (float): Rate weighted sum of losses
+        maximum (float): Largest recorded loss
+    """
+
+    def __init__(self, edges: np.ndarray) -> None:
+        self.edges = np.asarray(edges, dtype=float)
+        self.weights = np.zeros(len(self.edges) - 1)
+        self.events = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, losses: np.ndarray, rate: float) -> None:
+        """Records losses of events that all occur with the same rate."""
+        losses = np.asarray(losses, dtype=float)
+        bins = np.clip(np.searchsorted(self.edges, losses, side="right") - 1, 0, len(self.weights) - 1)
+        self.weights += np.bincount(bins, minlength=len(self.weights)) * rate
+        self.events += len(losses)
+        self.total += float(losses.sum()) * rate
+        if len(losses):
+            self.maximum = max(self.maximum, float(losses.max()))
+
+    def curve(self) -> pd.DataFrame:
+        """Returns the rate of events with a loss of at least every bin edge."""
+        rate = np.cumsum(self.weights[::-1])[::-1]
+        return pd.DataFrame({"loss": self.edges[:-1], "exceedance_rate": rate})
+
+
+class LossExceedance:
+    """Exceedance of expected failed assets and customers over an event set.
+
+    Rates are yearly frequencies if the model has an annual rate, otherwise the
+    fraction of events.
+
+    Attributes:
+        assets (ExceedanceHistogram): Expected number of failed assets per event
+        customers (ExceedanceHistogram): Expected number of customers of failed assets per event
+        annual (bool): True if rates are yearly frequencies
+    """
+
+    def __init__(self, assets: ExceedanceHistogram, customers: ExceedanceHistogram, annual: bool) -> None:
+        self.assets = assets
+        self.customers = customers
+        self.annual = annual
+
+    @property
+    def events(self) -> int:
+        return self.assets.events
+
+    def mean(self, loss: str = "assets") -> float:
+        """Returns the rate weighted mean loss, the average annual loss for yearly rates."""
+        return getattr(self, loss).total
+
+    def curve(self, loss: str = "assets") -> pd.DataFrame:
+        """Returns the exceedance curve of expected failed "assets" or "customers".
+
+        For yearly rates the curve also holds the probability of at least one
+        exceedance in a year and the return period in years.
+        """
+        curve = getattr(self, loss).curve()
+        if self.annual:
+            curve["annual_probability"] = -np.expm1(-curve["exceedance_rate"])
+            with np.errstate(divide="ignore"):
+                curve["return_period_years"] = 1 / curve["exceedance_rate"]
+        return curve
+
+
+# Asset table and customers shared with the tasks of a worker process
+_SHARED = None
+
+
+def _share(table: AssetTable, customers: np.ndarray) -> None:
+    global _SHARED
+    _SHARED = (table, customers)
+
+
+def _event_losses(
+    model: StochasticEarthquakeModel,
+    seed_sequence: np.random.SeedSequence,
+    size: int,
+    table: AssetTable,
+    customers: np.ndarray,
+    probability_model: dict,
+    block_size: int = 2**22,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Samples a batch of events and returns expected failed assets and customers per event."""
+    events = model.sample(size, seed_sequence)
+    longitude = events["longitude"].to_numpy()[:, None]
+    latitude = events["latitude"].to_numpy()[:, None]
+    magnitude = events["magnitude"].to_numpy()[:, None]
+    depth = events["depth"].to_numpy()[:, None]
+    assets_per_block = max(1, block_size // size)
+    failed_assets = np.zeros(size)
+    failed_customers = np.zeros(size)
+    for asset_type, index in table.groups():
+        if asset_type not in probability_model:
+            continue
+        # Events along the first axis, assets along the second one
+        for start in range(0, len(index), assets_per_block):
+            rows = index[start : start + assets_per_block]
+            distances = geodesic_distance(longitude, latitude, table.longitude[rows], table.latitude[rows])
+            pga = EarthquakeScenario.attenuation(distances, magnitude, depth)
+            failure = probability_model[asset_type].probabilities(pga.ravel()).reshape(pga.shape)
+            failed_assets += failure.sum(axis=1)
+            failed_customers += failure @ customers[rows]
+    return failed_assets, failed_customers
+
+
+def _shared_event_losses(model, seed_sequence, size, probability_model):
+    table, customers = _SHARED
+    return _event_losses(model, seed_sequence, size, table, customers, probability_model)
+
+
+def _batches(events: int, batch_size: int, seed) -> Iterator[Tuple[np.random.SeedSequence, int]]:
+    """Yields one independent seed and size per batch, without materializing all batches."""
+    root = np.random.SeedSequence(seed)
+    for start in range(0, events, batch_size):
+        yield root.spawn(1)[0], min(batch_size, events - start)
+
+
+@instrumentation.timed("scenarios.earthquake_loss_exceedance")
+def loss_exceedance(
+    model: StochasticEarthquakeModel,
+    assets: Union[dict, AssetTable],
+    events: int,
+    seed: Union[int, None] = None,
+    customers: Union[Dict[str, float], None] = None,
+    probability_model: Union[dict, None] = None,
+    batch_size: int = 256,
+    workers: int = 1,
+    bins: int = 200,
+) -> LossExceedance:
+    """Evaluates a stochastic event set against a set of assets.
+
+    Events are sampled in batches from independent streams spawned from `seed`,
+    so the same seed gives the same result for any number of workers. At most
+    two batches per worker are in flight and only histograms are kept, so memory
+    does not depend on the number of events.
+
+    Args:
+        model (StochasticEarthquakeModel): Event generator
+        assets (dict | AssetTable): Assets of the feeder, not modified
+        events (int): Number of events
+        seed (int): Seed of the event set, random if not provided
+        customers (dict): Number of customers served by each asset, by asset name
+        probability_model (dict): Fragility curves per asset type, the default
+            earthquake fragility curves if not provided
+        batch_size (int): Events per batch
+        workers (int): Number of worker processes
+        bins (int): Number of histogram bins
+
+    Returns:
+        LossExceedance: Exceedance histograms of failed assets and customers
+    """
+    table = AssetTable.from_assets(assets).base_copy()
+    probability_model = probability_model if probability_model is not None else EarthquakeScenario.fragility_curves
+    customers = np.array([(customers or {}).get(name, 0.0) for name in table.names], dtype=float)
+
+    annual = model.annual_rate is not None
+    rate = (model.annual_rate if annual else 1.0) / max(events, 1)
+    result = LossExceedance(
+        ExceedanceHistogram(np.linspace(0, max(len(table), 1), bins + 1)),
+        ExceedanceHistogram(np.linspace(0, max(customers.sum(), 1), bins + 1)),
+        annual,
+    )
+
+    def record(losses):
+        result.assets.add(losses[0], rate)
+        result.customers.add(losses[1], rate)
+
+    if workers > 1 and events > batch_size:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_share, initargs=(table, customers)
+        ) as executor:
+            pending = []
+            for seed_sequence, size in _batches(events, batch_size, seed):
+                pending.append(
+                    executor.submit(_shared_event_losses, model, seed_sequence, size, probability_model)
+                )
+                if len(pending) >= 2 * workers:
+                    record(pending.pop(0).result())
+            for future in pending:
+                record(future.result())
+    else:
+        for seed_sequence, size in _batches(events, batch_size, seed):
+            record(_event_losses(model, seed_sequence, size, table, customers, probability_model))
+    instrumentation.count("scenarios.earthquake_events", events)
+    return result
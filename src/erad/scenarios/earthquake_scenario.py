@@ -1,18 +1,19 @@
 
-import matplotlib.pyplot as plt
 from erad.scenarios.utilities import ProbabilityFunctionBuilder, GeoUtilities
-from erad.constants import ERAD_DB, HISTROIC_EARTHQUAKE_TABLE
 from shapely import Point, LineString
 from erad.scenarios.abstract_scenario import BaseScenario
+from erad.scenarios.cache import cached_survival_probability
+from erad.scenarios.catalog import EventCatalog, default_catalog
 from erad.scenarios.common import asset_list
 from datetime import datetime
-import pandas as pd
+from typing import Tuple, Union
 import numpy as np
-import sqlite3
+import functools
 import math
-import os
 
-from erad.scenarios.common import AssetTypes
+from erad.scenarios.common import AssetTypes, AssetTable
+from erad.scenarios.grid import RegularGrid, cached_grid
+from erad.utils import instrumentation
 from erad.scenarios.utilities import ProbabilityFunctionBuilder
 
 class EarthquakeScenario(BaseScenario, GeoUtilities):
@@ -47,6 +48,12 @@ class EarthquakeScenario(BaseScenario, GeoUtilities):
             
         }
     
+    # Grid spacing in degrees of the PGA shake map sampled by assets, attenuation
+    # is evaluated for every asset if None
+    shake_map_resolution = None
+    # Folder where shake maps are stored and reused across runs, in memory only if None
+    shake_map_directory = None
+
     intensity_map = LineString([[1, 2.5], [2, 3.0], [3, 3.5], [4, 4.0], [5, 4.5], [6, 5.0], [7, 5.5], [8, 6.0], [9, 6.5], [10, 7.0], [11, 7.5], [12, 8.0]])
     def __init__(self,  origin : Point , probability_model : dict, timestamp : datetime, **kwargs) -> None:
         """Constructor for EarthquakeScenario.
@@ -63,42 +70,53 @@ class EarthquakeScenario(BaseScenario, GeoUtilities):
         return
     
     @classmethod
-    def from_dynamic_model(cls, origin : Point , probability_function : dict, timestamp : datetime):
-        raise NotImplementedError("Method needs to be defined in derived classes")
+    def from_dynamic_model(cls, origin : Point , probability_function : dict, timestamp : datetime, radius_km : float = 50.0, seed = None, **model_kwargs):
+        """Class method sampling a random earthquake around a point.
+
+        The epicenter is uniform in a box of half width `radius_km` around `origin`,
+        the magnitude follows a truncated Gutenberg-Richter distribution.
+
+        Args:
+            origin (Point): Center of the source region
+            probability_function (dict): Dictionary mapping asset types to probability funcitons
+            timestamp (datetime): Scenario occurance time 
+            radius_km (float): Half width of the source region
+            seed (int): Seed of the sampled event
+            model_kwargs (dict): Additional arguments of `StochasticEarthquakeModel`, e.g. b_value
+        """
+        from erad.scenarios.earthquake_events import KM_PER_DEGREE, StochasticEarthquakeModel
+
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(origin.y)), 0.01)
+        model = StochasticEarthquakeModel(
+            (origin.x - dlon, origin.y - dlat, origin.x + dlon, origin.y + dlat), **model_kwargs
+        )
+        event = model.sample(1, seed).iloc[0]
+        return cls(
+            Point(event.longitude, event.latitude),
+            probability_function,
+            timestamp,
+            Magnitude=float(event.magnitude),
+            Depth=float(event.depth),
+        )
     
     @classmethod
-    def from_historical_earthquake_by_code(cls, earthquake_code : str, probability_function : dict= None):
+    def from_historical_earthquake_by_code(cls, earthquake_code : str, probability_function : dict= None, catalog : EventCatalog = None):
         """Class method for EarthquakeScenario.
 
         Args:
             earthquake_code (str): Code for a historic eqrthquake event
             probability_function (dict): Dictionary mapping asset types to probability funcitons
+            catalog (EventCatalog): Catalog the earthquake is looked up in, defaults to the ERAD database
         """
-        assert os.path.exists(ERAD_DB), f"The data file {ERAD_DB} not found"
-
-        conn = sqlite3.connect(ERAD_DB)
-        earthquake_data = pd.read_sql(f"SELECT * FROM {HISTROIC_EARTHQUAKE_TABLE}", conn)
-        conn.close()
-
-        earthquake_data['Date'] = pd.to_datetime(earthquake_data['Date'])
-        earthquake_data['Time'] = pd.to_datetime(earthquake_data['Time'])
-
-        earthquake_data['DateTime'] = earthquake_data.apply(
-            lambda row: datetime.combine(row['Date'].date(), row['Time'].time()),
-            axis=1
-        )
-
-        earthquake_data_filtered = earthquake_data[earthquake_data['ID'] == earthquake_code]
-        assert not earthquake_data_filtered.empty, f"No earthquake {earthquake_code} found in the database"
-        timestamp = earthquake_data_filtered.DateTime.values[0]
+        catalog = catalog if catalog is not None else default_catalog()
+        earthquake = catalog.earthquake(earthquake_code)
         kwargs = {
-            "Magnitude": earthquake_data_filtered.Magnitude.values[0],
-            "Depth" : earthquake_data_filtered.Depth.values[0],
+            "Magnitude": earthquake.magnitude,
+            "Depth" : earthquake.depth,
             }
-        long = earthquake_data_filtered.Longitude.values[0]
-        lat = earthquake_data_filtered.Latitude.values[0]
-        origin = Point(long, lat) 
-        return cls(origin, probability_function, timestamp, **kwargs)
+        origin = Point(earthquake.longitude, earthquake.latitude) 
+        return cls(origin, probability_function, earthquake.timestamp, **kwargs)
     
     @property
     def centroid(self):
@@ -109,39 +127,165 @@ class EarthquakeScenario(BaseScenario, GeoUtilities):
         """Method to increment simulation time for time evolviong scenarios."""
         raise NotImplementedError("Method needs to be defined in derived classes")
 
-    def calculate_survival_probability(self, assets : dict, timestamp : datetime) -> dict:
+    @cached_survival_probability(ignore=("timestamp",))
+    def calculate_survival_probability(self, assets : Union[dict, AssetTable], timestamp : datetime) -> Union[dict, AssetTable]:
         """Method to calculate survival probaility of asset types.
 
         Args:
-            assets (dict): The dictionary of all assets and their corresponding asset types
+            assets (dict | AssetTable): The dictionary or table of all assets and their corresponding asset types
         """
-        for asset_type, asset_dict in assets.items():
+        table = AssetTable.from_assets(assets)
+        groups = [
+            (asset_type, index) for asset_type, index in table.groups()
             # assert asset_type in self.probability_model, f"Survival probability for asset type '{asset_type}' not found in the passed probability_model"
-            if asset_type in self.probability_model:
-                
-                probability_function = self.probability_model[asset_type]
-                for asset_name, asset_ppty in asset_dict.items():
-                    coords = Point(asset_ppty["coordinates"][::-1])
-                    
-                    epicenter_distance = self.distance_from_centroid(coords)
-        
-                    depth = self.kwargs["Depth"]
-                    magnitude = self.kwargs["Magnitude"]
-
-                    # Valutazione speditiva di sicurezza sismica degli edifici esistenti
-                    hypocentral_distance = (depth**2 + epicenter_distance**2)**0.5
-                    l = LineString([[0, magnitude], [100, magnitude]])
-                    p = self.intensity_map.intersection(l)
-                    Imcs = p.xy[0][0]
-                    intensity = Imcs + 3 - 4.3 * math.log10(hypocentral_distance)
-                    intensity = 0 if intensity < 0 else intensity
-                    pga = 10**((intensity /3) - 1) / 9.81
-                    probility =  1- probability_function.probability(pga)
-                    assets[asset_type][asset_name]["survival_probability"] = probility
-        return assets
+            if asset_type in self.probability_model
+        ]
+        if not groups:
+            return table.to_assets(assets)
+
+        # PGA of all modelled assets in one pass
+        rows = np.concatenate([index for _, index in groups])
+        if self.shake_map_resolution is None:
+            epicenter_distances = self.distances_from_centroid(table.longitude[rows], table.latitude[rows])
+            pgas = self.peak_ground_acceleration(epicenter_distances)
+        else:
+            pgas = self.sample_shake_map(table.longitude[rows], table.latitude[rows])
+
+        start = 0
+        for asset_type, index in groups:
+            probability_function = self.probability_model[asset_type]
+            probilities = probability_function.probabilities(pgas[start : start + len(index)], complement=True)
+            table.set_column("survival_probability", probilities, index)
+            start += len(index)
+        return table.to_assets(assets)
+
+    def shake_map(self, bounds: Tuple[float, float, float, float], resolution: float = None) -> RegularGrid:
+        """Returns a PGA grid in g covering a region.
+
+        Grids are kept in memory per resolution. A grid covering the region is
+        reused, otherwise a grid covering both the region and the previous grid
+        is built, so queries for new assets extend the grid instead of adding one.
+
+        Args:
+            bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the region
+            resolution (float): Grid spacing in degrees, defaults to `shake_map_resolution`
+        """
+        resolution = resolution or self.shake_map_resolution or 0.01
+        if not hasattr(self, "_shake_maps"):
+            self._shake_maps = {}
+        grid = self._shake_maps.get(resolution)
+        if grid is not None:
+            lon_min, lat_min, lon_max, lat_max = grid.bounds
+            if lon_min <= bounds[0] and lat_min <= bounds[1] and lon_max >= bounds[2] and lat_max >= bounds[3]:
+                return grid
+            bounds = (
+                min(lon_min, bounds[0]),
+                min(lat_min, bounds[1]),
+                max(lon_max, bounds[2]),
+                max(lat_max, bounds[3]),
+            )
+
+        def pga(longitude, latitude):
+            return self.peak_ground_acceleration(self.distances_from_centroid(longitude, latitude))
+
+        key = {
+            "origin": [self.origin.x, self.origin.y],
+            "magnitude": float(self.kwargs["Magnitude"]),
+            "depth": float(self.kwargs["Depth"]),
+        }
+        with instrumentation.span("scenarios.EarthquakeScenario.shake_map"):
+            grid = cached_grid(self.shake_map_directory, "shake_map", key, bounds, resolution, pga)
+        self._shake_maps[resolution] = grid
+        return grid
+
+    def sample_shake_map(self, longitude: np.ndarray, latitude: np.ndarray, resolution: float = None) -> np.ndarray:
+        """Returns the PGA in g at points sampled from the shake map.
+
+        Args:
+            longitude (np.ndarray): Longitudes of the points
+            latitude (np.ndarray): Latitudes of the points
+            resolution (float): Grid spacing in degrees, defaults to `shake_map_resolution`
+        """
+        resolution = resolution or self.shake_map_resolution or 0.01
+        longitude = np.asarray(longitude, dtype=float)
+        latitude = np.asarray(latitude, dtype=float)
+        if not longitude.size:
+            return np.zeros(0)
+        bounds = (
+            longitude.min() - resolution,
+            latitude.min() - resolution,
+            longitude.max() + resolution,
+            latitude.max() + resolution,
+        )
+        return self.shake_map(bounds, resolution).sample(longitude, latitude)
+
+    def plot_shake_map(self, bounds: Tuple[float, float, float, float] = None, resolution: float = None, ax=None):
+        """Plots the shake map, the grid already in memory if bounds are not given."""
+        import matplotlib.pyplot as plt
+
+        resolution = resolution or self.shake_map_resolution or 0.01
+        if bounds is None:
+            grid = getattr(self, "_shake_maps", {}).get(resolution)
+            assert grid is not None, "No shake map in memory, pass the bounds of the region"
+        else:
+            grid = self.shake_map(bounds, resolution)
+        if ax is None:
+            _, ax = plt.subplots()
+        mesh = ax.pcolormesh(grid.longitude, grid.latitude, grid.values, shading="auto")
+        ax.plot(self.origin.x, self.origin.y, "r*")
+        ax.figure.colorbar(mesh, ax=ax, label="PGA (g)")
+        return ax
+
+    def _fingerprint_parts(self) -> list:
+        if self.shake_map_resolution is None:
+            return []
+        return [f"shake_map:{self.shake_map_resolution}".encode()]
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def mcs_intensity(cls, magnitude: float) -> float:
+        """Returns the MCS intensity at the epicenter for a magnitude from `intensity_map`."""
+        l = LineString([[0, magnitude], [100, magnitude]])
+        p = cls.intensity_map.intersection(l)
+        if p.is_empty:
+            raise ValueError(f"Magnitude {magnitude} is outside of the intensity map range")
+        return p.xy[0][0]
+
+    def peak_ground_acceleration(self, epicenter_distances: np.ndarray) -> np.ndarray:
+        """Returns the PGA in g for epicentral distances in km.
+
+        Args:
+            epicenter_distances (np.ndarray): Distances from the epicenter in km
+        """
+        return self.attenuation(epicenter_distances, self.kwargs["Magnitude"], self.kwargs["Depth"])
+
+    @classmethod
+    def attenuation(cls, epicenter_distances: np.ndarray, magnitude, depth) -> np.ndarray:
+        """Returns the PGA in g for epicentral distances in km, magnitudes and depths in km.
+
+        Inputs are broadcast against each other, e.g. magnitudes and depths of shape
+        (events, 1) and distances of shape (events, assets) for a set of events.
+        """
+        if np.ndim(magnitude):
+            # Linear interpolation along the map, equal to `mcs_intensity` up to rounding
+            magnitudes, intensities = np.asarray(cls.intensity_map.coords).T[::-1]
+            magnitude = np.asarray(magnitude, dtype=float)
+            if magnitude.size and (magnitude.min() < magnitudes[0] or magnitude.max() > magnitudes[-1]):
+                raise ValueError("Magnitudes are outside of the intensity map range")
+            Imcs = np.interp(magnitude, magnitudes, intensities)
+        else:
+            Imcs = cls.mcs_intensity(magnitude)
+
+        # Valutazione speditiva di sicurezza sismica degli edifici esistenti
+        hypocentral_distance = (depth**2 + np.asarray(epicenter_distances, dtype=float)**2)**0.5
+        intensity = Imcs + 3 - 4.3 * np.log10(hypocentral_distance)
+        intensity = np.maximum(intensity, 0)
+        return 10**((intensity /3) - 1) / 9.81
 
     def plot(self, d : float):
         """Method to plot survival probaility of in the region of interest"""
+        import matplotlib.pyplot as plt
+
         m = range(2, 10)
         h = np.linspace(14, 70, 100)
        
@@ -1,32 +1,45 @@
 from erad.constants import FIRE_HISTORIC_GEODATAFRAME_PATH, DATA_FOLDER
 from erad.scenarios.utilities import ProbabilityFunctionBuilder
-from erad.constants import ERAD_DB, HISTROIC_FIRE_TABLE
 from shapely import MultiPolygon, Point, LineString
 from erad.scenarios.abstract_scenario import BaseScenario
-from erad.exceptions import FeatureNotImplementedError
+from erad.scenarios.cache import cached_survival_probability
+from erad.scenarios.catalog import EventCatalog, default_catalog
 from erad.scenarios.utilities import GeoUtilities
-from erad.scenarios.common import AssetTypes
-import matplotlib.pyplot as plt
-from datetime import datetime
-import geopandas as gpd
-import pandas as pd
+from erad.scenarios.common import AssetTypes, AssetTable
+from erad.utils import instrumentation
+from datetime import datetime, timedelta
+from typing import Iterator, List, NamedTuple, Tuple, Union
 import numpy as np
-import sqlite3
 import pyproj
-import os
 
-from shapely import wkb
+from shapely import STRtree
+import shapely
 
 from uuid import UUID
 from enum import Enum
 from pathlib import Path
-import fiona
 
 class FireSelection(str, Enum):
     UUID  = "uuid"
     NAME = "name"
 
 
+class FireTimeStep(NamedTuple):
+    """Survival update of the assets re-evaluated at one step of an evolving fire.
+
+    Attributes:
+        timestamp (datetime): Time of the perimeter
+        perimeter (MultiPolygon): Perimeter of the fire at this step
+        names (np.ndarray): Names of the re-evaluated assets
+        survival_probability (np.ndarray): Lowest survival probability of the
+            re-evaluated assets over all steps so far
+    """
+    timestamp: datetime
+    perimeter: MultiPolygon
+    names: np.ndarray
+    survival_probability: np.ndarray
+
+
 class FireScenario(BaseScenario, GeoUtilities): 
     """Base class for FireScenario. Extends BaseScenario and GeoUtilities
 
@@ -61,9 +74,7 @@ class FireScenario(BaseScenario, GeoUtilities):
         return      
     
     @staticmethod
-    def fetch_historical_fire_data(fire_info: str|UUID, selection_mode: FireSelection):
-        assert os.path.exists(ERAD_DB), f"The data file {ERAD_DB} not found"
-        conn = sqlite3.connect(ERAD_DB)
+    def fetch_historical_fire_data(fire_info: str|UUID, selection_mode: FireSelection, catalog: EventCatalog = None):
         if selection_mode == FireSelection.NAME:
             assert isinstance(fire_info, str), "Fire name should be of type string"
             column_name= "firename"
@@ -73,12 +84,8 @@ class FireScenario(BaseScenario, GeoUtilities):
         else:
             raise ValueError("Unsupported chose. Valid options are ['name', 'uuid']")
         
-        fire_data = pd.read_sql(f"SELECT * FROM {HISTROIC_FIRE_TABLE} WHERE {column_name} = '{fire_info}';", conn)
-        if fire_data.empty:
-            raise ValueError(f"Fire '{fire_info}'  not found in column '{column_name}', table '{HISTROIC_FIRE_TABLE}' in the database")
- 
-        conn.close() 
-        return fire_data
+        catalog = catalog if catalog is not None else default_catalog()
+        return catalog.fires(column_name, fire_info)
     
     @classmethod
     def from_dynamic_model(cls, multipolygon : MultiPolygon , probability_function : dict, timestamp : datetime):
@@ -95,7 +102,8 @@ class FireScenario(BaseScenario, GeoUtilities):
             probability_function (dict): Dictionary mapping asset types to probability funcitons
         """
         fire_data = cls.fetch_historical_fire_data(fire_name, FireSelection.NAME)
-        geometry = [wkb.loads(g) for g in fire_data.GEOMETRY]
+        import geopandas as gpd
+        geometry = shapely.from_wkb(fire_data.GEOMETRY.to_numpy())
         cls.fire_data = gpd.GeoDataFrame(fire_data, geometry=geometry) 
         print(cls.fire_data.T)
         cls.fire_data.set_crs('epsg:4326')
@@ -112,7 +120,8 @@ class FireScenario(BaseScenario, GeoUtilities):
             probability_function (dict): Dictionary mapping asset types to probability funcitons
         """
         fire_data = cls.fetch_historical_fire_data(fire_uuid, FireSelection.UUID)
-        geometry = [wkb.loads(g) for g in fire_data.GEOMETRY]
+        import geopandas as gpd
+        geometry = shapely.from_wkb(fire_data.GEOMETRY.to_numpy())
         cls.fire_data = gpd.GeoDataFrame(fire_data, geometry=geometry) 
         cls.fire_data.set_crs('epsg:4326')
         multipolygon = cls.fire_data["geometry"].values[0]   
@@ -141,54 +150,199 @@ class FireScenario(BaseScenario, GeoUtilities):
         """Method to return the centroid of the affected region."""
         return self.polygon.centroid
             
-    def increment_time(self):
-        """Method to increment simulation time for time evolviong scenarios."""
-        raise FeatureNotImplementedError()
+    def spread(self, distance_m: float) -> MultiPolygon:
+        """Returns the perimeter grown by a distance in every direction."""
+        grown = shapely.buffer(self.project(self.multipolygon), distance_m)
+        inverse = self._projected_transformer
+        to_meters = self.projected_crs.axis_info[0].unit_conversion_factor
+
+        def _unproject(coords):
+            x, y = inverse.transform(coords[:, 0] / to_meters, coords[:, 1] / to_meters, direction="INVERSE")
+            return np.column_stack([x, y])
+
+        grown = shapely.transform(grown, _unproject)
+        return grown if isinstance(grown, MultiPolygon) else MultiPolygon([grown])
+
+    def increment_time(
+        self,
+        assets : Union[dict, AssetTable],
+        perimeters: List[Tuple[datetime, MultiPolygon]] = None,
+        time_step: timedelta = timedelta(hours=1),
+        steps: int = 1,
+        spread_rate_m_per_h: float = 100.0,
+        tolerance: float = 1e-6,
+    ) -> Iterator[FireTimeStep]:
+        """Generator moving the fire front and updating the survival probability of assets.
+
+        The front follows the given sequence of perimeters, or grows by
+        `spread_rate_m_per_h` every `time_step` for `steps` steps. The first step
+        evaluates all assets on the current perimeter. Later steps only
+        re-evaluate assets whose distance to the boundary can change: boundaries of
+        consecutive perimeters differ only within the area swept by the front, so
+        an asset further from that area than from the previous boundary keeps its
+        distance. Assets further than the distance at which every fragility curve
+        is within `tolerance` of one are skipped as well, their survival can change
+        by at most `tolerance` and their `distance_to_boundary` is not updated.
+
+        The survival probability of an asset is the lowest one over all steps, so
+        assets reached by the fire stay failed if a later perimeter is smaller.
+        Re-evaluated assets are written back before every step is yielded, so a
+        consumer stopping early still sees the updates of the steps it received.
+
+        Args:
+            assets (dict | AssetTable): The dictionary or table of all assets and their corresponding asset types
+            perimeters (list): (timestamp, perimeter) of the front after the current one
+            time_step (timedelta): Duration of a step of the spread model
+            steps (int): Number of steps of the spread model
+            spread_rate_m_per_h (float): Rate at which the spread model grows the perimeter
+            tolerance (float): Largest change of survival probability that is ignored
+
+        Yields:
+            FireTimeStep: Re-evaluated assets and their survival probability
+        """
+        table = AssetTable.from_assets(assets)
+        for asset_type in table.type_names:
+            assert asset_type in self.probability_model, f"Survival probability for asset type '{asset_type}' not found in the passed probability_model"
+        probability_functions = [self.probability_model[t] for t in table.type_names]
+        # Distance in meters beyond which no survival probability changes by more than the tolerance
+        saturation_m = max(
+            [float(function.distribution.ppf(1 - tolerance)) for function in probability_functions] or [0.0]
+        )
+
+        points = self.project(shapely.points(table.longitude, table.latitude))
+        asset_tree = STRtree(points)
+        survival = np.ones(len(table))
+        distances = np.full(len(table), np.nan)
+
+        def evaluate(rows):
+            inside, step_distances = self.locate_assets(table.longitude[rows], table.latitude[rows])
+            codes = table.type_codes[rows]
+            step_survival = np.empty(len(rows))
+            for code in np.unique(codes):
+                selected = codes == code
+                step_survival[selected] = probability_functions[code].probabilities(step_distances[selected] * 1000)
+            step_survival[inside] = 0
+            survival[rows] = np.minimum(survival[rows], step_survival)
+            distances[rows] = step_distances
+            table.set_column("survival_probability", survival[rows], rows)
+            table.set_column("distance_to_boundary", step_distances, rows)
+            if assets is not table:
+                for name, code, probability, distance in zip(
+                    table.names[rows], codes.tolist(), survival[rows].tolist(), step_distances.tolist()
+                ):
+                    asset = assets[table.type_names[code]][name]
+                    asset["survival_probability"] = probability
+                    asset["distance_to_boundary"] = distance
+            instrumentation.observe("scenarios.fire_step_assets", len(rows))
+            return FireTimeStep(self.timestamp, self.multipolygon, table.names[rows], survival[rows])
 
-    def calculate_survival_probability(self, assets : dict, timestamp : datetime, plot: bool) -> dict:
+        yield evaluate(np.arange(len(table)))
+
+        if perimeters is None:
+            perimeters = (
+                (
+                    self.timestamp + time_step * (step + 1) if self.timestamp is not None else None,
+                    None,
+                )
+                for step in range(steps)
+            )
+        for timestamp, perimeter in perimeters:
+            if perimeter is None:
+                perimeter = self.spread(spread_rate_m_per_h * time_step.total_seconds() / 3600)
+            elif not isinstance(perimeter, MultiPolygon):
+                perimeter = MultiPolygon([perimeter])
+            swept = shapely.symmetric_difference(self.project(self.multipolygon), self.project(perimeter))
+
+            rows = np.sort(asset_tree.query(swept, predicate="dwithin", distance=saturation_m))
+            # Small margin for rounding, distances are cached in km
+            rows = rows[shapely.distance(points[rows], swept) <= distances[rows] * 1000 + 1e-6]
+
+            self.multipolygon = perimeter
+            self.timestamp = timestamp
+            self._boundary_tree = None
+            yield evaluate(rows)
+
+    @instrumentation.timed("scenarios.FireScenario.build_spatial_index")
+    def build_spatial_index(self) -> None:
+        """Prepares the fire perimeter and indexes its boundary for vectorized queries.
+
+        The lon/lat perimeter is prepared for containment checks. The boundary is
+        projected once into `projected_crs` and split into segments stored in an
+        STRtree, so distances are nearest-segment queries in meters.
+        """
+        shapely.prepare(self.multipolygon)
+        rings = shapely.get_parts(self.project(self.boundary))
+        coords, ring_index = shapely.get_coordinates(rings, return_index=True)
+        same_ring = ring_index[:-1] == ring_index[1:]
+        segments = shapely.linestrings(
+            np.stack([coords[:-1][same_ring], coords[1:][same_ring]], axis=1)
+        )
+        self._boundary_tree = STRtree(segments)
+
+    def locate_assets(self, longitude: np.ndarray, latitude: np.ndarray) -> tuple:
+        """Evaluates containment and boundary distance for arrays of asset locations.
+
+        Args:
+            longitude (np.ndarray): Asset longitudes
+            latitude (np.ndarray): Asset latitudes
+
+        Returns:
+            tuple: Boolean array set for assets inside the fire and distances to the
+                boundary in km (zero inside the fire)
+        """
+        if getattr(self, "_boundary_tree", None) is None:
+            self.build_spatial_index()
+        inside = shapely.contains_xy(self.multipolygon, longitude, latitude)
+        points = self.project(shapely.points(longitude, latitude))
+        (point_index, _), distances_m = self._boundary_tree.query_nearest(
+            points, return_distance=True, all_matches=False
+        )
+        distances = np.full(len(points), np.nan)
+        distances[point_index] = distances_m / 1000
+        distances[inside] = 0
+        return inside, distances
+
+    @cached_survival_probability(ignore=("timestamp", "plot"))
+    def calculate_survival_probability(self, assets : Union[dict, AssetTable], timestamp : datetime, plot: bool, indexed: bool = True) -> Union[dict, AssetTable]:
         """Method to calculate survival probaility of asset types.
 
         Args:
-            assets (dict): The dictionary of all assets and their corresponding asset types
+            assets (dict | AssetTable): The dictionary or table of all assets and their corresponding asset types
             plot (bool): Set to true to plot the fire survival model
+            indexed (bool): Use the prepared perimeter and projected STRtree (see `locate_assets`).
+                Set to false to search the nearest boundary point in lon/lat space per asset.
         """
-        if plot:
-            points = []
-        for asset_type, asset_dict in assets.items():
+        table = AssetTable.from_assets(assets)
+        for asset_type, index in table.groups():
             assert asset_type in self.probability_model, f"Survival probability for asset type '{asset_type}' not found in the passed probability_model"
             probability_function = self.probability_model[asset_type]
-            for asset_name, asset_ppty in asset_dict.items():
-                coords = Point(asset_ppty["coordinates"])
-                coords_flipped = Point(coords.y, coords.x)
-
-                if self.in_polygon(coords_flipped):
-                    distance = 0
-                    survival_probability = 0
-                else:
-                    try:
-                        distance = self.distance_from_boundary(coords)
-                    except:
-                        distance = self.distance_from_boundary(Point(coords.y, coords.x))
-                    survival_probability = probability_function.probability(distance*1000)
-                
-                assets[asset_type][asset_name]["survival_probability"] = survival_probability
-                assets[asset_type][asset_name]["distance_to_boundary"] = distance
-                if plot:
-                    points.append((coords.x, coords.y, survival_probability))
+            if indexed:
+                inside, distances = self.locate_assets(table.longitude[index], table.latitude[index])
+            else:
+                inside = np.array([
+                    self.in_polygon(Point(longitude, latitude))
+                    for longitude, latitude in zip(table.longitude[index], table.latitude[index])
+                ], dtype=bool)
+                distances = self.distances_from_boundary(table.longitude[index], table.latitude[index])
+                distances[inside] = 0
+
+            survival_probabilities = probability_function.probabilities(distances * 1000)
+            survival_probabilities[inside] = 0
+            table.set_column("survival_probability", survival_probabilities, index)
+            table.set_column("distance_to_boundary", distances, index)
         if plot:
-            points = np.array(points)
-                    
-            X = points[:,0]
-            Y = points[:,1]
-            Z = points[:,2]
-                    
+            X = table.latitude
+            Y = table.longitude
+            Z = table.column("survival_probability")
+
+            import matplotlib.pyplot as plt
             fig = plt.figure()
             ax = fig.add_subplot(111, projection='3d')
             ax.plot_trisurf(X, Y, Z, color='white', edgecolors='grey', alpha=0.3)
             #ax.scatter(X, Y, Z, c='red')
             plt.show()
                 
-        return assets
+        return table.to_assets(assets)
                 
     def plot(self):
         self.fire_data.plot()
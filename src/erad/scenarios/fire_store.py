@@ -0,0 +1,249 @@
+""" Module for a local store of historic fire perimeters.
+
+The `historic_fires` table is converted once into a GeoParquet file holding the
+WKB perimeters, the attributes of every fire and the bounding box of every
+perimeter in separate columns. Opening the store only reads the bounding boxes
+into an STRtree, perimeters are decoded for the candidate rows of a query.
+
+Example:
+    >>> store = FirePerimeterStore.from_catalog()
+    >>> fires = store.query((-122.95, 38.40, -122.65, 38.60), distance_km=20)
+    >>> scenarios = store.scenarios(fires)
+"""
+
+from pathlib import Path
+from typing import List, Tuple, Union
+import json
+import logging
+import os
+
+from shapely import STRtree
+import numpy as np
+import pandas as pd
+import shapely
+
+from erad.constants import CACHE_FOLDER
+from erad.scenarios.catalog import KM_PER_DEGREE, EventCatalog, default_catalog
+from erad.scenarios.fire_scenario import FireScenario
+from erad.utils import instrumentation
+
+logger = logging.getLogger(__name__)
+
+GEOMETRY_COLUMN = "geometry"
+BBOX_COLUMNS = ["minx", "miny", "maxx", "maxy"]
+# Metadata key holding the catalog signature the store was built from
+SOURCE_KEY = b"erad:source_signature"
+
+
+def _geo_metadata(bbox: List[float]) -> bytes:
+    """GeoParquet 1.0 file metadata for lon/lat WKB perimeters."""
+    return json.dumps(
+        {
+            "version": "1.0.0",
+            "primary_column": GEOMETRY_COLUMN,
+            "columns": {
+                GEOMETRY_COLUMN: {
+                    "encoding": "WKB",
+                    "geometry_types": ["Polygon", "MultiPolygon"],
+                    "bbox": bbox,
+                }
+            },
+        }
+    ).encode()
+
+
+class FirePerimeterStore:
+    """Historic fire perimeters with a spatial index on their bounding boxes.
+
+    Attributes:
+        path (Path): GeoParquet file of the store
+        bounds (np.ndarray): Bounding box (minx, miny, maxx, maxy) of every perimeter
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """Opens a store written by `build`.
+
+        Args:
+            path (str | Path): GeoParquet file of the store
+        """
+        import pyarrow.parquet as pq
+
+        self.path = Path(path)
+        self._table = pq.read_table(self.path, memory_map=True)
+        self.bounds = np.column_stack(
+            [self._table.column(name).to_numpy() for name in BBOX_COLUMNS]
+        ).reshape(-1, 4)
+        self._tree = STRtree(shapely.box(*self.bounds.T))
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    @classmethod
+    @instrumentation.timed("scenarios.FirePerimeterStore.build")
+    def build(
+        cls, path: Union[str, Path], catalog: Union[EventCatalog, None] = None, chunksize: int = 10_000
+    ) -> "FirePerimeterStore":
+        """Writes the historic fire table of a catalog to a GeoParquet file.
+
+        Args:
+            path (str | Path): GeoParquet file to write
+            catalog (EventCatalog): Catalog holding the fires, defaults to the ERAD database
+            chunksize (int): Fires converted at once
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        catalog = catalog if catalog is not None else default_catalog()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+        chunks = []
+        for chunk in catalog.fire_chunks(chunksize):
+            wkb = chunk.pop("GEOMETRY").to_numpy()
+            bounds = shapely.bounds(shapely.from_wkb(wkb))
+            chunk = chunk.astype({c: "string" for c in chunk.columns if chunk[c].dtype == object})
+            for i, name in enumerate(BBOX_COLUMNS):
+                chunk[name] = bounds[:, i]
+            chunk[GEOMETRY_COLUMN] = wkb
+            chunks.append(pa.Table.from_pandas(chunk, preserve_index=False))
+        if not chunks:
+            raise ValueError(f"No historic fires found in {catalog.source}")
+        table = pa.concat_tables(chunks, promote_options="permissive")
+
+        bbox = [
+            pc.min(table.column("minx")).as_py(),
+            pc.min(table.column("miny")).as_py(),
+            pc.max(table.column("maxx")).as_py(),
+            pc.max(table.column("maxy")).as_py(),
+        ]
+        table = table.replace_schema_metadata(
+            {
+                **(table.schema.metadata or {}),
+                b"geo": _geo_metadata(bbox),
+                SOURCE_KEY: catalog.source_signature().encode(),
+            }
+        )
+        pq.write_table(table, temporary_path)
+        os.replace(temporary_path, path)
+        logger.info(f"Stored {len(table)} fire perimeters in {path}")
+        return cls(path)
+
+    @classmethod
+    def from_catalog(
+        cls,
+        catalog: Union[EventCatalog, None] = None,
+        path: Union[str, Path, None] = None,
+        force: bool = False,
+    ) -> "FirePerimeterStore":
+        """Opens the store of a catalog, building it if it is missing or stale.
+
+        Args:
+            catalog (EventCatalog): Catalog holding the fires, defaults to the ERAD database
+            path (str | Path): GeoParquet file of the store. Defaults to `fires` inside
+                `erad.constants.CACHE_FOLDER`
+            force (bool): Rebuild even if the store is up to date
+        """
+        import pyarrow.parquet as pq
+
+        catalog = catalog if catalog is not None else default_catalog()
+        if path is None:
+            path = CACHE_FOLDER / "fires" / f"{catalog.source.stem}_fires.parquet"
+        path = Path(path)
+        if not force and path.exists():
+            metadata = pq.read_schema(path).metadata or {}
+            if metadata.get(SOURCE_KEY) == catalog.source_signature().encode():
+                return cls(path)
+        return cls.build(path, catalog)
+
+    def attributes(self, rows: np.ndarray) -> pd.DataFrame:
+        """Returns the attributes and bounding boxes of fires, without their perimeters."""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = [name for name in self._table.column_names if name != GEOMETRY_COLUMN]
+        frame = self._table.select(columns).take(rows).to_pandas()
+        frame.index = pd.Index(rows, name="row")
+        return frame
+
+    def geometries(self, rows: np.ndarray) -> np.ndarray:
+        """Decodes the perimeters of fires.
+
+        Args:
+            rows (np.ndarray): Row numbers in the store, e.g. the index of a query result
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        wkb = self._table.column(GEOMETRY_COLUMN).take(rows).to_numpy(zero_copy_only=False)
+        return shapely.from_wkb(wkb)
+
+    @instrumentation.timed("scenarios.FirePerimeterStore.query")
+    def query(self, bounds: Tuple[float, float, float, float], distance_km: float = 0.0) -> pd.DataFrame:
+        """Returns the fires intersecting or within a distance of a bounding box.
+
+        Bounding boxes of the perimeters are searched in the STRtree with the box
+        expanded by the distance, then the perimeters of the candidates are decoded
+        and their distance to the box is measured in an azimuthal equidistant
+        projection centered on the box.
+
+        Args:
+            bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the region
+            distance_km (float): Largest distance between a perimeter and the region
+
+        Returns:
+            pd.DataFrame: Attributes, bounding box and `distance_km` of every fire,
+                indexed by row number in the store
+        """
+        lon_min, lat_min, lon_max, lat_max = bounds
+        dlat = distance_km / KM_PER_DEGREE
+        widest = min(max(abs(lat_min - dlat), abs(lat_max + dlat)), 89.0)
+        dlon = min(distance_km / (KM_PER_DEGREE * np.cos(np.radians(widest))), 180.0)
+        rows = np.sort(
+            self._tree.query(shapely.box(lon_min - dlon, lat_min - dlat, lon_max + dlon, lat_max + dlat))
+        )
+        instrumentation.count("scenarios.fire_perimeters_decoded", len(rows))
+
+        region = shapely.box(*bounds)
+        geometries = self.geometries(rows)
+        if distance_km > 0:
+            import pyproj
+
+            center = region.centroid
+            transformer = pyproj.Transformer.from_crs(
+                "epsg:4326",
+                f"+proj=aeqd +lat_0={center.y} +lon_0={center.x} +datum=WGS84 +units=m",
+                always_xy=True,
+            )
+
+            def project(coordinates):
+                return np.column_stack(transformer.transform(coordinates[:, 0], coordinates[:, 1]))
+
+            distances = shapely.distance(
+                shapely.transform(geometries, project), shapely.transform(region, project)
+            ) / 1000
+        else:
+            distances = np.where(shapely.intersects(geometries, region), 0.0, np.inf)
+        keep = distances <= distance_km
+
+        result = self.attributes(rows[keep])
+        result["distance_km"] = distances[keep]
+        return result
+
+    def scenario(self, row: int, probability_function: dict = None) -> FireScenario:
+        """Builds the scenario of one fire of the store."""
+        return self.scenarios(self.attributes([row]), probability_function)[0]
+
+    def scenarios(self, fires: pd.DataFrame, probability_function: dict = None) -> List[FireScenario]:
+        """Builds one scenario per fire of a query result.
+
+        Args:
+            fires (pd.DataFrame): Result of `query`, or any frame indexed by store row
+            probability_function (dict): Dictionary mapping asset types to probability funcitons
+        """
+        geometries = self.geometries(fires.index.to_numpy())
+        if "discoverydatetime" in fires:
+            timestamps = pd.to_datetime(fires["discoverydatetime"], errors="coerce", format="mixed")
+        else:
+            timestamps = pd.Series(pd.NaT, index=fires.index)
+        return [
+            FireScenario(geometry, probability_function, None if pd.isna(timestamp) else timestamp.to_pydatetime())
+            for geometry, timestamp in zip(geometries, timestamps)
+        ]
@@ -1,25 +1,76 @@
-import tarfile
 import os
 
 from shapely import MultiPolygon, Point, LineString
-from pyhigh import get_elevation, get_elevation_batch
 from datetime import datetime, timedelta
-from scipy.spatial import Delaunay
-import matplotlib.pyplot as plt
-import geopandas as gpd
+from typing import List, Union
 import pandas as pd
 import numpy as np
-import stateplane
-import itertools
-import requests
 
 from erad.scenarios.utilities import ProbabilityFunctionBuilder, GeoUtilities
 from erad.scenarios.utilities import ProbabilityFunctionBuilder
 from erad.constants import DATA_FOLDER, FLOOD_HISTORIC_SHP_PATH
 from erad.scenarios.abstract_scenario import BaseScenario
-from erad.scenarios.common import AssetTypes
+from erad.scenarios.cache import cached_survival_probability
+from erad.scenarios.common import AssetTypes, AssetTable
+from erad.utils import instrumentation, projection
+from erad.utils.elevation import default_elevation_provider
+from erad.utils.noaa_utils import GaugeClient, NationalShapefileCache, forecast_tag, read_gauges, stageflow_frames
+
+
+class FloodTimeSeries:
+    """Water level, submerge depth and survival of assets over the timesteps of a flood.
+
+    Attributes:
+        timestamps (pd.DatetimeIndex): Evaluated timesteps, one per column of the matrices
+        names (np.ndarray): Asset names, one per row of the matrices
+        asset_types (np.ndarray): Asset type of every asset
+        elevation_ft (np.ndarray): Ground elevation of every asset in feet
+        water_level_ft (np.ndarray): Fitted water surface at the assets, shape (assets, timesteps)
+        submerge_depth_ft (np.ndarray): Water level minus ground elevation, shape (assets, timesteps)
+        survival_probability (np.ndarray): Array of shape (assets, timesteps)
+    """
+
+    def __init__(
+        self,
+        timestamps: pd.DatetimeIndex,
+        names: np.ndarray,
+        asset_types: np.ndarray,
+        elevation_ft: np.ndarray,
+        water_level_ft: np.ndarray,
+        survival_probability: np.ndarray,
+    ) -> None:
+        self.timestamps = timestamps
+        self.names = names
+        self.asset_types = asset_types
+        self.elevation_ft = elevation_ft
+        self.water_level_ft = water_level_ft
+        self.submerge_depth_ft = water_level_ft - elevation_ft[:, None]
+        self.survival_probability = survival_probability
+
+    def matrix(self, name: str = "survival_probability") -> pd.DataFrame:
+        """Returns one of the timestep x asset matrices indexed by timestamp and asset name."""
+        return pd.DataFrame(
+            getattr(self, name).T,
+            index=pd.Index(self.timestamps, name="timestamp"),
+            columns=pd.Index(self.names, name="asset"),
+        )
+
+    def min_survival_probability(self) -> pd.DataFrame:
+        """Returns the lowest survival probability of every asset and the timestep it occurs at."""
+        survival = self.survival_probability
+        has_timesteps = survival.shape[1] > 0
+        worst = survival.argmin(axis=1) if has_timesteps else np.zeros(survival.shape[0], dtype=int)
+        return pd.DataFrame(
+            {
+                "asset": self.names,
+                "asset_type": self.asset_types,
+                "min_survival_probability": survival.min(axis=1, initial=1.0),
+                "timestamp": self.timestamps[worst] if has_timesteps else pd.NaT,
+                "max_submerge_depth_ft": self.submerge_depth_ft.max(axis=1, initial=-np.inf),
+            }
+        )
+
 
-plt.ion()
 class FloodScenario(BaseScenario, GeoUtilities):
     """Base class for FlooadScenario. Extends BaseScenario and GeoUtilities
 
@@ -57,6 +108,7 @@ class FloodScenario(BaseScenario, GeoUtilities):
             self.levels = pd.DataFrame()
             self.real_time()
         else:
+            import geopandas as gpd
             from shapely import wkt
             self.flows = pd.read_csv(kwargs['file_flow'],index_col=0, parse_dates=True)
             self.levels = pd.read_csv(kwargs['file_levels'], index_col=0, parse_dates=True)
@@ -70,23 +122,20 @@ class FloodScenario(BaseScenario, GeoUtilities):
     def from_historical_flood_by_code(cls, flood_code : str, probability_function : dict = None):
         data_file = os.path.join(DATA_FOLDER, FLOOD_HISTORIC_SHP_PATH)
         assert os.path.exists(data_file), f"The data file {data_file} not found"
+        import geopandas as gpd
         flood_data = gpd.read_file(data_file)
         flood_data = flood_data[flood_data['DFIRM_ID'] == flood_code]
         raise NotImplementedError("Model has not been implemented")
     
     def get_gauge_locations(self):
-        x_i = []
-        y_i = []
-        for x, y in zip(self.gauges['Longitude'], self.gauges['Latitude']):
-            x, y = stateplane.from_lonlat(x, y)
-            x_i.append(x)
-            y_i.append(y)
-        return [x_i, y_i, self.gauges['GaugeLID'].to_list()]  
+        x_i, y_i = projection.from_lonlat(self.gauges['Longitude'], self.gauges['Latitude'])
+        return [x_i.tolist(), y_i.tolist(), self.gauges['GaugeLID'].to_list()]  
 
     def real_time(self):
         self.gauges = self.get_flow_measurements(0)
-        elevation = get_elevation_batch([(x, y) for x, y in zip(self.gauges['Latitude'], self.gauges['Longitude'])])
-        self.gauges["elevation"] = elevation
+        self.gauges["elevation"] = default_elevation_provider().elevation_ft(
+            self.gauges['Longitude'].to_numpy(dtype=float), self.gauges['Latitude'].to_numpy(dtype=float)
+        )
         flows, levels = self.gauges_in_polygon()
         
         for df, df_name in zip([levels], ['levels']):  #zip([levels, flows], ['levels', 'flows']):    
@@ -115,71 +164,41 @@ class FloodScenario(BaseScenario, GeoUtilities):
         """
         return list(self.levels.index)
     
-    def gauges_in_polygon(self):
-        all_flows_dfs = pd.DataFrame()
-        all_levels_dfs = pd.DataFrame()
-        for _, gauge in self.gauges.iterrows():   
-            gauge_id = gauge['GaugeLID']
-
-            url =f"https://api.water.noaa.gov/nwps/v1/gauges/{gauge_id}/stageflow"
-            print(url)
-            reply = requests.get(url, allow_redirects=True)
-            data = reply.json()
-            observed= data['observed']['data']
-            forcasted= data['forecast']['data']
-
-            observed = pd.DataFrame(observed)
-            forcasted = pd.DataFrame(forcasted)
-            complete_gauge_data = pd.concat([observed, forcasted])
-    
-            index = pd.to_datetime(complete_gauge_data['validTime'])
-            
-            flow = pd.DataFrame(index=index.tolist())
-            level = pd.DataFrame(index=index.tolist())
-            level[gauge_id] = complete_gauge_data['primary'].to_list()
-            flow[gauge_id] = complete_gauge_data['secondary'].to_list()
-            
-            all_flows_dfs = pd.merge(all_flows_dfs, flow, left_index=True, right_index=True, how='outer')
-            all_levels_dfs = pd.merge(all_levels_dfs, level, left_index=True, right_index=True, how='outer')
-
-        return all_flows_dfs, all_levels_dfs
+    def gauges_in_polygon(self, client: GaugeClient = None):
+        """Fetches stage and flow series of all gauges concurrently.
+
+        Args:
+            client (GaugeClient): Client used for the requests, by default the
+                `gauge_client` keyword argument of the scenario or a new client
+                with the default replay cache
+
+        Returns:
+            tuple: Flows and levels with one column per gauge, gauges replayed from
+                the cache are listed in `attrs["replayed"]` of both frames
+        """
+        if client is None:
+            client = self.kwargs.get('gauge_client') or GaugeClient()
+        responses = client.fetch(self.gauges['GaugeLID'].to_list())
+        return stageflow_frames(responses)
     
-    def get_flow_measurements(self, forecast_day: int = 0):
-        if forecast_day == 0:
-            forecast_tag = "obs"
-        else:
-            if forecast_day == 1:    
-                forecast_tag = "fcst_f024"
-            else:
-                forecast_tag = f"fcst_f{forecast_day*24}"
-
-        url =f"https://water.noaa.gov/resources/downloads/shapefiles/national_shapefile_{forecast_tag}.tgz"
-        #old_interface_url = f"https://water.weather.gov/ahps/download.php?data=tgz_{forecast_tag}"
-        r = requests.get(url, allow_redirects=True)
-        date = str(datetime.now()).replace(":", "_").replace(".", "_").replace(" ", "_")
-        shape_file_path = os.path.join(DATA_FOLDER, f'flood_shapefile_{date}.tgz')
-        open(shape_file_path, 'wb').write(r.content)
-        file_path = self.extract(shape_file_path, forecast_tag)
-        data = gpd.read_file(file_path)
+    def get_flow_measurements(self, forecast_day: int = 0, shapefiles: NationalShapefileCache = None):
+        """Returns the gauges of the national shapefile located inside the scenario polygon.
+
+        Args:
+            forecast_day (int): 0 for observations, otherwise the forecast day
+            shapefiles (NationalShapefileCache): Cache of the downloaded shapefiles, by
+                default the `shapefile_cache` keyword argument of the scenario or
+                the default cache folder
+        """
+        if shapefiles is None:
+            shapefiles = self.kwargs.get('shapefile_cache') or NationalShapefileCache()
+        file_path = shapefiles.shapefile(forecast_tag(forecast_day))
+        data = read_gauges(file_path, self.multipolygon)
         if not data.empty:
-            water_info = []
-            for _, row in data.iterrows():
-                point = Point(row['Latitude'], row['Longitude'])
-                if self.multipolygon.contains(point):
-                    water_info.append(row)
-            return gpd.GeoDataFrame(water_info)
+            return data
         else:
             raise Exception("No water measurement found in selected area.")
     
-    def extract(self, tar_url, ext):
-        extract_path = os.path.join(DATA_FOLDER, "flood_shape_file")
-        tar = tarfile.open(tar_url, 'r')
-        for item in tar:
-            tar.extract(item, extract_path)
-            if item.name.find(".tgz") != -1 or item.name.find(".tar") != -1:
-                self.extract(item.name, "./" + item.name[:item.name.rfind('/')])
-        return os.path.join(extract_path, f'national_shapefile_{ext}.shp')
-    
     @classmethod
     def from_live_data(
         cls,
@@ -199,11 +218,21 @@ class FloodScenario(BaseScenario, GeoUtilities):
         return cls(poly, probability_function, startrime, **kwargs)
 
 
+    def _fingerprint_parts(self) -> list:
+        if not hasattr(self, 'gauges'):
+            return []
+        gauges = self.gauges[[c for c in ['GaugeLID', 'Longitude', 'Latitude', 'elevation'] if c in self.gauges]]
+        return [
+            pd.util.hash_pandas_object(gauges, index=False).values.tobytes(),
+            pd.util.hash_pandas_object(self.levels).values.tobytes(),
+        ]
+
     def calc_polyhedron_volume(self, pts):
 
         def tetrahedron_volume(a, b, c, d):
             return np.abs(np.einsum('ij,ij->i', a-d, np.cross(b-d, c-d))) / 6
         
+        from scipy.spatial import Delaunay
         dt = Delaunay(pts)
         tets = dt.points[dt.simplices]
         self.polyhedron_volume = np.sum(tetrahedron_volume(tets[:, 0], tets[:, 1], 
@@ -235,80 +264,114 @@ class FloodScenario(BaseScenario, GeoUtilities):
         """Method to increment simulation time for time evolviong scenarios."""
         raise NotImplementedError("Method needs to be defined in derived classes")
 
-    def calculate_survival_probability(self, assets : dict, timestamp: datetime) -> dict:
+    @cached_survival_probability()
+    def calculate_survival_probability(self, assets : Union[dict, AssetTable], timestamp: datetime) -> Union[dict, AssetTable]:
         """Method to calculate survival probaility of asset types.
 
         Args:
-            assets (dict): The dictionary of all assets and their corresponding asset types
+            assets (dict | AssetTable): The dictionary or table of all assets and their corresponding asset types
         """
-        print('Calculating survival probaiblity ...')
-        water_elevations = []
-        coords = [
-            [],[],[]
-        ]
-        z = []
-        for idx, row in self.gauges.iterrows():
-            
-            gauge = row['GaugeLID']
-            level = self.levels[gauge][timestamp] 
-        
-            x_i, y_i = stateplane.from_lonlat(row['Longitude'] , row['Latitude'])
-            coords[0].append(x_i)
-            coords[1].append(y_i)
-            print(gauge, row['elevation'], float(level))
-            water_elevation = row['elevation'] + float(level)
-
-            z.append(water_elevation) #water_elevation, flow
-            coords[2].append(f"Gauge: {gauge}\nElevation: {row['elevation']}\nWater level: {level}")
-            water_elevations.append(water_elevation)
+        water_elevations = self.gauge_water_levels([timestamp])[:, 0]
         self.gauges["water_level"] = water_elevations
-        self.fitted_params = self.polyfit2d(np.array(coords[0]), np.array(coords[1]), np.array(z))
-        
-        for asset_type, asset_dict in assets.items():
-            Xs = []
-            Ys = []
-            for asset, asset_data in asset_dict.items():
-                Xs.append(asset_data['coordinates'][1])
-                Ys.append(asset_data['coordinates'][0])
-                x_i, y_i = stateplane.from_lonlat(asset_data['coordinates'][1], asset_data['coordinates'][0])
-       
-                z_i = self.polyval2d(x_i, y_i, self.fitted_params)
-                assets[asset_type][asset]['asset_water_level_ft'] = z_i.tolist()  #list(self.polyval2d(x_i, y_i, m))
-                assets[asset_type][asset]['elevation_ft'] = get_elevation(
-                    asset_data['coordinates'][0], 
-                    asset_data['coordinates'][1]
-                )
-
-            i = 0
-            for asset, asset_data in asset_dict.items():
-                h =   asset_data['asset_water_level_ft'] - asset_data['elevation_ft']
-                assets[asset_type][asset]['submerge_depth_ft'] = h
-                if asset_type in self.probability_model:
-                    probability_function = self.probability_model[asset_type]
-                    failure_probability = probability_function.probability(h)
-                    assets[asset_type][asset]["survival_probability"] = 1 - failure_probability
-                else:
-                    assets[asset_type][asset]["survival_probability"] = 1
-                i+=1
+        self.fitted_params = self.fit_water_surfaces([timestamp])[:, 0]
         
-        return assets
+        table = AssetTable.from_assets(assets)
+        all_elevations = default_elevation_provider().elevation_ft(table.longitude, table.latitude)
+        all_water_levels = self.polyval2d(*projection.from_lonlat(table.longitude, table.latitude), self.fitted_params)
+        for asset_type, index in table.groups():
+            water_levels = all_water_levels[index]
+            elevations = all_elevations[index]
+
+            depths = water_levels - elevations
+            table.set_column("asset_water_level_ft", water_levels, index)
+            table.set_column("elevation_ft", elevations, index)
+            table.set_column("submerge_depth_ft", depths, index)
+
+            if asset_type in self.probability_model:
+                probability_function = self.probability_model[asset_type]
+                survival_probabilities = probability_function.probabilities(depths, complement=True)
+            else:
+                survival_probabilities = np.ones(len(depths))
+            table.set_column("survival_probability", survival_probabilities, index)
+
+        return table.to_assets(assets)
     
+    def gauge_water_levels(self, timestamps: List[datetime] = None) -> np.ndarray:
+        """Returns gauge elevation plus water level, an array of shape (gauges, timestamps).
+
+        Args:
+            timestamps (list): Timesteps to look up, all of `valid_timepoints` if not provided
+        """
+        levels = self.levels if timestamps is None else self.levels.loc[list(timestamps)]
+        levels = levels[self.gauges['GaugeLID'].to_list()].to_numpy(dtype=float)
+        return self.gauges['elevation'].to_numpy(dtype=float)[:, None] + levels.T
+
+    def fit_water_surfaces(self, timestamps: List[datetime] = None, order: int = 3) -> np.ndarray:
+        """Fits the water surface of many timesteps with one least-squares solve.
+
+        The design matrix of the gauges is built once and every timestep is a
+        right hand side of the same solve. Timesteps with missing gauge levels are
+        fitted separately on the gauges that have a level.
+
+        Args:
+            timestamps (list): Timesteps to fit, all of `valid_timepoints` if not provided
+            order (int): Order of the polynomial in x and in y
+
+        Returns:
+            np.ndarray: Coefficients of shape ((order + 1) ** 2, timestamps)
+        """
+        x, y = projection.from_lonlat(self.gauges['Longitude'], self.gauges['Latitude'])
+        z = self.gauge_water_levels(timestamps)
+        complete = ~np.isnan(z).any(axis=0)
+        params = np.full(((order + 1) ** 2, z.shape[1]), np.nan)
+        params[:, complete] = self.polyfit2d(x, y, z[:, complete], order)
+        for column in np.flatnonzero(~complete):
+            measured = ~np.isnan(z[:, column])
+            if measured.any():
+                params[:, column] = self.polyfit2d(x[measured], y[measured], z[measured, column], order)
+        return params
+
     def polyfit2d(self, x, y, z, order=3):
-        ncols = (order + 1)**2
-        G = np.zeros((x.size, ncols))
-        ij = itertools.product(range(order+1), range(order+1))
-        for k, (i,j) in enumerate(ij):
-            G[:,k] = x**i * y**j
-        m, _, _, _ = np.linalg.lstsq(G, z)
+        """Least-squares fit of a 2D polynomial, `z` can hold one column per surface."""
+        G = np.polynomial.polynomial.polyvander2d(np.asarray(x, dtype=float), np.asarray(y, dtype=float), [order, order])
+        # Stateplane coordinates make G badly conditioned, keep the cutoff fits were made with
+        m, _, _, _ = np.linalg.lstsq(G, z, rcond=-1)
         return m
 
     def polyval2d(self, x, y, m):
+        """Evaluates 2D polynomials at arrays of points, one column of `m` per surface."""
         order = int(np.sqrt(len(m))) - 1
-        ij = itertools.product(range(order+1), range(order+1))
-        z = np.zeros_like(x)
-        for a, (i,j) in zip(m, ij):
-            z += a * x**i * y**j
-        return z
+        G = np.polynomial.polynomial.polyvander2d(np.asarray(x, dtype=float), np.asarray(y, dtype=float), [order, order])
+        return G @ m
+
+    @instrumentation.timed("scenarios.FloodScenario.calculate_time_series")
+    def calculate_time_series(self, assets : Union[dict, AssetTable], timestamps: List[datetime] = None) -> FloodTimeSeries:
+        """Evaluates water level, submerge depth and survival of all assets at many timesteps.
+
+        Water surfaces of all timesteps are fitted in one batched solve, assets are
+        projected and their elevation is looked up once, then every quantity is
+        evaluated for all assets and timesteps as array operations.
+
+        Args:
+            assets (dict | AssetTable): The dictionary or table of all assets and their corresponding asset types, not modified
+            timestamps (list): Timesteps to evaluate, all of `valid_timepoints` if not provided
+
+        Returns:
+            FloodTimeSeries: Asset x timestep water levels, depths and survival probabilities
+        """
+        timestamps = pd.DatetimeIndex(self.valid_timepoints if timestamps is None else timestamps)
+        table = AssetTable.from_assets(assets)
+        params = self.fit_water_surfaces(timestamps)
+
+        elevations = default_elevation_provider().elevation_ft(table.longitude, table.latitude)
+        water_levels = self.polyval2d(*projection.from_lonlat(table.longitude, table.latitude), params)
+        depths = water_levels - elevations[:, None]
+        survival = np.ones(depths.shape)
+        for asset_type, index in table.groups():
+            if asset_type in self.probability_model:
+                survival[index] = self.probability_model[asset_type].probabilities(depths[index], complement=True)
+        instrumentation.count("scenarios.flood_asset_timesteps", survival.size)
+        return FloodTimeSeries(timestamps, table.names, table.asset_types, elevations, water_levels, survival)
     
     def map_elevation(self, time_stamp: datetime):
         y_min, x_min, y_max, x_max = self.multipolygon.bounds
@@ -318,16 +381,12 @@ class FloodScenario(BaseScenario, GeoUtilities):
         X_flattened = X.flatten()
         Y_flattened = Y.flatten()
         
-        coordinates =[(y, x) for x, y in zip(X_flattened, Y_flattened)]
-        Z = get_elevation_batch(coordinates)
+        Z = default_elevation_provider().elevation_ft(X_flattened, Y_flattened)
         Z = np.reshape(Z, X.shape)
       
-        r, c = X.shape
-        for i in range(r):
-            for j in range(c):
-                x_sp, y_sp = stateplane.from_lonlat(X[i, j], Y[i, j])
-                X[i, j] =x_sp
-                Y[i, j] =y_sp
+        x_sp, y_sp = projection.from_lonlat(X_flattened, Y_flattened)
+        X = np.reshape(x_sp, X.shape)
+        Y = np.reshape(y_sp, Y.shape)
     
         pts = np.array([X.flatten(), Y.flatten(), Z.flatten()]).T
         self.volume = self.calc_polyhedron_volume(pts)
@@ -335,29 +394,10 @@ class FloodScenario(BaseScenario, GeoUtilities):
         return X, Y, Z, W
 
     def get_water_surface(self, time_stamp: datetime, X, Y):
-        w_s = []
-        x_s = []
-        y_s = []
-        z_s = []
-        texts = []
-        water_elevations = []
-        for idx, row in self.gauges.iterrows():      
-            gauge = row['GaugeLID']
-            level = self.levels[gauge][time_stamp] 
-        
-            x_i, y_i = stateplane.from_lonlat(row['Longitude'] , row['Latitude'])
-            x_s.append(x_i)
-            y_s.append(y_i)
-            water_elevation = row['elevation'] + float(level)
-            z_s.append(water_elevation) #water_elevation, flow
-            texts.append(f"Gauge: {gauge}\nElevation: {row['elevation']}\nWater level: {level}")
-            water_elevations.append(water_elevation)
-        self.gauges["water_level"] = water_elevations
-        self.fitted_params = self.polyfit2d(np.array(x_s), np.array(y_s), np.array(z_s))
+        self.gauges["water_level"] = self.gauge_water_levels([time_stamp])[:, 0]
+        self.fitted_params = self.fit_water_surfaces([time_stamp])[:, 0]
 
-        for x, y in zip(X.flatten(), Y.flatten()):
-            w_s.append(self.polyval2d(x, y, self.fitted_params))
-        w = np.reshape(w_s, X.shape)
+        w = np.reshape(self.polyval2d(X.flatten(), Y.flatten(), self.fitted_params), X.shape)
         w =np.full(w.shape, np.mean(w))
         return w
 
@@ -377,6 +417,9 @@ class DynamicFloodInterface():
         ncontours = 15
         step_size = (self.max_elevation - self.min_elevation) / ncontours
         self.levels_contour = np.arange(self.min_elevation, self.max_elevation, step_size)
+
+        import matplotlib.pyplot as plt
+        plt.ion()
         self.fig = plt.figure()
         self.ax1 = self.fig.add_subplot(121, projection='3d')        
         self.ax2 = self.fig.add_subplot(222)
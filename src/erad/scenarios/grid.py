@@ -0,0 +1,158 @@
+""" Module for regular lon/lat grids of hazard intensities.
+
+Hazard fields such as peak wind gusts are expensive to evaluate, so they are
+rasterized once over a region and assets sample them by bilinear interpolation.
+"""
+
+from pathlib import Path
+from typing import Callable, Tuple, Union
+import hashlib
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RegularGrid:
+    """Values on a regular longitude/latitude grid.
+
+    Attributes:
+        longitude (np.ndarray): Ascending longitudes of the grid columns
+        latitude (np.ndarray): Ascending latitudes of the grid rows
+        values (np.ndarray): Array of shape (latitude, longitude)
+    """
+
+    def __init__(self, longitude: np.ndarray, latitude: np.ndarray, values: np.ndarray) -> None:
+        """Constructor for RegularGrid.
+
+        Args:
+            longitude (np.ndarray): Ascending, evenly spaced longitudes
+            latitude (np.ndarray): Ascending, evenly spaced latitudes
+            values (np.ndarray): Array of shape (len(latitude), len(longitude))
+        """
+        self.longitude = np.asarray(longitude, dtype=float)
+        self.latitude = np.asarray(latitude, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        assert self.values.shape == (len(self.latitude), len(self.longitude)), (
+            f"Grid values should have shape {(len(self.latitude), len(self.longitude))}"
+        )
+        assert len(self.longitude) > 1 and len(self.latitude) > 1, "Grid needs at least 2 x 2 points"
+
+    @staticmethod
+    def axes(bounds: Tuple[float, float, float, float], resolution: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns grid axes covering bounds, snapped outwards to multiples of the resolution.
+
+        Snapping keeps grids built for overlapping regions aligned with each other.
+
+        Args:
+            bounds (tuple): (lon_min, lat_min, lon_max, lat_max)
+            resolution (float): Grid spacing in degrees
+        """
+        lon_min, lat_min, lon_max, lat_max = bounds
+        start = np.floor(np.array([lon_min, lat_min]) / resolution).astype(int)
+        stop = np.ceil(np.array([lon_max, lat_max]) / resolution).astype(int)
+        stop = np.maximum(stop, start + 1)
+        longitude = np.arange(start[0], stop[0] + 1) * resolution
+        latitude = np.arange(start[1], stop[1] + 1) * resolution
+        return longitude, latitude
+
+    @classmethod
+    def from_function(
+        cls,
+        bounds: Tuple[float, float, float, float],
+        resolution: float,
+        function: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    ) -> "RegularGrid":
+        """Rasterizes a vectorized function of (longitude, latitude) over a region.
+
+        Args:
+            bounds (tuple): (lon_min, lat_min, lon_max, lat_max)
+            resolution (float): Grid spacing in degrees
+            function (Callable): Maps 2D longitude and latitude arrays to values
+        """
+        longitude, latitude = cls.axes(bounds, resolution)
+        lon, lat = np.meshgrid(longitude, latitude)
+        return cls(longitude, latitude, function(lon, lat))
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        return (self.longitude[0], self.latitude[0], self.longitude[-1], self.latitude[-1])
+
+    def sample(self, longitude: np.ndarray, latitude: np.ndarray, fill_value: float = np.nan) -> np.ndarray:
+        """Samples the grid by bilinear interpolation.
+
+        Args:
+            longitude (np.ndarray): Longitudes of the sampled points
+            latitude (np.ndarray): Latitudes of the sampled points
+            fill_value (float): Value returned for points outside of the grid
+        """
+        longitude, latitude = np.broadcast_arrays(
+            np.asarray(longitude, dtype=float), np.asarray(latitude, dtype=float)
+        )
+        fx = (longitude - self.longitude[0]) / (self.longitude[1] - self.longitude[0])
+        fy = (latitude - self.latitude[0]) / (self.latitude[1] - self.latitude[0])
+        nx, ny = len(self.longitude), len(self.latitude)
+        # Small tolerance so that points on the outer edge are not rejected by rounding
+        inside = (fx >= -1e-9) & (fx <= nx - 1 + 1e-9) & (fy >= -1e-9) & (fy <= ny - 1 + 1e-9)
+
+        i = np.clip(np.floor(fx), 0, nx - 2).astype(int)
+        j = np.clip(np.floor(fy), 0, ny - 2).astype(int)
+        tx = np.clip(fx - i, 0, 1)
+        ty = np.clip(fy - j, 0, 1)
+        v = self.values
+        result = (
+            v[j, i] * (1 - tx) * (1 - ty)
+            + v[j, i + 1] * tx * (1 - ty)
+            + v[j + 1, i] * (1 - tx) * ty
+            + v[j + 1, i + 1] * tx * ty
+        )
+        return np.where(inside, result, fill_value)
+
+    def save(self, file_path: Union[str, Path]) -> None:
+        """Stores the grid in an npz file."""
+        with open(file_path, "wb") as f:
+            np.savez(f, longitude=self.longitude, latitude=self.latitude, values=self.values)
+
+    @classmethod
+    def load(cls, file_path: Union[str, Path]) -> "RegularGrid":
+        """Loads a grid stored with `save`."""
+        with np.load(file_path) as data:
+            return cls(data["longitude"], data["latitude"], data["values"])
+
+
+def cached_grid(
+    directory: Union[str, Path, None],
+    prefix: str,
+    key: dict,
+    bounds: Tuple[float, float, float, float],
+    resolution: float,
+    function: Callable[[np.ndarray, np.ndarray], np.ndarray],
+) -> RegularGrid:
+    """Rasterizes a function over a region, reusing grids stored in a folder.
+
+    Stored grids are named `<prefix>_<hash of key and grid axes>.npz`.
+
+    Args:
+        directory (str | Path): Folder where grids are stored, not cached on disk if None
+        prefix (str): Prefix of the file names
+        key (dict): JSON serializable inputs of `function`
+        bounds (tuple): (lon_min, lat_min, lon_max, lat_max)
+        resolution (float): Grid spacing in degrees
+        function (Callable): Maps 2D longitude and latitude arrays to values
+    """
+    if directory is None:
+        return RegularGrid.from_function(bounds, resolution, function)
+
+    axes = [a.tolist() for a in RegularGrid.axes(bounds, resolution)]
+    digest = hashlib.sha256(json.dumps({**key, "axes": axes}, sort_keys=True).encode()).hexdigest()
+    cache_file = Path(directory) / f"{prefix}_{digest}.npz"
+    if cache_file.exists():
+        return RegularGrid.load(cache_file)
+
+    grid = RegularGrid.from_function(bounds, resolution, function)
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    grid.save(cache_file)
+    logger.debug(f"Stored grid {cache_file}")
+    return grid
@@ -0,0 +1,198 @@
+""" Module for sweeping a catalog of historic hurricanes over one set of assets.
+
+Storms whose track passes within a distance of the assets are selected from the
+event catalog and every storm is evaluated with `WindScenario`. Worker processes
+receive the asset table once when they start and only storm tracks are sent per
+task, so the assets are not pickled again for every storm.
+
+Example:
+    >>> from erad.scenarios.hurricane_sweep import sweep_hurricanes
+    >>> sweep = sweep_hurricanes(assets, distance_km=300, workers=4)
+    >>> sweep.storm_summary().head()
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Union
+
+from shapely import LineString
+import numpy as np
+import pandas as pd
+
+from erad.scenarios.catalog import EventCatalog, default_catalog
+from erad.scenarios.common import AssetTable
+from erad.scenarios.wind_scenario import Hurricane, WindScenario, hurricane_from_track
+from erad.utils import instrumentation
+
+# Asset table shared with the tasks of a worker process, set by `_share_table`
+_SHARED_TABLE = None
+
+
+def _share_table(table: AssetTable) -> None:
+    global _SHARED_TABLE
+    _SHARED_TABLE = table
+
+
+def _storm_survival(
+    table: AssetTable, hurricane: Hurricane, probability_model: Union[dict, None]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns survival probability and closest distance to the eye of every asset for one storm."""
+    track = [(status.latitude, status.longitude) for status in hurricane.track]
+    # The scenario geometry needs two points even for single point tracks
+    scenario = WindScenario(LineString(track * (2 if len(track) == 1 else 1)), probability_model, hurricane)
+    result = scenario.calculate_survival_probability(table.base_copy())
+    return result.column("survival_probability"), result.column("min_distance_to_eye")
+
+
+def _shared_storm_survival(hurricane: Hurricane, probability_model: Union[dict, None]):
+    return _storm_survival(_SHARED_TABLE, hurricane, probability_model)
+
+
+class HurricaneSweep:
+    """Survival of a set of assets for every storm of a hurricane sweep.
+
+    Attributes:
+        hurricanes (List[Hurricane]): Evaluated storms, one per row of the matrices
+        names (np.ndarray): Asset names, one per column of the matrices
+        asset_types (np.ndarray): Asset type of every asset
+        survival_probability (np.ndarray): Array of shape (storms, assets)
+        min_distance_km (np.ndarray): Closest distance of every asset to the eye, shape (storms, assets)
+    """
+
+    def __init__(
+        self,
+        hurricanes: List[Hurricane],
+        names: np.ndarray,
+        asset_types: np.ndarray,
+        survival_probability: np.ndarray,
+        min_distance_km: np.ndarray,
+    ) -> None:
+        self.hurricanes = hurricanes
+        self.names = names
+        self.asset_types = asset_types
+        self.survival_probability = survival_probability
+        self.min_distance_km = min_distance_km
+
+    @property
+    def sids(self) -> List[str]:
+        return [hurricane.sid for hurricane in self.hurricanes]
+
+    def matrix(self) -> pd.DataFrame:
+        """Returns the storm x asset survival matrix indexed by storm id and asset name."""
+        return pd.DataFrame(
+            self.survival_probability,
+            index=pd.Index(self.sids, name="sid"),
+            columns=pd.Index(self.names, name="asset"),
+        )
+
+    def storm_summary(self) -> pd.DataFrame:
+        """Returns exposure statistics per storm, most damaging storms first.
+
+        Columns are the storm name, start time, peak sustained wind speed, closest
+        approach to any asset, mean and minimum survival probability and the
+        expected number of failed assets.
+        """
+        survival = self.survival_probability
+        summary = pd.DataFrame(
+            {
+                "sid": self.sids,
+                "name": [hurricane.name for hurricane in self.hurricanes],
+                "start": [hurricane.track[0].timestamp for hurricane in self.hurricanes],
+                "max_wind_speed_mph": [
+                    max(status.wind_speed_mph for status in hurricane.track)
+                    for hurricane in self.hurricanes
+                ],
+                "min_distance_km": self.min_distance_km.min(axis=1, initial=np.inf),
+                "mean_survival_probability": survival.mean(axis=1) if survival.shape[1] else np.nan,
+                "min_survival_probability": survival.min(axis=1, initial=1.0),
+                "expected_failures": (1 - survival).sum(axis=1),
+            }
+        )
+        return summary.sort_values("expected_failures", ascending=False, kind="stable").reset_index(drop=True)
+
+    def asset_summary(self) -> pd.DataFrame:
+        """Returns survival statistics per asset over all storms.
+
+        Columns are the asset type, mean and minimum survival probability, the
+        storm giving the minimum and the expected number of storms failing the asset.
+        """
+        survival = self.survival_probability
+        has_storms = survival.shape[0] > 0
+        worst = survival.argmin(axis=0) if has_storms else np.zeros(survival.shape[1], dtype=int)
+        sids = np.asarray(self.sids, dtype=object)
+        return pd.DataFrame(
+            {
+                "asset": self.names,
+                "asset_type": self.asset_types,
+                "mean_survival_probability": survival.mean(axis=0) if has_storms else np.nan,
+                "min_survival_probability": survival.min(axis=0, initial=1.0),
+                "worst_sid": sids[worst] if has_storms else None,
+                "expected_failures": (1 - survival).sum(axis=0),
+            }
+        )
+
+
+@instrumentation.timed("scenarios.sweep_hurricanes")
+def sweep_hurricanes(
+    assets: Union[dict, AssetTable],
+    distance_km: float = 300,
+    catalog: Union[EventCatalog, None] = None,
+    sids: Union[List[str], None] = None,
+    probability_model: Union[dict, None] = None,
+    workers: int = 1,
+    chunksize: int = 4,
+) -> HurricaneSweep:
+    """Evaluates every historic hurricane passing close to a set of assets.
+
+    Args:
+        assets (dict | AssetTable): Assets of the feeder, not modified
+        distance_km (float): Storms are evaluated if a track point is within this
+            distance of the bounding box of the assets
+        catalog (EventCatalog): Catalog of historic storms, defaults to the ERAD database
+        sids (List[str]): Restricts the sweep to these storms, after the distance filter
+        probability_model (dict): Fragility curves per asset type, the default wind
+            fragility curves if not provided
+        workers (int): Number of worker processes
+        chunksize (int): Storms sent to a worker process per task
+
+    Returns:
+        HurricaneSweep: Storm x asset survival probabilities
+    """
+    table = AssetTable.from_assets(assets).base_copy()
+    catalog = catalog if catalog is not None else default_catalog()
+    asset_types = np.asarray(table.type_names, dtype=object)[table.type_codes]
+
+    if len(table):
+        bounds = (
+            table.longitude.min(),
+            table.latitude.min(),
+            table.longitude.max(),
+            table.latitude.max(),
+        )
+        selected = catalog.hurricanes_near(bounds, distance_km)
+    else:
+        selected = []
+    if sids is not None:
+        requested = set(sids)
+        selected = [sid for sid in selected if sid in requested]
+    hurricanes = [hurricane_from_track(sid, catalog.hurricane_track(sid)) for sid in selected]
+    instrumentation.count("scenarios.sweep_storms", len(hurricanes))
+
+    if workers > 1 and len(hurricanes) > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_share_table, initargs=(table,)
+        ) as executor:
+            results = list(
+                executor.map(
+                    _shared_storm_survival,
+                    hurricanes,
+                    [probability_model] * len(hurricanes),
+                    chunksize=chunksize,
+                )
+            )
+    else:
+        results = [_storm_survival(table, hurricane, probability_model) for hurricane in hurricanes]
+
+    shape = (len(hurricanes), len(table))
+    survival = np.array([r[0] for r in results]).reshape(shape)
+    distances = np.array([r[1] for r in results]).reshape(shape)
+    return HurricaneSweep(hurricanes, table.names, asset_types, survival, distances)
@@ -1,39 +1,126 @@
 from shapely.geometry import MultiPolygon, Point, LineString
-from shapely.ops import nearest_points
-import matplotlib.pyplot as plt
-import scipy.stats as stats
-import geopy.distance
 import numpy as np
-import stateplane
+import shapely
+import pyproj
+
+from erad.utils.projection import identify_stateplane
+
+WGS84_GEOD = pyproj.Geod(ellps="WGS84")
+
+
+def geodesic_distance(longitude_1, latitude_1, longitude_2, latitude_2) -> np.ndarray:
+    """Calculates geodesic distances in km on the WGS84 ellipsoid for arrays of coordinates.
+
+    Uses Karney's algorithm through `pyproj.Geod.inv`, the same algorithm used by
+    `geopy.distance.geodesic`; results agree with it to within a micrometer.
+    Inputs are broadcast against each other.
+    """
+    arrays = np.broadcast_arrays(
+        *[np.asarray(a, dtype=float) for a in [longitude_1, latitude_1, longitude_2, latitude_2]]
+    )
+    shape = arrays[0].shape
+    if arrays[0].size == 1:
+        _, _, distance_m = WGS84_GEOD.inv(*[a.item() for a in arrays])
+    else:
+        _, _, distance_m = WGS84_GEOD.inv(*[a.ravel() for a in arrays])
+    return np.asarray(distance_m).reshape(shape) / 1000
 
 
 class GeoUtilities:
     
     @property
     def identify_stateplane_projection(self) -> str:
-        """ Automatically identifies stateplane projection ID  """ 
-        x = self.centroid.x
-        y = self.centroid.y
-        return stateplane.identify(x, y)
+        """ Automatically identifies stateplane projection ID, resolved once per scenario """ 
+        if not hasattr(self, "_stateplane_projection"):
+            self._stateplane_projection = identify_stateplane(self.centroid.x, self.centroid.y)
+        return self._stateplane_projection
+
+    @property
+    def projected_crs(self) -> pyproj.CRS:
+        """ Projected CRS used for planar distance calculations.
+
+        Uses the stateplane zone containing the scenario centroid and falls back to an
+        azimuthal equidistant projection centered at the centroid outside of every zone,
+        where the closest zone can be far away and badly distorted.
+        """
+        if not hasattr(self, "_projected_crs"):
+            epsg = identify_stateplane(self.centroid.x, self.centroid.y, nearest=False)
+            if epsg is None:
+                self._projected_crs = pyproj.CRS.from_proj4(
+                    f"+proj=aeqd +lat_0={self.centroid.y} +lon_0={self.centroid.x} +datum=WGS84 +units=m"
+                )
+            else:
+                self._projected_crs = pyproj.CRS(f"epsg:{epsg}")
+        return self._projected_crs
+
+    def project(self, geometry):
+        """ Projects lon/lat shapely geometries into `projected_crs` with coordinates in meters. """
+        if not hasattr(self, "_projected_transformer"):
+            self._projected_transformer = pyproj.Transformer.from_crs(
+                "epsg:4326", self.projected_crs, always_xy=True
+            )
+        to_meters = self.projected_crs.axis_info[0].unit_conversion_factor
+        transformer = self._projected_transformer
+
+        def _transform(coords):
+            x, y = transformer.transform(coords[:, 0], coords[:, 1])
+            return np.column_stack([x, y]) * to_meters
+
+        return shapely.transform(geometry, _transform)
     
     def in_polygon(self, point : Point) -> bool:
         return self.multipolygon.contains(point)
 
     def distance_from_boundary(self, point : Point) -> float:
         """ Calculates distance of a point to polygon boundary. Correct calculations require conversion to cartesian coordinates""" 
-        if self.multipolygon.contains(point):
-            p1, p2 = nearest_points(self.boundary, point)
-        else:
-            p1, p2 = nearest_points(self.multipolygon, point)    
-        coords_1 = (p1.y, p1.x)
-        coords_2 = (p2.y, p2.x)
-        return geopy.distance.geodesic(coords_1, coords_2).km    
+        return float(self.distances_from_boundary(point.x, point.y))
 
     def distance_from_centroid(self, point : Point):
         """ Calculates distance of a point to polygon centroid. Correct calculations require conversion to cartesian coordinates """ 
-        coords_1 = (self.centroid.y, self.centroid.x)
-        coords_2 = (point.y, point.x)
-        return geopy.distance.geodesic(coords_1, coords_2).km
+        return float(self.distances_from_centroid(point.x, point.y))
+
+    def distances_from_centroid(self, longitude: np.ndarray, latitude: np.ndarray) -> np.ndarray:
+        """ Calculates geodesic distances in km from an array of points to the centroid.
+
+        Args:
+            longitude (np.ndarray): Longitudes of the points
+            latitude (np.ndarray): Latitudes of the points
+        """
+        return geodesic_distance(self.centroid.x, self.centroid.y, longitude, latitude)
+
+    def distances_from_boundary(
+        self, longitude: np.ndarray, latitude: np.ndarray, projected: bool = False
+    ) -> np.ndarray:
+        """ Calculates distances in km from an array of points to the polygon boundary.
+
+        By default the nearest boundary point is searched in lon/lat space and the geodesic
+        distance to it is returned, matching the scalar implementation. Because degrees of
+        longitude and latitude have different lengths, that point is not always the truly
+        nearest one and the result can overestimate the geodesic distance to the boundary
+        by up to ~25% for points close to the boundary.
+
+        With `projected` set to true the distances are computed in `projected_crs` instead.
+        Stateplane zones keep scale distortion below 1:10,000, and compared with the
+        minimum geodesic distance to the boundary the result is within 0.1% for points
+        up to a few hundred km away, plus a few meters where long polygon edges are
+        straight in projected rather than in lon/lat coordinates.
+
+        Args:
+            longitude (np.ndarray): Longitudes of the points
+            latitude (np.ndarray): Latitudes of the points
+            projected (bool): Set to true to use planar distances in the projected CRS
+        """
+        longitude, latitude = np.broadcast_arrays(
+            np.asarray(longitude, dtype=float), np.asarray(latitude, dtype=float)
+        )
+        points = shapely.points(longitude, latitude)
+        if projected:
+            return shapely.distance(self.project(self.boundary), self.project(points)) / 1000
+
+        lines = shapely.shortest_line(self.boundary, points)
+        coords = shapely.get_coordinates(lines).reshape(-1, 2, 2)
+        distances = geodesic_distance(coords[:, 0, 0], coords[:, 0, 1], coords[:, 1, 0], coords[:, 1, 1])
+        return distances.reshape(longitude.shape)
     
 
 
@@ -49,21 +136,49 @@ class ProbabilityFunctionBuilder:
             params (list): A list of parameters for the chosen distribution function. See Scipy.stats documentation
         """
         
-        self.dist = getattr(stats, dist)
+        self.dist_name = dist
         self.params = params
         return 
 
+    @property
+    def dist(self):
+        """Scipy distribution, scipy.stats is only imported on first use"""
+        import scipy.stats as stats
+        return getattr(stats, self.dist_name)
+
+    @property
+    def distribution(self):
+        """Frozen scipy distribution with the builder parameters.
+
+        The distribution is frozen once, on first use rather than in the constructor:
+        the default fragility curves of every scenario class are built when the
+        scenario modules are imported, and freezing them there would import scipy
+        with every scenario module.
+        """
+        if not hasattr(self, "_distribution"):
+            self._distribution = self.dist(*self.params)
+        return self._distribution
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable description of the distribution used to key cached results"""
+        return f"{self.dist_name}{list(self.params)}"
+
+    def __repr__(self) -> str:
+        return f"ProbabilityFunctionBuilder({self.dist_name!r}, {list(self.params)!r})"
+
     def sample(self):
         """Sample the distribution """
-        return self.dist.rvs(*self.params, size=1)[0]
+        return self.distribution.rvs(size=1)[0]
 
     def plot_cdf(self, x:np.linspace, ax =None, label="") -> None:
         """Plot the cumalative distribution fuction"""
-        cdf = self.dist.cdf
+        cdf = self.distribution.cdf
         if ax is None:
-            plt.plot(x,cdf(x, *self.params), label=label)
+            import matplotlib.pyplot as plt
+            plt.plot(x,cdf(x), label=label)
         else:
-            ax.plot(x,cdf(x, *self.params), label=label)
+            ax.plot(x,cdf(x), label=label)
     
 
     def probability(self, value: float) -> float:
@@ -72,5 +187,31 @@ class ProbabilityFunctionBuilder:
         Args:
             value (float): value for vetor of interest. Will change with scenarions
         """
-        cdf = self.dist.cdf
-        return cdf(value, *self.params)
\ No newline at end of file
+        return self.distribution.cdf(value)
+
+    def probabilities(self, values: np.ndarray, complement: bool = False) -> np.ndarray:
+        """Evaluates the fragility curve for an array of values in a single call.
+
+        Args:
+            values (np.ndarray): Hazard intensities, one per asset
+            complement (bool): Set to true to return one minus the CDF instead of the CDF
+        """
+        probabilities = self.distribution.cdf(np.asarray(values, dtype=float))
+        if complement:
+            return 1 - probabilities
+        return probabilities
+
+    def log_probabilities(self, values: np.ndarray, complement: bool = False) -> np.ndarray:
+        """Evaluates the logarithm of the fragility curve for an array of values.
+
+        Products of many probabilities can be accumulated as sums of these values
+        without underflow.
+
+        Args:
+            values (np.ndarray): Hazard intensities, one per asset
+            complement (bool): Set to true to return the log of one minus the CDF
+        """
+        values = np.asarray(values, dtype=float)
+        if complement:
+            return self.distribution.logsf(values)
+        return self.distribution.logcdf(values)
\ No newline at end of file
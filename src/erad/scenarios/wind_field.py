@@ -0,0 +1,111 @@
+""" Module for parametric hurricane wind fields.
+
+Wind speeds around the eye follow the Holland (1980) radial profile, with the
+radius of maximum winds from Vickery et al. (2000). The peak gust over a storm
+track is rasterized once on a `RegularGrid` and sampled by assets.
+"""
+
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from erad.scenarios.grid import RegularGrid, cached_grid
+from erad.scenarios.utilities import geodesic_distance
+from erad.utils import instrumentation
+
+AIR_DENSITY_KG_M3 = 1.15
+AMBIENT_PRESSURE_MB = 1013.0
+MPH_TO_M_PER_S = 0.44704
+
+
+def radius_of_maximum_winds(pressure_deficit_mb: np.ndarray, latitude: np.ndarray) -> np.ndarray:
+    """Radius of maximum winds in km from Vickery et al. (2000).
+
+    Args:
+        pressure_deficit_mb (np.ndarray): Ambient minus central pressure in mb
+        latitude (np.ndarray): Latitude of the eye in degrees
+    """
+    return np.exp(
+        3.015 - 6.291e-5 * np.asarray(pressure_deficit_mb) ** 2 + 0.0337 * np.abs(latitude)
+    )
+
+
+def holland_wind_speed(
+    distance_km: np.ndarray,
+    max_wind_speed_mph: float,
+    pressure_mb: float,
+    latitude: float,
+    ambient_pressure_mb: float = AMBIENT_PRESSURE_MB,
+) -> np.ndarray:
+    """Sustained wind speed in mph at a distance from the eye with the Holland profile.
+
+    The profile is normalized so that the speed at the radius of maximum winds is
+    `max_wind_speed_mph`, with the shape parameter B derived from the maximum wind
+    speed and the pressure deficit and limited to [1, 2.5].
+
+    Args:
+        distance_km (np.ndarray): Distances from the eye in km
+        max_wind_speed_mph (float): Maximum sustained wind speed of the storm
+        pressure_mb (float): Central pressure of the storm
+        latitude (float): Latitude of the eye in degrees
+        ambient_pressure_mb (float): Pressure far from the storm
+    """
+    pressure_deficit_mb = max(ambient_pressure_mb - pressure_mb, 1.0)
+    rmax_km = radius_of_maximum_winds(pressure_deficit_mb, latitude)
+    b = (
+        AIR_DENSITY_KG_M3
+        * np.e
+        * (max_wind_speed_mph * MPH_TO_M_PER_S) ** 2
+        / (pressure_deficit_mb * 100)
+    )
+    b = np.clip(b, 1.0, 2.5)
+    with np.errstate(divide="ignore", over="ignore"):
+        scaled = (rmax_km / np.maximum(np.asarray(distance_km, dtype=float), 1e-6)) ** b
+        return max_wind_speed_mph * np.sqrt(scaled * np.exp(1 - scaled))
+
+
+def peak_gust_grid(
+    track: List,
+    bounds: Tuple[float, float, float, float],
+    resolution: float = 0.01,
+    gust_factor: float = 1.3,
+    cache_directory: Union[str, Path, None] = None,
+) -> RegularGrid:
+    """Rasterizes the peak gust over a storm track.
+
+    Every grid point holds the maximum over all track points of the Holland wind
+    speed times `gust_factor`. Cost is grid size x track length, paid once per storm
+    and region.
+
+    Args:
+        track (List[HurricaneStatus]): Track of the storm, preferably interpolated
+            to a time step short compared to the time the eye takes to cross the region
+        bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the region
+        resolution (float): Grid spacing in degrees
+        gust_factor (float): Ratio of peak gust to sustained wind speed
+        cache_directory (str | Path): Folder where grids are stored and reused, not
+            cached on disk if not provided
+
+    Returns:
+        RegularGrid: Peak gust in mph
+    """
+    def peak_gust(longitude, latitude):
+        gust = np.zeros(longitude.shape)
+        for status in track:
+            distances = geodesic_distance(status.longitude, status.latitude, longitude, latitude)
+            speed = holland_wind_speed(
+                distances, status.wind_speed_mph, status.pressure_mb, status.latitude
+            )
+            np.maximum(gust, gust_factor * speed, out=gust)
+        return gust
+
+    key = {
+        "track": [
+            [s.timestamp.isoformat(), s.wind_speed_mph, s.pressure_mb, s.longitude, s.latitude]
+            for s in track
+        ],
+        "gust_factor": gust_factor,
+    }
+    with instrumentation.span("scenarios.wind_field.peak_gust_grid"):
+        return cached_grid(cache_directory, "peak_gust", key, bounds, resolution, peak_gust)
@@ -1,18 +1,20 @@
 from erad.scenarios.utilities import ProbabilityFunctionBuilder
-from erad.constants import HISTROIC_HURRICANE_TABLE, ERAD_DB
 from erad.scenarios.abstract_scenario import BaseScenario
-from erad.exceptions import FeatureNotImplementedError
+from erad.scenarios.cache import cached_survival_probability
+from erad.scenarios.catalog import EventCatalog, default_catalog
 from shapely import MultiPolygon, Point, LineString
-from erad.scenarios.utilities import GeoUtilities
+from erad.scenarios.utilities import GeoUtilities, geodesic_distance
+from erad.scenarios.wind_field import peak_gust_grid
+from erad.scenarios.grid import RegularGrid
 from pydantic import BaseModel
-from datetime import datetime
-import geopandas as gpd
+from datetime import datetime, timedelta
+from typing import Iterator, List, NamedTuple, Union
 import pandas as pd
-import sqlite3
+import numpy as np
 import pyproj
-import os
 
-from erad.scenarios.common import AssetTypes
+from erad.scenarios.common import AssetTypes, AssetTable
+from erad.utils import instrumentation
 from erad.scenarios.utilities import ProbabilityFunctionBuilder
 
 
@@ -30,6 +32,50 @@ class Hurricane(BaseModel):
     name: str
     track: list[HurricaneStatus]
 
+class WindTimeStep(NamedTuple):
+    """Survival update of the assets within the influence radius at one time step.
+
+    Attributes:
+        status (HurricaneStatus): Interpolated hurricane status at this step
+        names (np.ndarray): Names of the updated assets
+        survival_probability (np.ndarray): Survival probability of the updated assets
+            accumulated over all steps so far
+    """
+    status: HurricaneStatus
+    names: np.ndarray
+    survival_probability: np.ndarray
+
+def wrap_longitude(longitude: np.ndarray) -> np.ndarray:
+    """Wraps longitudes or longitude differences into [-180, 180)."""
+    return (np.asarray(longitude) + 180) % 360 - 180
+
+def hurricane_from_track(hurricane_sid: str, hurricane_data: pd.DataFrame) -> Hurricane:
+    """Builds a Hurricane from a track returned by `EventCatalog.hurricane_track`."""
+    # Values are typed by the catalog, skip validation
+    track = [
+        HurricaneStatus.construct(
+            timestamp = timestamp,
+            wind_speed_mph = wind_kts * 1.15078,
+            pressure_mb = pressure_mb,
+            longitude = longitude,
+            latitude = latitude,
+            landfall_mi = landfall_km * 0.621371,
+        )
+        for timestamp, wind_kts, pressure_mb, longitude, latitude, landfall_km in zip(
+            [t.to_pydatetime() for t in hurricane_data['timestamp']],
+            hurricane_data['wind_kts'].tolist(),
+            hurricane_data['pressure_mb'].tolist(),
+            hurricane_data['longitude'].tolist(),
+            hurricane_data['latitude'].tolist(),
+            hurricane_data['landfall_km'].tolist(),
+        )
+    ]
+    return Hurricane(
+        sid = hurricane_sid,
+        name = hurricane_data['name'].iloc[0],
+        track = track
+    )
+
 class WindScenario(BaseScenario, GeoUtilities): 
     """Base class for FireScenario. Extends BaseScenario and GeoUtilities
 
@@ -39,6 +85,9 @@ class WindScenario(BaseScenario, GeoUtilities):
         timestamp (datetime): Scenario occurance time 
     """
     
+    # Fragility curves of `calculate_survival_probability` and `increment_time` take the
+    # distance to the eye in km, not a wind speed, and their survival probability is
+    # the CDF. Curves in peak gust are passed to `calculate_survival_probability_from_wind_field`.
     fragility_curves = {
         #Extending energy system modelling to include extreme weather risks and application to hurricane events in Puerto Rico
         AssetTypes.substation.name : ProbabilityFunctionBuilder("lognorm", [0.8, 10, 5]),
@@ -51,6 +100,9 @@ class WindScenario(BaseScenario, GeoUtilities):
         AssetTypes.transmission_overhead_lines.name  : ProbabilityFunctionBuilder("lognorm", [0.8, 10, 5]),
         AssetTypes.distribution_overhead_lines.name  :  ProbabilityFunctionBuilder("beta", [0.8, 10, 5]),
     }
+
+    # Folder where peak gust grids are stored and reused across runs, in memory only if None
+    wind_field_directory = None
     
     def __init__(self,  hurricane_track : LineString , probability_model : dict, hurricane: Hurricane) -> None:
         timestamps = [t.timestamp for t in hurricane.track]
@@ -59,37 +111,21 @@ class WindScenario(BaseScenario, GeoUtilities):
         return      
     
     @classmethod
-    def from_historical_hurricane_by_sid(cls, hurricane_sid : str, probability_function : dict= None):
-        assert os.path.exists(ERAD_DB), f"The data file {ERAD_DB} not found"
-        conn = sqlite3.connect(ERAD_DB)
-        hurricane_data = pd.read_sql(f"SELECT * FROM {HISTROIC_HURRICANE_TABLE} WHERE `SID ` = '{hurricane_sid}';", conn)
-        name = hurricane_data['NAME '][0] 
-        hurricane_data = hurricane_data[['LAT (degrees_north)', 'LON (degrees_east)', 'WMO_WIND (kts)', 'WMO_PRES (mb)', 'LANDFALL (km)', 'ISO_TIME ']]
-        for col  in ['WMO_WIND (kts)', 'WMO_PRES (mb)', 'LANDFALL (km)']:
-            hurricane_data = hurricane_data[hurricane_data[col] != ' ']
-        if hurricane_data.empty:
-            raise ValueError(f"Hurricane '{hurricane_sid}'  not found in column 'SID', table '{HISTROIC_HURRICANE_TABLE}' in the database")
-        conn.close() 
-        geometry = [Point(lat, lon) for lat, lon in zip(hurricane_data['LAT (degrees_north)'], hurricane_data['LON (degrees_east)'])]
+    def from_historical_hurricane_by_sid(cls, hurricane_sid : str, probability_function : dict= None, catalog : EventCatalog = None):
+        """Class method for WindScenario.
+
+        Args:
+            hurricane_sid (str): Storm identifier of a historic hurricane
+            probability_function (dict): Dictionary mapping asset types to probability funcitons
+            catalog (EventCatalog): Catalog the hurricane is looked up in, defaults to the ERAD database
+        """
+        catalog = catalog if catalog is not None else default_catalog()
+        hurricane_data = catalog.hurricane_track(hurricane_sid)
+        import geopandas as gpd
+        geometry = [Point(lat, lon) for lat, lon in zip(hurricane_data['latitude'], hurricane_data['longitude'])]
         cls.hurricane_data = gpd.GeoDataFrame(hurricane_data, geometry=geometry) 
         cls.hurricane_data.set_crs('epsg:4326') 
-
-        track = []
-        for idx, row_data in hurricane_data.iterrows():
-            track.append(HurricaneStatus(
-                timestamp = row_data['ISO_TIME '],
-                wind_speed_mph = float(row_data['WMO_WIND (kts)']) * 1.15078,
-                pressure_mb = float(row_data['WMO_PRES (mb)']),
-                longitude = float(row_data['LON (degrees_east)']),
-                latitude = float(row_data['LAT (degrees_north)']),
-                landfall_mi= float(row_data['LANDFALL (km)']) * 0.621371
-            ))
-        hurricane = Hurricane(
-            sid = hurricane_sid,
-            name = name,
-            track = track
-        )
-        return cls(LineString(geometry), probability_function, hurricane)
+        return cls(LineString(geometry), probability_function, hurricane_from_track(hurricane_sid, hurricane_data))
         
     @property
     def area(self) -> float:
@@ -116,35 +152,240 @@ class WindScenario(BaseScenario, GeoUtilities):
         else:
             return Point(self.hurricane.track[0].longitude, self.hurricane.track[0].latitude)
             
-    def increment_time(self):
-        """Method to increment simulation time for time evolviong scenarios."""
-        raise FeatureNotImplementedError()
+    def interpolate_track(self, time_step: timedelta) -> List[HurricaneStatus]:
+        """Linearly interpolates the hurricane track to a fixed time step.
 
-    def calculate_asset_wind_speed(self, distance_mi: float):
-        return distance_mi
-        
+        Longitudes are unwrapped before interpolating, so tracks crossing the
+        antimeridian move the short way around, and wrapped back to [-180, 180).
+
+        Args:
+            time_step (timedelta): Time between interpolated track points
+        """
+        track = self.hurricane.track
+        start = track[0].timestamp
+        offsets = np.array([(status.timestamp - start).total_seconds() for status in track])
+        step_offsets = np.arange(0, offsets[-1] + 1e-6, time_step.total_seconds())
+        fields = {
+            field: np.interp(step_offsets, offsets, [getattr(status, field) for status in track])
+            for field in ["wind_speed_mph", "pressure_mb", "latitude", "landfall_mi"]
+        }
+        longitude = np.unwrap([status.longitude for status in track], period=360)
+        fields["longitude"] = wrap_longitude(np.interp(step_offsets, offsets, longitude))
+        return [
+            HurricaneStatus(
+                timestamp=start + timedelta(seconds=float(offset)),
+                **{field: values[i] for field, values in fields.items()},
+            )
+            for i, offset in enumerate(step_offsets)
+        ]
+
+    def increment_time(
+        self,
+        assets: Union[dict, AssetTable],
+        time_step: timedelta = timedelta(minutes=30),
+        influence_radius_km: float = 500.0,
+    ) -> Iterator[WindTimeStep]:
+        """Steps the hurricane along its interpolated track and yields survival updates.
 
-    def calculate_survival_probability(self, assets : dict) -> dict:
-        for asset_type, asset_dict in assets.items():
+        At every step only assets within `influence_radius_km` of the eye are evaluated.
+        Each step contributes its log probability weighted by `time_step` relative to
+        the median spacing of the original track, so the accumulated survival is
+        comparable to `calculate_survival_probability` over the original track points.
+        The `survival_probability` of the updated assets is written back, to the
+        table or to the dictionary the assets were passed in, before every step is
+        yielded, so a consumer stopping early still sees the updates of the steps
+        it received.
+
+        Args:
+            assets (dict | AssetTable): The dictionary or table of all assets and their corresponding asset types
+            time_step (timedelta): Time between evaluated track points
+            influence_radius_km (float): Assets further away from the eye are not affected by a step
+
+        Yields:
+            WindTimeStep: Updated assets and their accumulated survival probability
+        """
+        table = AssetTable.from_assets(assets)
+        for asset_type in table.type_names:
+            assert asset_type in self.probability_model, f"Survival probability for asset type '{asset_type}' not found in the passed probability_model"
+        probability_functions = [self.probability_model[t] for t in table.type_names]
+
+        timestamps = [status.timestamp for status in self.hurricane.track]
+        intervals = [(b - a).total_seconds() for a, b in zip(timestamps, timestamps[1:])]
+        exposure = time_step.total_seconds() / np.median(intervals) if intervals else 1.0
+
+        log_survival = np.zeros(len(table))
+        table.set_column("survival_probability", np.ones(len(table)))
+        table.to_assets(assets)
+        order = np.argsort(table.latitude, kind="stable")
+        sorted_latitude = table.latitude[order]
+
+        for status in self.interpolate_track(time_step):
+            # Latitude band from the sorted assets, then a longitude window wide
+            # enough for the most poleward latitude of the band
+            band = influence_radius_km / 110.574
+            lo, hi = np.searchsorted(
+                sorted_latitude, [status.latitude - band, status.latitude + band]
+            )
+            rows = order[lo:hi]
+            max_latitude = min(89.9, abs(status.latitude) + band)
+            window = influence_radius_km / (111.320 * np.cos(np.radians(max_latitude)))
+            rows = rows[np.abs(wrap_longitude(table.longitude[rows] - status.longitude)) <= window]
+
+            distances = geodesic_distance(
+                status.longitude, status.latitude, table.longitude[rows], table.latitude[rows]
+            )
+            within = distances <= influence_radius_km
+            rows, distances = rows[within], distances[within]
+            instrumentation.observe("scenarios.wind_step_assets", len(rows))
+
+            codes = table.type_codes[rows]
+            for code in np.unique(codes):
+                selected = codes == code
+                log_survival[rows[selected]] += exposure * probability_functions[
+                    code
+                ].log_probabilities(distances[selected])
+
+            survival_probability = np.exp(log_survival[rows])
+            table.set_column("survival_probability", survival_probability, rows)
+            if assets is not table:
+                for name, code, probability in zip(table.names[rows], codes.tolist(), survival_probability.tolist()):
+                    assets[table.type_names[code]][name]["survival_probability"] = probability
+            yield WindTimeStep(status, table.names[rows], survival_probability)
+
+    def _fingerprint_parts(self) -> list:
+        return [self.hurricane.json().encode()]
+
+    def peak_gust_field(
+        self,
+        bounds: tuple,
+        resolution: float = 0.01,
+        time_step: timedelta = timedelta(minutes=30),
+    ) -> RegularGrid:
+        """Returns the peak gust grid of the storm over a region, rasterized once per region.
+
+        Args:
+            bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the region
+            resolution (float): Grid spacing in degrees
+            time_step (timedelta): Time step the track is interpolated to
+        """
+        longitude, latitude = RegularGrid.axes(bounds, resolution)
+        key = (longitude[0], latitude[0], longitude[-1], latitude[-1], resolution, time_step)
+        if not hasattr(self, "_wind_fields"):
+            self._wind_fields = {}
+        if key not in self._wind_fields:
+            self._wind_fields[key] = peak_gust_grid(
+                self.interpolate_track(time_step),
+                bounds,
+                resolution,
+                cache_directory=self.wind_field_directory,
+            )
+        return self._wind_fields[key]
+
+    @cached_survival_probability()
+    def calculate_survival_probability_from_wind_field(
+        self,
+        assets : Union[dict, AssetTable],
+        fragility_curves : dict,
+        resolution: float = 0.01,
+        time_step: timedelta = timedelta(minutes=30),
+    ) -> Union[dict, AssetTable]:
+        """Method to calculate survival probaility of asset types from the peak gust.
+
+        The peak gust of the Holland wind field over the interpolated track is
+        rasterized around the assets once and sampled bilinearly, so evaluation cost
+        does not depend on the track length. The survival probability is one minus
+        the CDF of the fragility curve at the gust, which is stored in the
+        `peak_gust_mph` column.
+
+        Args:
+            assets (dict | AssetTable): The dictionary or table of all assets and their corresponding asset types
+            fragility_curves (dict): Dictionary mapping asset types to fragility curves in peak gust (mph)
+            resolution (float): Grid spacing in degrees
+            time_step (timedelta): Time step the track is interpolated to
+        """
+        self.valitate_user_defined_fragility_curves(fragility_curves)
+        table = AssetTable.from_assets(assets)
+        if len(table) == 0:
+            return table.to_assets(assets)
+        bounds = (
+            table.longitude.min() - resolution,
+            table.latitude.min() - resolution,
+            table.longitude.max() + resolution,
+            table.latitude.max() + resolution,
+        )
+        gusts = self.peak_gust_field(bounds, resolution, time_step).sample(
+            table.longitude, table.latitude
+        )
+        table.set_column("peak_gust_mph", gusts)
+        for asset_type, index in table.groups():
+            assert asset_type in fragility_curves, f"Wind fragility curve for asset type '{asset_type}' not found"
+            probability_function = fragility_curves[asset_type]
+            table.set_column(
+                "survival_probability",
+                probability_function.probabilities(gusts[index], complement=True),
+                index,
+            )
+        return table.to_assets(assets)
+
+    @cached_survival_probability(ignore=("block_size",))
+    def calculate_survival_probability(
+        self,
+        assets : Union[dict, AssetTable],
+        store_distances: bool = False,
+        block_size: int = 2**22,
+    ) -> Union[dict, AssetTable]:
+        """Method to calculate survival probaility of asset types.
+
+        Distances between all track points and a block of assets are evaluated at
+        once, and the survival probability over the track is accumulated as a sum
+        of log probabilities. Every asset gets its closest distance to the eye in
+        the `min_distance_to_eye` column.
+
+        The fragility curves are evaluated at the distance to the eye in km, the
+        quantity the default `fragility_curves` are parameterized with. Survival
+        from the Holland wind speed at every asset is computed by
+        `calculate_survival_probability_from_wind_field` with curves in peak gust.
+
+        Args:
+            assets (dict | AssetTable): The dictionary or table of all assets and their corresponding asset types
+            store_distances (bool): Set to true to also store the distance to the eye at
+                every track point in the `distance_to_eye` column
+            block_size (int): Maximum number of track point x asset distances held in memory at once
+        """
+        table = AssetTable.from_assets(assets)
+        track_longitude = np.array([status.longitude for status in self.hurricane.track])[:, None]
+        track_latitude = np.array([status.latitude for status in self.hurricane.track])[:, None]
+        assets_per_block = max(1, block_size // max(1, len(self.hurricane.track)))
+
+        for asset_type, index in table.groups():
             assert asset_type in self.probability_model, f"Survival probability for asset type '{asset_type}' not found in the passed probability_model"
             probability_function = self.probability_model[asset_type]
-            print("probability_function: ", probability_function, asset_type)
-            for asset_name, asset_ppty in asset_dict.items():
-                coords = Point(asset_ppty["coordinates"])
-                coords = Point(coords.y, coords.x)
-                for track in self.hurricane.track:
-                    self.point = Point(track.longitude, track.latitude)
-                    distance = self.distance_from_centroid(coords)
-                    wind_speed = self.calculate_asset_wind_speed(distance)
-                    survival_probability = probability_function.probability(wind_speed)
-                    
-                    if "survival_probability" not in assets[asset_type][asset_name]:
-                        assets[asset_type][asset_name]["survival_probability"] = 1
-                        assets[asset_type][asset_name]["distance_to_eye"] = []
-
-                    assets[asset_type][asset_name]["survival_probability"] *= survival_probability
-                    assets[asset_type][asset_name]["distance_to_eye"].append(distance)  
-        return assets
+            log_survival = np.zeros(len(index))
+            min_distances = np.full(len(index), np.inf)
+            if store_distances:
+                distances = np.empty((len(index), len(self.hurricane.track)))
+
+            for start in range(0, len(index), assets_per_block):
+                rows = index[start : start + assets_per_block]
+                block = slice(start, start + len(rows))
+                # Track points along the first axis, assets along the second one
+                block_distances = geodesic_distance(
+                    track_longitude, track_latitude, table.longitude[rows], table.latitude[rows]
+                )
+                log_survival[block] = probability_function.log_probabilities(block_distances).sum(axis=0)
+                if len(self.hurricane.track):
+                    min_distances[block] = block_distances.min(axis=0)
+                if store_distances:
+                    distances[block] = block_distances.T
+            instrumentation.count(
+                "scenarios.distance_evaluations", len(index) * len(self.hurricane.track)
+            )
+
+            table.set_column("survival_probability", np.exp(log_survival), index)
+            table.set_column("min_distance_to_eye", min_distances, index)
+            if store_distances:
+                table.set_column("distance_to_eye", distances, index)
+        return table.to_assets(assets)
                 
     def plot(self):
         self.hurricane_data.plot()
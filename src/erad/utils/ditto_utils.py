@@ -14,9 +14,6 @@ import logging
 from typing import List
 
 # third-party libraries
-import boto3
-from botocore import UNSIGNED
-from botocore.config import Config
 from ditto.store import Store
 from ditto.readers.opendss.read import Reader
 from ditto.network.network import Network
@@ -49,6 +46,10 @@ def download_aws_dir(
         kwargs (dict): Keyword arguments accepted by `boto3.client`
     """
 
+    import boto3
+    from botocore import UNSIGNED
+    from botocore.config import Config
+
     target = Path(target)
     if unsigned:
         client = boto3.client("s3", config=Config(signature_version=UNSIGNED))
@@ -0,0 +1,365 @@
+""" Module for ground elevation lookups from local DEM rasters.
+
+GeoTIFF DEM tiles are opened once with rasterio to read their georeferencing.
+The first band of a tile is converted on first use to a `.npy` file in
+`erad.constants.CACHE_FOLDER` and memory-mapped, so later calls and later runs
+only page in the parts of the tile that are sampled. Point queries are
+vectorized and interpolated bilinearly between pixel centers, and converted
+from the vertical units of every tile to meters, or to feet with
+`ElevationProvider.elevation_ft`. Points outside every local tile can be
+served from SRTM3 tiles downloaded once to the cache folder.
+
+Example:
+    >>> from erad.utils.elevation import default_elevation_provider
+    >>> provider = default_elevation_provider()
+    >>> provider.elevation([-122.9, -122.8], [38.5, 38.5])
+"""
+
+# standard imports
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Union
+import functools
+import hashlib
+import io
+import logging
+import math
+import os
+import threading
+import zipfile
+
+# third-party imports
+from shapely import STRtree
+import numpy as np
+import shapely
+
+# internal imports
+from erad.constants import CACHE_FOLDER, ELEVATION_DOWNLOAD_URL, ELEVATION_TILE_FOLDER
+from erad.utils import instrumentation
+
+logger = logging.getLogger(__name__)
+
+TILE_SUFFIXES = (".tif", ".tiff", ".hgt")
+
+FEET_PER_METER = 3.28084
+
+# Vertical units of DEM bands, as found in GeoTIFF metadata, mapped to meters
+METERS_PER_UNIT = {
+    "m": 1.0,
+    "meter": 1.0,
+    "meters": 1.0,
+    "metre": 1.0,
+    "metres": 1.0,
+    "ft": 0.3048,
+    "foot": 0.3048,
+    "feet": 0.3048,
+    "us_survey_foot": 1200 / 3937,
+    "us survey foot": 1200 / 3937,
+    "ftus": 1200 / 3937,
+}
+
+
+class ElevationTile:
+    """Georeferencing of one DEM raster.
+
+    Attributes:
+        path (Path): GeoTIFF file of the tile
+        transform (Affine): Maps (column, row) to coordinates in the tile CRS
+        crs (str): CRS of the tile, None if it is lon/lat
+        shape (tuple): (rows, columns) of the raster
+        nodata (float): Value marking missing elevations, None if not set
+        bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the tile
+        units (str): Vertical units of the band
+        meters_per_unit (float): Factor converting band values to meters
+    """
+
+    def __init__(self, path: Union[str, Path], units: str = "m") -> None:
+        """Constructor for ElevationTile.
+
+        Args:
+            path (str | Path): GeoTIFF file of the tile
+            units (str): Vertical units used if the band does not declare any
+
+        Raises:
+            ValueError: If the vertical units are not supported
+        """
+        import rasterio
+        from rasterio.warp import transform_bounds
+
+        self.path = Path(path)
+        with rasterio.open(self.path) as dataset:
+            self.transform = dataset.transform
+            self.shape = (dataset.height, dataset.width)
+            self.nodata = dataset.nodata
+            self.units = (dataset.units[0] if dataset.units else None) or units
+            crs = dataset.crs
+            if crs is None or crs.to_epsg() == 4326:
+                self.crs = None
+                self.bounds = tuple(dataset.bounds)
+            else:
+                self.crs = crs.to_wkt()
+                self.bounds = transform_bounds(crs, "epsg:4326", *dataset.bounds)
+        if self.units.strip().lower() not in METERS_PER_UNIT:
+            raise ValueError(
+                f"Unsupported vertical units '{self.units}' of {self.path}. Valid options are {list(METERS_PER_UNIT)}"
+            )
+        self.meters_per_unit = METERS_PER_UNIT[self.units.strip().lower()]
+        self._transformer = None
+
+    def cache_file(self, directory: Path) -> Path:
+        """Returns the `.npy` file holding the converted band of this tile."""
+        stat = self.path.stat()
+        key = f"{self.path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+        return directory / f"{self.path.stem}_{hashlib.sha256(key.encode()).hexdigest()[:16]}.npy"
+
+    def load(self, directory: Path) -> np.ndarray:
+        """Memory-maps the band of this tile, converting it on first use."""
+        cache_file = self.cache_file(directory)
+        if not cache_file.exists():
+            import rasterio
+
+            with rasterio.open(self.path) as dataset:
+                values = dataset.read(1).astype(np.float32)
+            if self.nodata is not None:
+                values[values == self.nodata] = np.nan
+            directory.mkdir(parents=True, exist_ok=True)
+            temporary_file = cache_file.with_suffix(f".{os.getpid()}.tmp.npy")
+            np.save(temporary_file, values)
+            os.replace(temporary_file, cache_file)
+            logger.debug(f"Converted DEM tile {self.path} to {cache_file}")
+        return np.load(cache_file, mmap_mode="r")
+
+    def pixel_coordinates(self, longitude: np.ndarray, latitude: np.ndarray) -> tuple:
+        """Returns fractional (row, column) of points, 0 at the first pixel center."""
+        x, y = longitude, latitude
+        if self.crs is not None:
+            if self._transformer is None:
+                import pyproj
+
+                self._transformer = pyproj.Transformer.from_crs("epsg:4326", self.crs, always_xy=True)
+            x, y = self._transformer.transform(longitude, latitude)
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        inverse = ~self.transform
+        column = inverse.a * x + inverse.b * y + inverse.c
+        row = inverse.d * x + inverse.e * y + inverse.f
+        return row - 0.5, column - 0.5
+
+
+def bilinear_sample(values: np.ndarray, row: np.ndarray, column: np.ndarray) -> np.ndarray:
+    """Interpolates an array at fractional (row, column) positions.
+
+    Positions are clamped to the pixel centers at the edges of the array, and
+    NaN pixels propagate to the points around them.
+    """
+    rows, columns = values.shape
+    row = np.clip(row, 0, rows - 1)
+    column = np.clip(column, 0, columns - 1)
+    r0 = np.minimum(np.floor(row).astype(np.int64), max(rows - 2, 0))
+    c0 = np.minimum(np.floor(column).astype(np.int64), max(columns - 2, 0))
+    r1 = np.minimum(r0 + 1, rows - 1)
+    c1 = np.minimum(c0 + 1, columns - 1)
+    fr = row - r0
+    fc = column - c0
+    top = values[r0, c0] * (1 - fc) + values[r0, c1] * fc
+    bottom = values[r1, c0] * (1 - fc) + values[r1, c1] * fc
+    return (top * (1 - fr) + bottom * fr).astype(float)
+
+
+def srtm_tile_name(latitude: int, longitude: int) -> str:
+    """Returns the name of the SRTM tile whose south west corner is at a point, like `N38W123`."""
+    return (
+        f"{'N' if latitude >= 0 else 'S'}{abs(latitude):02d}"
+        f"{'E' if longitude >= 0 else 'W'}{abs(longitude):03d}"
+    )
+
+
+class ElevationProvider:
+    """Vectorized ground elevation from a set of DEM tiles.
+
+    Points are sampled from the first tile, in the order given, whose bounds
+    contain them. Elevations are converted to meters from the vertical units of
+    every tile, and NaN for points outside every tile or on nodata pixels.
+
+    With a `download_url`, the one degree SRTM3 tiles covering points outside
+    every tile are downloaded to `cache_directory` on first use and appended to
+    the tiles. Tiles the service does not have, over the sea for instance, are
+    remembered and their points stay NaN.
+
+    Attributes:
+        tiles (List[ElevationTile]): DEM tiles
+        cache_directory (Path): Folder holding the memory-mapped tile bands and downloaded tiles
+        cache_size (int): Number of tiles kept mapped between calls
+        download_url (str): Folder of zipped SRTM3 tiles, no downloads if None
+        timeout (float): Timeout of a download in seconds
+    """
+
+    def __init__(
+        self,
+        paths: Union[str, Path, List[Union[str, Path]]],
+        cache_directory: Union[str, Path, None] = None,
+        cache_size: int = 16,
+        units: str = "m",
+        download_url: Union[str, None] = None,
+        timeout: float = 60,
+    ) -> None:
+        """Constructor for ElevationProvider.
+
+        Args:
+            paths (str | Path | list): GeoTIFF or `.hgt` files, or folders searched for them
+            cache_directory (str | Path): Folder for the converted tile bands. Defaults
+                to `elevation` inside `erad.constants.CACHE_FOLDER`
+            cache_size (int): Number of tiles kept mapped between calls
+            units (str): Vertical units of tiles whose band does not declare any
+            download_url (str): Folder of zipped SRTM3 tiles used outside of the local tiles
+            timeout (float): Timeout of a download in seconds
+
+        Raises:
+            FileNotFoundError: If no tile is found and downloads are disabled
+        """
+        if isinstance(paths, (str, Path)):
+            paths = [paths]
+        files = []
+        for path in map(Path, paths):
+            if path.is_dir():
+                files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in TILE_SUFFIXES))
+            elif path.exists():
+                files.append(path)
+        if not files and download_url is None:
+            raise FileNotFoundError(
+                f"No DEM tiles found in {[str(p) for p in paths]}. Place GeoTIFF DEM tiles in "
+                f"that folder or set the ERAD_DEM_DIR environment variable to a folder holding them"
+            )
+
+        self.units = units
+        self.cache_directory = Path(cache_directory) if cache_directory is not None else CACHE_FOLDER / "elevation"
+        self.cache_size = cache_size
+        self.download_url = download_url.rstrip("/") if download_url else None
+        self.timeout = timeout
+        self._set_tiles([ElevationTile(path, units) for path in files])
+        self._unavailable = set()
+        self._arrays = OrderedDict()
+        self._lock = threading.Lock()
+        self._download_lock = threading.Lock()
+
+    def _set_tiles(self, tiles: List[ElevationTile]) -> None:
+        self.tiles = tiles
+        self._tree = STRtree([shapely.box(*tile.bounds) for tile in tiles])
+
+    def _array(self, tile_index: int) -> np.ndarray:
+        with self._lock:
+            if tile_index in self._arrays:
+                self._arrays.move_to_end(tile_index)
+                return self._arrays[tile_index]
+        values = self.tiles[tile_index].load(self.cache_directory)
+        with self._lock:
+            self._arrays[tile_index] = values
+            while len(self._arrays) > self.cache_size:
+                self._arrays.popitem(last=False)
+        return values
+
+    @instrumentation.timed("utils.ElevationProvider.elevation")
+    def elevation(self, longitude: np.ndarray, latitude: np.ndarray) -> np.ndarray:
+        """Returns the ground elevation in meters at arrays of points.
+
+        Args:
+            longitude (np.ndarray): Longitudes in degrees
+            latitude (np.ndarray): Latitudes in degrees
+        """
+        longitude = np.asarray(longitude, dtype=float)
+        latitude = np.asarray(latitude, dtype=float)
+        shape = np.broadcast(longitude, latitude).shape
+        longitude = np.broadcast_to(longitude, shape).ravel()
+        latitude = np.broadcast_to(latitude, shape).ravel()
+        instrumentation.count("utils.elevation_points", longitude.size)
+
+        elevation, covered = self._sample(longitude, latitude)
+        if self.download_url is not None:
+            outside = np.flatnonzero(~covered & np.isfinite(longitude) & np.isfinite(latitude))
+            if len(outside) and self._download(longitude[outside], latitude[outside]):
+                elevation[outside], _ = self._sample(longitude[outside], latitude[outside])
+        return elevation.reshape(shape)
+
+    def _sample(self, longitude: np.ndarray, latitude: np.ndarray) -> tuple:
+        """Returns the elevation of points and whether a tile covers them."""
+        tiles_in_use, tree = self.tiles, self._tree
+        elevation = np.full(longitude.size, np.nan)
+        covered = np.zeros(longitude.size, dtype=bool)
+        points, tiles = tree.query(shapely.points(longitude, latitude), predicate="intersects")
+        # First tile in the given order for every point
+        order = np.lexsort((tiles, points))
+        points, tiles = points[order], tiles[order]
+        first = np.ones(len(points), dtype=bool)
+        first[1:] = points[1:] != points[:-1]
+        points, tiles = points[first], tiles[first]
+        covered[points] = True
+
+        for tile_index in np.unique(tiles):
+            selected = points[tiles == tile_index]
+            tile = tiles_in_use[tile_index]
+            row, column = tile.pixel_coordinates(longitude[selected], latitude[selected])
+            elevation[selected] = tile.meters_per_unit * bilinear_sample(self._array(tile_index), row, column)
+        return elevation, covered
+
+    def _download(self, longitude: np.ndarray, latitude: np.ndarray) -> bool:
+        """Downloads the SRTM tiles covering points, returns True if tiles were added.
+
+        Raises:
+            FileNotFoundError: If a tile cannot be downloaded
+        """
+        cells = {
+            (math.floor(lat), math.floor(lon))
+            for lon, lat in set(zip(longitude.tolist(), latitude.tolist()))
+        }
+        with self._download_lock:
+            paths = [self._srtm_tile(*cell) for cell in sorted(cells - self._unavailable)]
+            paths = [path for path in paths if path is not None]
+            if paths:
+                self._set_tiles(self.tiles + [ElevationTile(path, self.units) for path in paths])
+        return bool(paths)
+
+    def _srtm_tile(self, latitude: int, longitude: int) -> Union[Path, None]:
+        """Returns the `.hgt` file of an SRTM tile, downloaded if needed, None if the service has none."""
+        import requests
+
+        name = srtm_tile_name(latitude, longitude)
+        path = self.cache_directory / "srtm" / f"{name}.hgt"
+        if path.exists():
+            return path
+        # Archives north of 54 degrees are named without the dot, like `N55W123hgt.zip`
+        url = f"{self.download_url}/{name}{'.' if latitude <= 54 else ''}hgt.zip"
+        try:
+            reply = requests.get(url, allow_redirects=True, timeout=self.timeout)
+            if reply.status_code == 404:
+                self._unavailable.add((latitude, longitude))
+                return None
+            reply.raise_for_status()
+        except requests.RequestException as error:
+            raise FileNotFoundError(
+                f"No DEM tile covers {name} and it could not be downloaded from {url}: {error}. "
+                f"Place GeoTIFF DEM tiles in the folder set by the ERAD_DEM_DIR environment variable "
+                f"({ELEVATION_TILE_FOLDER})"
+            ) from error
+        instrumentation.count("utils.elevation_downloads")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with zipfile.ZipFile(io.BytesIO(reply.content)) as archive:
+            member = next(m for m in archive.namelist() if m.lower().endswith(".hgt"))
+            temporary_file.write_bytes(archive.read(member))
+        os.replace(temporary_file, path)
+        logger.info(f"Downloaded DEM tile {url} to {path}")
+        return path
+
+    def elevation_ft(self, longitude: np.ndarray, latitude: np.ndarray) -> np.ndarray:
+        """Returns the ground elevation in feet at arrays of points."""
+        return self.elevation(longitude, latitude) * FEET_PER_METER
+
+
+@functools.lru_cache(maxsize=1)
+def default_elevation_provider() -> ElevationProvider:
+    """Returns the provider of the tiles in `erad.constants.ELEVATION_TILE_FOLDER`.
+
+    SRTM tiles are downloaded from `erad.constants.ELEVATION_DOWNLOAD_URL` for
+    points outside of those tiles, unless it is empty.
+    """
+    return ElevationProvider(ELEVATION_TILE_FOLDER, download_url=ELEVATION_DOWNLOAD_URL or None)
@@ -5,14 +5,14 @@ infrastructure in that region.
 """
 # standard imports
 from pathlib import Path
-import math
 from typing import Union, List
 
 # third-party imports
+import numpy as np
 import pandas as pd
-import stateplane
 
 # internal imports
+from erad.utils import projection
 from erad.utils.util import path_validation
 
 
@@ -105,43 +105,33 @@ def get_relationship_between_hifld_infrastructures(
 
     merged_data = pd.merge(
         load_df, bus_df, how="left", left_on="source", right_on="name"
-    ).to_dict(orient="records")
+    )
+
+    # convert all coordinates into state plane coordinates at once
+    hifld_x, hifld_y = projection.from_lonlat(
+        hifld_data_df["LONGITUDE"], hifld_data_df["LATITUDE"]
+    )
+    load_x, load_y = projection.from_lonlat(
+        merged_data["longitude"], merged_data["latitude"]
+    )
+    load_names = merged_data["name_x"].to_numpy()
 
     # Container for storing shelter relationships
     _relationship = []
-    for _record in hifld_data_df.to_dict(orient="records"):
-        _lon, _lat = _record["LONGITUDE"], _record["LATITUDE"]
-
-        # convert into state plane coordinates
-        _lon_translated, _lat_translated = stateplane.from_lonlat(_lon, _lat)
-
-        # Loop through all the loads
-        for load_record in merged_data:
-
-            load_lon, load_lat = (
-                load_record["longitude"],
-                load_record["latitude"],
-            )
-
-            # convert into state plane coordinates
-            load_lon_translated, load_lat_translated = stateplane.from_lonlat(
-                load_lon, load_lat
+    for _record, _x, _y in zip(
+        hifld_data_df[unique_id_column], hifld_x, hifld_y
+    ):
+        # computes distance to all the loads
+        distances = np.sqrt((_y - load_y) ** 2 + (_x - load_x) ** 2)
+
+        for index in np.flatnonzero(distances < distance_threshold):
+            _relationship.append(
+                {
+                    unique_id_column: _record,
+                    "load_name": load_names[index],
+                    "distance": distances[index],
+                }
             )
 
-            # computes distance
-            distance = math.sqrt(
-                (_lat_translated - load_lat_translated) ** 2
-                + (_lon_translated - load_lon_translated) ** 2
-            )
-
-            if distance < distance_threshold:
-                _relationship.append(
-                    {
-                        unique_id_column: _record[unique_id_column],
-                        "load_name": load_record["name_x"],
-                        "distance": distance,
-                    }
-                )
-
     df = pd.DataFrame(_relationship)
     df.to_csv(output_csv_path)
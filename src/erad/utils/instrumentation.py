@@ -0,0 +1,213 @@
+""" Module for low overhead timing and counter instrumentation.
+
+Named spans time blocks of code and counters accumulate quantities such as
+assets processed, queries issued or rows written. Everything is aggregated in
+memory in a process wide registry, so nothing is formatted or logged on the hot
+path, and a per-run profile can be dumped as JSON.
+
+Example:
+    >>> from erad.utils.instrumentation import registry
+    >>> with registry.span("scenarios.build"):
+    ...     registry.count("scenarios.assets_processed", 100)
+    >>> registry.dump("profile.json")
+
+Instrumentation can be turned off with `registry.enabled = False` or by setting
+the `ERAD_INSTRUMENTATION` environment variable to `0`.
+"""
+
+# standard imports
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Union
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+
+class Histogram:
+    """In-memory histogram with power of two buckets.
+
+    Attributes:
+        count (int): Number of recorded values
+        total (float): Sum of recorded values
+        minimum (float): Smallest recorded value
+        maximum (float): Largest recorded value
+        buckets (dict): Number of values per bucket, keyed by the base two
+            exponent of the bucket upper bound
+    """
+
+    __slots__ = ("count", "total", "minimum", "maximum", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.buckets = {}
+
+    def record(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        # value is in [2**(exponent - 1), 2**exponent), zero and negative values
+        # share the bucket with exponent -inf
+        exponent = math.frexp(value)[1] if value > 0 else -math.inf
+        self.buckets[exponent] = self.buckets.get(exponent, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        """Returns the upper bound of the bucket holding the q-th quantile."""
+        target = q * self.count
+        seen = 0
+        for exponent in sorted(self.buckets):
+            seen += self.buckets[exponent]
+            if seen >= target:
+                return min(2.0**exponent, self.maximum)
+        return self.maximum
+
+    def to_dict(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count,
+            "min": self.minimum,
+            "max": self.maximum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {repr(2.0**e): n for e, n in sorted(self.buckets.items())},
+        }
+
+
+class _Span:
+    """Context manager recording the elapsed time of a block into a histogram."""
+
+    __slots__ = ("histogram", "lock", "start")
+
+    def __init__(self, histogram: Histogram, lock: threading.Lock) -> None:
+        self.histogram = histogram
+        self.lock = lock
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        with self.lock:
+            self.histogram.record(elapsed)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class InstrumentationRegistry:
+    """Registry aggregating span durations, counters and value histograms.
+
+    Attributes:
+        enabled (bool): Spans and counters are no-ops when false
+        spans (dict): Histogram of durations in seconds per span name
+        counters (dict): Accumulated value per counter name
+        histograms (dict): Histogram of observed values per name
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Clears all recorded spans, counters and histograms."""
+        with self._lock:
+            self.spans: Dict[str, Histogram] = {}
+            self.counters: Dict[str, float] = {}
+            self.histograms: Dict[str, Histogram] = {}
+            self.started = datetime.now()
+
+    def span(self, name: str):
+        """Returns a context manager timing the enclosed block under `name`."""
+        if not self.enabled:
+            return _NULL_SPAN
+        histogram = self.spans.get(name)
+        if histogram is None:
+            histogram = self.spans.setdefault(name, Histogram())
+        return _Span(histogram, self._lock)
+
+    def timed(self, name: Union[str, None] = None):
+        """Decorator timing every call of a function as a span.
+
+        Args:
+            name (str): Span name, defaults to the module and qualified name of the function
+        """
+
+        def decorator(func):
+            span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name: str, value: float = 1) -> None:
+        """Adds `value` to the counter `name`."""
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        """Records a value, e.g. a batch size, in the histogram `name`."""
+        if self.enabled:
+            with self._lock:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+                histogram.record(value)
+
+    def profile(self) -> dict:
+        """Returns all recorded spans, counters and histograms as a dictionary."""
+        with self._lock:
+            return {
+                "started": self.started.isoformat(),
+                "finished": datetime.now().isoformat(),
+                "pid": os.getpid(),
+                "spans": {name: h.to_dict() for name, h in sorted(self.spans.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {
+                    name: h.to_dict() for name, h in sorted(self.histograms.items())
+                },
+            }
+
+    def dump(self, file_path: Union[str, Path]) -> None:
+        """Writes the profile of the current run to a JSON file."""
+        Path(file_path).write_text(json.dumps(self.profile(), indent=2))
+
+
+registry = InstrumentationRegistry(
+    enabled=os.environ.get("ERAD_INSTRUMENTATION", "1") not in ("0", "false", "False")
+)
+
+span = registry.span
+timed = registry.timed
+count = registry.count
+observe = registry.observe
@@ -0,0 +1,470 @@
+""" Module for fetching NOAA water gauge data.
+
+Stage and flow series of many gauges are requested concurrently from the
+National Water Prediction Service API over a bounded pool of connections.
+Every response body is stored in a content-addressed disk cache, keyed by the
+SHA-256 of the body, with an index from request URL to body, so recent
+responses can be replayed when the service is unreachable, and any earlier
+response when running offline. Replayed gauges are listed in the `replayed`
+attribute of the responses and in `attrs["replayed"]` of the frames built
+from them.
+
+National shapefiles of gauge observations and forecasts are downloaded once
+per forecast tag and validity time, and only the gauges inside the bounding box
+of a region are read from them.
+
+Example:
+    >>> from erad.utils.noaa_utils import GaugeClient, stageflow_frames
+    >>> client = GaugeClient(workers=8)
+    >>> flows, levels = stageflow_frames(client.fetch(["SRRC1", "GUEC1"]))
+"""
+
+# standard imports
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+import hashlib
+import json
+import logging
+import os
+import tarfile
+import tempfile
+import threading
+
+# third-party imports
+import pandas as pd
+import shapely
+
+# internal imports
+from erad.constants import CACHE_FOLDER
+from erad.utils import instrumentation
+
+logger = logging.getLogger(__name__)
+
+NWPS_URL = "https://api.water.noaa.gov/nwps/v1"
+SHAPEFILE_URL = "https://water.noaa.gov/resources/downloads/shapefiles"
+
+
+class ResponseCache:
+    """Content-addressed store of HTTP response bodies.
+
+    Bodies are written to `objects/<sha256 of body>` and the URL they were
+    fetched from points to them through `requests/<sha256 of URL>`, so identical
+    responses are stored once.
+
+    Attributes:
+        directory (Path): Folder of the cache
+    """
+
+    def __init__(self, directory: Union[str, Path]) -> None:
+        self.directory = Path(directory)
+
+    @staticmethod
+    def _digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _request_file(self, url: str) -> Path:
+        return self.directory / "requests" / self._digest(url.encode())
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temporary_path.write_bytes(data)
+        os.replace(temporary_path, path)
+
+    def get(self, url: str) -> Union[bytes, None]:
+        """Returns the last body stored for a URL, None if there is none."""
+        request_file = self._request_file(url)
+        if not request_file.exists():
+            return None
+        object_file = self.directory / "objects" / request_file.read_text().strip()
+        return object_file.read_bytes() if object_file.exists() else None
+
+    def stored_at(self, url: str) -> Union[datetime, None]:
+        """Returns when the last body of a URL was stored, None if there is none."""
+        request_file = self._request_file(url)
+        if not request_file.exists():
+            return None
+        return datetime.fromtimestamp(request_file.stat().st_mtime, timezone.utc)
+
+    def put(self, url: str, body: bytes) -> str:
+        """Stores the body fetched from a URL and returns its digest."""
+        digest = self._digest(body)
+        object_file = self.directory / "objects" / digest
+        if not object_file.exists():
+            self._write(object_file, body)
+        self._write(self._request_file(url), digest.encode())
+        return digest
+
+
+class GaugeResponses(dict):
+    """Stage and flow responses by gauge id.
+
+    Attributes:
+        replayed (dict): Time the replayed response of a gauge was stored, by gauge id,
+            for the gauges not fetched live
+    """
+
+    def __init__(self, *args, replayed: Optional[Dict[str, datetime]] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.replayed = dict(replayed or {})
+
+
+class GaugeClient:
+    """Concurrent client of the NWPS gauge API with a replay cache.
+
+    Cached responses are replayed when the service cannot be reached or times
+    out, as long as they are not older than `max_replay_age`. HTTP errors
+    reported by the service are raised.
+
+    Attributes:
+        base_url (str): Root of the API
+        workers (int): Number of requests in flight
+        timeout (float): Timeout of a request in seconds
+        offline (bool): Only replay cached responses, whatever their age, never touch the network
+        max_replay_age (timedelta): Age above which cached responses are not replayed
+            when the service is unreachable, no limit if None
+        cache (ResponseCache): Cache of response bodies, None to disable it
+    """
+
+    def __init__(
+        self,
+        base_url: str = NWPS_URL,
+        workers: int = 8,
+        timeout: float = 30,
+        cache_directory: Union[str, Path, None] = CACHE_FOLDER / "noaa",
+        offline: bool = False,
+        max_replay_age: Union[timedelta, None] = timedelta(hours=1),
+    ) -> None:
+        """Constructor for GaugeClient.
+
+        Args:
+            base_url (str): Root of the API
+            workers (int): Number of worker threads, also the size of the connection pool
+            timeout (float): Timeout of a request in seconds
+            cache_directory (str | Path): Folder of the replay cache, no cache if None
+            offline (bool): Only replay cached responses
+            max_replay_age (timedelta): Oldest cached response replayed when the service
+                is unreachable, no limit if None
+        """
+        self.base_url = base_url.rstrip("/")
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.offline = offline
+        self.max_replay_age = max_replay_age
+        self.cache = ResponseCache(cache_directory) if cache_directory is not None else None
+        self._session = None
+
+    @property
+    def session(self):
+        """Requests session sharing a pool of `workers` connections."""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers, pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def stageflow_url(self, gauge_id: str) -> str:
+        return f"{self.base_url}/gauges/{gauge_id}/stageflow"
+
+    def get(self, url: str) -> dict:
+        """Returns the JSON body of a URL, replayed from the cache if the service is unreachable.
+
+        Raises:
+            requests.HTTPError: If the service answers with an error status
+            LookupError: If the URL is unreachable and has no cached response recent enough
+        """
+        return self._get(url)[0]
+
+    def _get(self, url: str) -> Tuple[dict, Union[datetime, None]]:
+        """Returns the JSON body of a URL and when it was stored if it is replayed."""
+        max_age = None
+        if not self.offline:
+            import requests
+
+            try:
+                reply = self.session.get(url, allow_redirects=True, timeout=self.timeout)
+                reply.raise_for_status()
+                instrumentation.count("utils.noaa_requests")
+                if self.cache is not None:
+                    self.cache.put(url, reply.content)
+                return json.loads(reply.content), None
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if self.cache is None:
+                    raise
+                logger.warning(f"Replaying cached response of {url}: {error}")
+            max_age = self.max_replay_age
+
+        body = self.cache.get(url) if self.cache is not None else None
+        if body is None:
+            raise LookupError(f"No cached response for {url}")
+        stored_at = self.cache.stored_at(url)
+        if max_age is not None and datetime.now(timezone.utc) - stored_at > max_age:
+            raise LookupError(f"Cached response for {url} from {stored_at} is older than {max_age}")
+        instrumentation.count("utils.noaa_replays")
+        return json.loads(body), stored_at
+
+    @instrumentation.timed("utils.GaugeClient.fetch")
+    def fetch(self, gauge_ids: List[str]) -> GaugeResponses:
+        """Returns the stage and flow response of every gauge, fetched concurrently."""
+        gauge_ids = list(dict.fromkeys(gauge_ids))
+        urls = [self.stageflow_url(gauge_id) for gauge_id in gauge_ids]
+        if self.workers > 1 and len(urls) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                responses = list(executor.map(self._get, urls))
+        else:
+            responses = [self._get(url) for url in urls]
+        return GaugeResponses(
+            {gauge_id: data for gauge_id, (data, _) in zip(gauge_ids, responses)},
+            replayed={
+                gauge_id: stored_at
+                for gauge_id, (_, stored_at) in zip(gauge_ids, responses)
+                if stored_at is not None
+            },
+        )
+
+
+def stageflow_frames(responses: Dict[str, dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Assembles stage and flow responses into one frame per quantity.
+
+    Observed and forecast values of a gauge are joined into one series, keeping
+    the observation where both exist for the same time, and all gauges are
+    aligned on the union of their times with a single concat. The replayed
+    responses of `GaugeResponses` are copied to `attrs["replayed"]` of both
+    frames.
+
+    Returns:
+        tuple: Flows and levels with one column per gauge, indexed by time
+    """
+    flows, levels = {}, {}
+    for gauge_id, data in responses.items():
+        records = pd.concat(
+            [pd.DataFrame(data[part]["data"]) for part in ["observed", "forecast"]],
+            ignore_index=True,
+        )
+        if records.empty:
+            continue
+        records.index = pd.to_datetime(records["validTime"])
+        records = records[~records.index.duplicated(keep="first")]
+        levels[gauge_id] = records["primary"]
+        flows[gauge_id] = records["secondary"]
+
+    def _frame(series):
+        frame = pd.concat(series, axis=1, join="outer").sort_index() if series else pd.DataFrame()
+        frame.attrs["replayed"] = dict(getattr(responses, "replayed", {}))
+        return frame
+
+    return _frame(flows), _frame(levels)
+
+
+def forecast_tag(forecast_day: int = 0) -> str:
+    """Returns the tag of the national shapefile holding observations or a forecast day."""
+    if forecast_day == 0:
+        return "obs"
+    if forecast_day == 1:
+        return "fcst_f024"
+    return f"fcst_f{forecast_day * 24}"
+
+
+class NationalShapefileCache:
+    """Downloads and extracts the national gauge shapefiles once per validity time.
+
+    Archives are keyed by forecast tag and by the `Last-Modified` time the
+    service reports for them, and are extracted to `<tag>_<validity time>`
+    folders. A folder extracted less than `max_age` ago is reused without
+    contacting the service, and the newest folder of a tag is used when the
+    service cannot be reached.
+
+    Attributes:
+        base_url (str): Folder of the archives on the service
+        directory (Path): Folder of the extracted archives
+        max_age (timedelta): Age under which an extracted archive is reused without a request
+        timeout (float): Timeout of a request in seconds
+        offline (bool): Only use extracted archives
+    """
+
+    def __init__(
+        self,
+        base_url: str = SHAPEFILE_URL,
+        directory: Union[str, Path] = CACHE_FOLDER / "noaa" / "shapefiles",
+        max_age: timedelta = timedelta(minutes=15),
+        timeout: float = 120,
+        offline: bool = False,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.directory = Path(directory)
+        self.max_age = max_age
+        self.timeout = timeout
+        self.offline = offline
+
+    def url(self, tag: str) -> str:
+        return f"{self.base_url}/national_shapefile_{tag}.tgz"
+
+    def _extracted(self, tag: str) -> List[Path]:
+        """Returns the extracted folders of a tag, oldest validity time first."""
+        if not self.directory.exists():
+            return []
+        return sorted(
+            folder for folder in self.directory.glob(f"{tag}_*")
+            if folder.is_dir() and self._shapefile(folder, tag) is not None
+        )
+
+    @staticmethod
+    def _shapefile(folder: Path, tag: str) -> Union[Path, None]:
+        matches = sorted(folder.rglob(f"national_shapefile_{tag}.shp")) or sorted(folder.rglob("*.shp"))
+        return matches[0] if matches else None
+
+    def validity_time(self, tag: str) -> datetime:
+        """Returns the time the archive of a tag was last updated on the service."""
+        import requests
+
+        reply = requests.head(self.url(tag), allow_redirects=True, timeout=self.timeout)
+        reply.raise_for_status()
+        if "Last-Modified" in reply.headers:
+            return parsedate_to_datetime(reply.headers["Last-Modified"]).astimezone(timezone.utc)
+        # Without a modification time archives are refreshed once per hour
+        return datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    @instrumentation.timed("utils.NationalShapefileCache.shapefile")
+    def shapefile(self, tag: str = "obs", valid_time: Union[datetime, None] = None) -> Path:
+        """Returns the extracted shapefile of a tag, downloading it if required.
+
+        Args:
+            tag (str): Forecast tag, see `forecast_tag`
+            valid_time (datetime): Validity time of the archive, by default the one
+                reported by the service
+
+        Raises:
+            LookupError: If the archive is not extracted yet and cannot be downloaded
+        """
+        import requests
+
+        if valid_time is None:
+            extracted = self._extracted(tag)
+            fresh = self._fresh(tag, extracted)
+            if fresh is not None:
+                return fresh
+            try:
+                valid_time = self.validity_time(tag)
+            except requests.RequestException as error:
+                if not extracted:
+                    raise
+                logger.warning(f"Using extracted shapefile {extracted[-1]}: {error}")
+                return self._shapefile(extracted[-1], tag)
+
+        folder = self.directory / f"{tag}_{valid_time.astimezone(timezone.utc):%Y%m%dT%H%M%SZ}"
+        if folder.is_dir() and self._shapefile(folder, tag) is not None:
+            os.utime(folder)
+            return self._shapefile(folder, tag)
+        if self.offline:
+            raise LookupError(f"No extracted shapefile for '{tag}' valid at {valid_time}")
+        self._download(tag, folder)
+        return self._shapefile(folder, tag)
+
+    def _fresh(self, tag: str, extracted: List[Path]) -> Union[Path, None]:
+        """Returns the newest extracted shapefile of a tag if it can be used without a request.
+
+        Raises:
+            LookupError: If running offline and nothing is extracted for the tag
+        """
+        if extracted:
+            age = datetime.now().timestamp() - extracted[-1].stat().st_mtime
+            if self.offline or age < self.max_age.total_seconds():
+                return self._shapefile(extracted[-1], tag)
+        if self.offline:
+            raise LookupError(f"No extracted shapefile for '{tag}' in {self.directory}")
+        return None
+
+    def _download(self, tag: str, folder: Path) -> None:
+        """Downloads the archive of a tag and extracts it to a folder."""
+        import requests
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.directory) as temporary:
+            archive = Path(temporary) / "archive.tgz"
+            with requests.get(self.url(tag), stream=True, allow_redirects=True, timeout=self.timeout) as reply:
+                reply.raise_for_status()
+                with open(archive, "wb") as f:
+                    for chunk in reply.iter_content(chunk_size=1 << 20):
+                        f.write(chunk)
+            instrumentation.count("utils.noaa_shapefile_downloads")
+            target = Path(temporary) / "extracted"
+            _extract(archive, target)
+            if self._shapefile(target, tag) is None:
+                raise LookupError(f"No shapefile found in {self.url(tag)}")
+            try:
+                os.replace(target, folder)
+            except OSError:
+                # Extracted concurrently by another process
+                if self._shapefile(folder, tag) is None:
+                    raise
+        logger.info(f"Extracted {self.url(tag)} to {folder}")
+
+
+def _extract(archive: Path, target: Path) -> None:
+    """Extracts an archive and the archives nested in it."""
+    with tarfile.open(archive, "r:*") as tar:
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(target, filter="data")
+        else:
+            tar.extractall(target, members=_safe_members(tar, target))
+    for nested in sorted(p for p in target.rglob("*") if p.name.endswith((".tgz", ".tar", ".tar.gz"))):
+        _extract(nested, nested.parent)
+        nested.unlink()
+
+
+def _safe_members(tar: tarfile.TarFile, target: Path) -> List[tarfile.TarInfo]:
+    """Returns the members of an archive, checked like the `data` extraction filter.
+
+    Used on Python versions without `tarfile.data_filter`.
+
+    Raises:
+        tarfile.TarError: If a member is not a regular file or folder, or is
+            extracted outside of `target`
+    """
+    root = Path(target).resolve()
+    members = tar.getmembers()
+    for member in members:
+        if not (member.isfile() or member.isdir()):
+            raise tarfile.TarError(f"Refusing to extract {member.name}, not a regular file or folder")
+        path = (root / member.name).resolve()
+        if os.path.isabs(member.name) or not path.is_relative_to(root):
+            raise tarfile.TarError(f"Refusing to extract {member.name} outside of {root}")
+    return members
+
+
+def read_gauges(shapefile: Union[str, Path], multipolygon):
+    """Reads the gauges of a national shapefile located inside a polygon.
+
+    Only the features within the bounding box of the polygon are read, then
+    gauges are tested against the polygon in one vectorized call.
+
+    Args:
+        shapefile (str | Path): National gauge shapefile
+        multipolygon (MultiPolygon): Region in (latitude, longitude) order, like the
+            polygons of flood scenarios
+
+    Returns:
+        gpd.GeoDataFrame: Gauges inside the polygon
+    """
+    import geopandas as gpd
+
+    lat_min, lon_min, lat_max, lon_max = multipolygon.bounds
+    data = gpd.read_file(shapefile, bbox=(lon_min, lat_min, lon_max, lat_max))
+    inside = shapely.contains_xy(
+        multipolygon, data["Latitude"].to_numpy(dtype=float), data["Longitude"].to_numpy(dtype=float)
+    )
+    return data[inside].reset_index(drop=True)
@@ -17,13 +17,14 @@ from typing import List
 
 # third-party imports
 import opendssdirect as dss
+import numpy as np
 import pandas as pd
 import networkx as nx
 from shapely.geometry import MultiPoint
-import stateplane
 
 # internal imports
 from erad.utils.util import path_validation, setup_logging
+from erad.utils import instrumentation, projection
 from erad.exceptions import OpenDSSCommandError, MultiStatePlaneError
 
 
@@ -234,6 +235,7 @@ def execute_dss_command(dss_instance: dss, dss_command: str) -> None:
 
     """
     error = dss_instance.run_command(dss_command)
+    instrumentation.count("opendss.commands_executed")
     if error:
         logger.error(f"Error executing command {dss_command} >> {error}")
         raise OpenDSSCommandError(
@@ -242,6 +244,7 @@ def execute_dss_command(dss_instance: dss, dss_command: str) -> None:
     logger.info(f"Sucessfully executed the command, {dss_command}")
 
 
+@instrumentation.timed("opendss.get_bounding_box")
 def get_bounding_box(master_file: str, buffer: float = 1000) -> List:
     """Creates a bounding box coordinate for covering region of opendss model.
 
@@ -279,31 +282,34 @@ def get_bounding_box(master_file: str, buffer: float = 1000) -> List:
     bounds = multi_points.bounds
 
     # Get EPSG value for converting into coordinate reference system
-    if stateplane.identify(bounds[0], bounds[1]) != stateplane.identify(
-        bounds[2], bounds[3]
-    ):
+    corner_epsg = projection.identify_stateplanes(
+        [bounds[0], bounds[2]], [bounds[1], bounds[3]]
+    )
+    if corner_epsg[0] != corner_epsg[1]:
         raise MultiStatePlaneError(
             f"The regions uses multiple stateplane coordinate system"
         )
 
-    epsg_value = stateplane.identify(bounds[0], bounds[1])
+    epsg_value = corner_epsg[0]
 
     # Let's project all the WGS84 coordinates into
     # transformed coordinates this will make sure distance is in meter
-    transformed_points = [
-        stateplane.from_lonlat(*point, epsg_value) for point in points
-    ]
+    points = np.array(points, dtype=float).reshape(-1, 2)
+    transformed_points = np.column_stack(
+        projection.from_lonlat(points[:, 0], points[:, 1], epsg_value)
+    )
 
     # Create a multipoint from the transformed coordinates
     transformed_multipoint = MultiPoint(transformed_points).buffer(buffer)
 
     # Get the bounds and convert back to wsg84 format
     transformed_bounds = transformed_multipoint.bounds
-    bounds_wsg84 = stateplane.to_lonlat(
-        transformed_bounds[0], transformed_bounds[1], epsg_value
-    ) + stateplane.to_lonlat(
-        transformed_bounds[2], transformed_bounds[3], epsg_value
+    longitude, latitude = projection.to_lonlat(
+        [transformed_bounds[0], transformed_bounds[2]],
+        [transformed_bounds[1], transformed_bounds[3]],
+        epsg_value,
     )
+    bounds_wsg84 = (longitude[0], latitude[0], longitude[1], latitude[1])
 
     return bounds_wsg84
 
@@ -1,7 +1,6 @@
 import json
 from typing import List
 
-import overpass
 import polars
 
 # Define your polygon coordinates as a string
@@ -49,6 +48,8 @@ def export_csv(json_parcels, out_path:str):
 
 
 def get_sites(polygon: str, tags: List[str] ):
+    import overpass
+
     # polygon = "33.6812,-118.5966, 34.3407,-118.1390" latitude, longitude 
     json_parcels = {
         "type": "FeatureCollection",
@@ -0,0 +1,123 @@
+""" Module for converting arrays of coordinates to and from stateplane projections.
+
+`stateplane.from_lonlat` identifies the zone of a point by testing the zone
+boundaries one by one and converts one point per call. The functions below look
+zones up in an STRtree, keep one `pyproj.Transformer` per EPSG code and convert
+all points of a zone in a single call, with the same zone choice and the same
+axis order as the `stateplane` package.
+
+Example:
+    >>> from erad.utils.projection import from_lonlat, identify_stateplanes
+    >>> x, y = from_lonlat([-122.9, -122.8], [38.5, 38.5])
+"""
+
+# standard imports
+from typing import Tuple, Union
+import functools
+
+# third-party imports
+from shapely import STRtree
+import numpy as np
+import pyproj
+import shapely
+
+
+@functools.lru_cache(maxsize=1)
+def _stateplane_zones() -> Tuple[STRtree, np.ndarray]:
+    """Returns the stateplane zone boundaries in an STRtree and their EPSG codes."""
+    import stateplane
+
+    zones = stateplane._sp.STATEPLANES
+    tree = STRtree([zone["geometry"] for zone in zones])
+    return tree, np.array([zone["properties"]["EPSG"] for zone in zones], dtype=object)
+
+
+@functools.lru_cache(maxsize=None)
+def stateplane_transformer(epsg: Union[str, int]) -> pyproj.Transformer:
+    """Returns the cached transformer from a stateplane zone to lon/lat.
+
+    Built like the transformers of the `stateplane` package: the inverse
+    direction takes (latitude, longitude) and returns the zone coordinates in the
+    axis order of the zone.
+    """
+    return pyproj.Transformer.from_crs(pyproj.CRS(int(epsg)), 4326)
+
+
+def identify_stateplanes(longitude, latitude, nearest: bool = True) -> np.ndarray:
+    """Returns the stateplane EPSG code of every point, like `stateplane.identify`.
+
+    Points get the first zone containing them, or else the closest zone, and
+    None if their coordinates are missing.
+
+    Args:
+        longitude (np.ndarray): Longitudes in degrees
+        latitude (np.ndarray): Latitudes in degrees
+        nearest (bool): Set to false to return None for points outside every zone
+    """
+    longitude = np.atleast_1d(np.asarray(longitude, dtype=float))
+    latitude = np.atleast_1d(np.asarray(latitude, dtype=float))
+    tree, epsg = _stateplane_zones()
+    points = shapely.points(longitude, latitude)
+
+    zone = np.full(len(points), -1)
+    point_index, zone_index = _first_match(*tree.query(points, predicate="within"))
+    zone[point_index] = zone_index
+    outside = np.flatnonzero(zone < 0)
+    if nearest and len(outside):
+        point_index, zone_index = _first_match(*tree.query_nearest(points[outside], all_matches=True))
+        zone[outside[point_index]] = zone_index
+    return np.where(zone >= 0, epsg[zone], None)
+
+
+def _first_match(point_index: np.ndarray, zone_index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Keeps the lowest zone index matched by every point of an STRtree query."""
+    order = np.lexsort((zone_index, point_index))
+    point_index, first = np.unique(point_index[order], return_index=True)
+    return point_index, zone_index[order][first]
+
+
+def identify_stateplane(longitude: float, latitude: float, nearest: bool = True) -> str:
+    """Returns the stateplane EPSG code of one point."""
+    return identify_stateplanes(longitude, latitude, nearest)[0]
+
+
+def from_lonlat(longitude, latitude, epsg: Union[str, int, None] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Converts arrays of lon/lat points to stateplane coordinates.
+
+    Args:
+        longitude (np.ndarray): Longitudes in degrees
+        latitude (np.ndarray): Latitudes in degrees
+        epsg (str | int): Zone of all points, every point is converted in its own
+            zone if not provided
+
+    Returns:
+        tuple: Arrays of x and y coordinates
+    """
+    from pyproj.enums import TransformDirection
+
+    longitude = np.atleast_1d(np.asarray(longitude, dtype=float))
+    latitude = np.atleast_1d(np.asarray(latitude, dtype=float))
+    x = np.full(len(longitude), np.nan)
+    y = np.full(len(longitude), np.nan)
+    if epsg is not None:
+        zones = np.full(len(longitude), epsg, dtype=object)
+    else:
+        zones = identify_stateplanes(longitude, latitude)
+    for code in set(zones.tolist()) - {None}:
+        selected = zones == code
+        x[selected], y[selected] = stateplane_transformer(code).transform(
+            latitude[selected], longitude[selected], direction=TransformDirection.INVERSE
+        )
+    return x, y
+
+
+def to_lonlat(x, y, epsg: Union[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Converts arrays of stateplane coordinates of one zone to lon/lat.
+
+    Returns:
+        tuple: Arrays of longitudes and latitudes
+    """
+    latitude, longitude = stateplane_transformer(epsg).transform(
+        np.atleast_1d(np.asarray(x, dtype=float)), np.atleast_1d(np.asarray(y, dtype=float))
+    )
+    return np.asarray(longitude), np.asarray(latitude)
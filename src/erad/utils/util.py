@@ -1,6 +1,7 @@
 """ Utility functions that can be used in various parts of the code. """
 
 # standard libraries
+import functools
 import json
 from pathlib import Path
 import logging
@@ -13,6 +14,7 @@ import yaml
 import geojson
 
 # internal imports
+from erad.utils import instrumentation
 from erad.exceptions import (
     FeatureNotImplementedError,
     PathDoesNotExist,
@@ -24,18 +26,24 @@ logger = logging.getLogger(__name__)
 
 
 def timeit(func):
-    """Decorator for timing execution of a function."""
+    """Decorator for timing execution of a function.
 
+    Durations are recorded as a span named after the function in
+    `erad.utils.instrumentation.registry`. Arguments are never formatted.
+    """
+    span_name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         time_start = time.perf_counter()
-        logger.debug(f"Timing for {func} started")
-        ret_val = func(*args, **kwargs)
-        time_elapsed = time.perf_counter() - time_start
-        # memory_mb =resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0/1024.0
-        logger.debug(
-            f"Time took to execute the function {func} \
-            with args {args}, kwargs {kwargs} is {time_elapsed} seconds"
-        )
+        with instrumentation.span(span_name):
+            ret_val = func(*args, **kwargs)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Time took to execute the function %s is %s seconds",
+                span_name,
+                time.perf_counter() - time_start,
+            )
         return ret_val
 
     return wrapper
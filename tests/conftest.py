@@ -0,0 +1,26 @@
+""" Shared fixtures of the test suite. """
+
+from datetime import datetime, timedelta
+
+import pytest
+from shapely import LineString
+
+from erad.scenarios.wind_scenario import WindScenario, Hurricane, HurricaneStatus
+
+
+@pytest.fixture
+def synthetic_hurricane():
+    """Wind scenario of a ten point track moving north east over Sonoma county."""
+    track = [
+        HurricaneStatus(
+            timestamp=datetime(2020, 1, 1) + timedelta(hours=3 * i),
+            wind_speed_mph=100,
+            pressure_mb=960,
+            longitude=-123.3 + 0.1 * i,
+            latitude=38.2 + 0.05 * i,
+            landfall_mi=0,
+        )
+        for i in range(10)
+    ]
+    hurricane = Hurricane(sid="TEST", name="TEST", track=track)
+    return WindScenario(LineString([(s.longitude, s.latitude) for s in track]), None, hurricane)
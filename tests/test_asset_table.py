@@ -0,0 +1,88 @@
+""" Module for testing columnar asset table. """
+
+import datetime
+
+import numpy as np
+import shapely
+
+from erad.scenarios.common import AssetTable, AssetTypes, asset_list, synthetic_assets
+from erad.scenarios.earthquake_scenario import EarthquakeScenario
+
+
+def _assets():
+    return {
+        "distribution_poles": {
+            "pole_1": {"coordinates": (37.90, -121.70), "heights_ft": 30},
+            "pole_2": {"coordinates": (37.95, -121.75)},
+        },
+        "substation": {
+            "sub_1": {"coordinates": (37.92, -121.72), "heights_ft": 3, "elevation_ft": 12.0},
+        },
+    }
+
+
+def test_asset_table_round_trip():
+    table = AssetTable.from_dict(_assets())
+
+    assert len(table) == 3
+    assert table.type_names == ["distribution_poles", "substation"]
+    assert np.array_equal(table.longitude, [-121.70, -121.75, -121.72])
+    assert np.array_equal(table.latitude, [37.90, 37.95, 37.92])
+    assert table.row("substation", "sub_1") == 2
+
+    table.set_column("survival_probability", [0.5], np.array([2]))
+    assets = table.to_dict()
+    assert assets["substation"]["sub_1"]["coordinates"] == (37.92, -121.72)
+    assert assets["substation"]["sub_1"]["survival_probability"] == 0.5
+    assert assets["distribution_poles"]["pole_1"]["heights_ft"] == 30
+    assert "heights_ft" not in assets["distribution_poles"]["pole_2"]
+    assert "survival_probability" not in assets["distribution_poles"]["pole_1"]
+
+
+def test_scenario_accepts_asset_table():
+    scenario = EarthquakeScenario(
+        shapely.geometry.Point(-121.72, 37.92),
+        None,
+        datetime.datetime.now(),
+        Magnitude=6.5,
+        Depth=30.0,
+    )
+    from_dict = scenario.calculate_survival_probability(_assets(), None)
+    table = scenario.calculate_survival_probability(AssetTable.from_dict(_assets()), None)
+
+    assert isinstance(table, AssetTable)
+    for asset_type, index in table.groups():
+        for row in index:
+            assert (
+                from_dict[asset_type][table.names[row]]["survival_probability"]
+                == table.column("survival_probability")[row]
+            )
+
+
+def test_synthetic_assets():
+    polygon = shapely.Polygon(
+        [(-122.85, 38.45), (-122.75, 38.45), (-122.75, 38.55), (-122.85, 38.52)]
+    )
+    table = synthetic_assets(polygon, {"substation": 10, "distribution_poles": 2000}, seed=7, as_table=True)
+    assets = synthetic_assets(polygon, {"substation": 10, "distribution_poles": 2000}, seed=7)
+
+    assert len(table) == 2010
+    assert shapely.contains_xy(polygon, table.longitude, table.latitude).all()
+    assert np.array_equal(table.heights_ft[table.asset_types == "substation"], np.full(10, 3.0))
+    assert AssetTable.from_dict(assets).fingerprint == table.fingerprint
+    assert assets["substation"]["substation 9"]["coordinates"] == (
+        table.latitude[9],
+        table.longitude[9],
+    )
+
+
+def test_asset_list_grid():
+    assets, polygon = asset_list(38.46, -122.95, 38.53, -122.80, samples=200)
+    table, _ = asset_list(38.46, -122.95, 38.53, -122.80, samples=200, as_table=True)
+
+    assert list(assets) == [asset_type.name for asset_type in AssetTypes]
+    assert AssetTable.from_dict(assets).fingerprint == table.fingerprint
+    # Roughly one in ten cells holds a distribution pole
+    assert 3000 < len(assets["distribution_poles"]) < 5000
+    for asset in assets["distribution_poles"].values():
+        assert polygon.covers(shapely.Point(asset["coordinates"]))
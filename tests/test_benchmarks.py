@@ -0,0 +1,42 @@
+""" Module for testing the scenario benchmark suite. """
+
+from pathlib import Path
+import importlib.util
+import json
+
+BENCHMARKS = Path(__file__).parents[1] / "benchmarks" / "scenario_benchmarks.py"
+
+
+def _load_benchmarks():
+    spec = importlib.util.spec_from_file_location("scenario_benchmarks", BENCHMARKS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_scenario_benchmarks_run_offline(tmp_path):
+    benchmarks = _load_benchmarks()
+    output = tmp_path / "results.json"
+    benchmarks.main(["--sizes", "50", "100", "--output", str(output)])
+    results = json.loads(output.read_text())
+
+    assert {(r["scenario"], r["assets"]) for r in results["results"]} == {
+        (scenario, size) for scenario in benchmarks.SCENARIOS for size in [50, 100]
+    }
+    for result in results["results"]:
+        assert result["status"] == "ok"
+        assert result["throughput_assets_per_s"] > 0
+        assert result["peak_memory_mb"] > 0
+        assert set(result["stages"]) == {
+            "generate_assets",
+            "build_scenario",
+            "survival_probability",
+            "to_dict",
+        }
+
+    benchmarks.main(
+        ["--sizes", "50", "--scenarios", "fire", "--no-memory", "--time-limit", "0",
+         "--baseline", str(output), "--output", str(tmp_path / "compared.json")]
+    )
+    compared = json.loads((tmp_path / "compared.json").read_text())
+    assert [r["scenario"] for r in compared["comparison"]] == ["fire"]
@@ -0,0 +1,103 @@
+""" Module for testing stochastic earthquake event sets. """
+
+import datetime
+import math
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from erad.constants import HISTROIC_EARTHQUAKE_TABLE
+from erad.scenarios.catalog import EventCatalog
+from erad.scenarios.common import AssetTable, asset_list
+from erad.scenarios.earthquake_events import StochasticEarthquakeModel, loss_exceedance
+from erad.scenarios.earthquake_scenario import EarthquakeScenario
+
+BOUNDS = (-123.2, 38.2, -122.5, 38.8)
+
+
+def test_gutenberg_richter_magnitudes():
+    model = StochasticEarthquakeModel(BOUNDS, b_value=1.2, min_magnitude=4.0, max_magnitude=8.0)
+    events = model.sample(100_000, seed=3)
+
+    assert events["magnitude"].between(4.0, 8.0).all()
+    assert events["longitude"].between(BOUNDS[0], BOUNDS[2]).all()
+    # Aki estimate of the b value, the truncation at 8 has a negligible effect
+    b_value = math.log10(math.e) / (events["magnitude"].mean() - 4.0)
+    assert b_value == pytest.approx(1.2, rel=0.02)
+
+
+def test_model_calibrated_from_catalog(tmp_path):
+    rng = np.random.default_rng(0)
+    magnitudes = 4.0 - np.log10(rng.random(400)) / 0.9
+    earthquakes = pd.DataFrame(
+        {
+            "ID": [f"EQ{i}" for i in range(400)],
+            "Date": pd.date_range("1980-01-01", "2019-12-31", periods=400).strftime("%m/%d/%Y"),
+            "Time": "12:00:00",
+            "Magnitude": np.minimum(magnitudes, 7.9),
+            "Depth": rng.uniform(5, 15, 400),
+            "Longitude": rng.uniform(BOUNDS[0], BOUNDS[2], 400),
+            "Latitude": rng.uniform(BOUNDS[1], BOUNDS[3], 400),
+        }
+    )
+    source = tmp_path / "erad_data.sqlite"
+    with sqlite3.connect(source) as conn:
+        earthquakes.to_sql(HISTROIC_EARTHQUAKE_TABLE, conn, index=False)
+
+    model = StochasticEarthquakeModel.from_catalog(BOUNDS, EventCatalog(source, tmp_path / "catalog"))
+    assert model.b_value == pytest.approx(0.9, rel=0.15)
+    assert model.annual_rate == pytest.approx(10, rel=0.01)
+    events = model.sample(1000, seed=1)
+    assert events["depth"].between(5, 15).all()
+
+
+def test_loss_exceedance(tmp_path):
+    assets, _ = asset_list(38.40, -122.95, 38.60, -122.65, samples=30)
+    table = AssetTable.from_dict(assets)
+    customers = {name: 10.0 for name in table.names}
+    model = StochasticEarthquakeModel(BOUNDS, min_magnitude=5.0, annual_rate=0.5)
+
+    serial = loss_exceedance(model, assets, events=200, seed=7, customers=customers, batch_size=50)
+    parallel = loss_exceedance(
+        model, assets, events=200, seed=7, customers=customers, batch_size=50, workers=2
+    )
+    assert np.array_equal(serial.assets.weights, parallel.assets.weights)
+    assert serial.mean("assets") == pytest.approx(parallel.mean("assets"))
+
+    single = loss_exceedance(model, table, events=20, seed=7, customers=customers, batch_size=20)
+    events = model.sample(20, np.random.SeedSequence(7).spawn(1)[0])
+    failures = []
+    for event in events.itertuples():
+        scenario = EarthquakeScenario(
+            shapely.Point(event.longitude, event.latitude),
+            None,
+            datetime.datetime(2020, 1, 1),
+            Magnitude=event.magnitude,
+            Depth=event.depth,
+        )
+        survival = scenario.calculate_survival_probability(table.base_copy(), None).column("survival_probability")
+        failures.append(np.nansum(1 - survival))
+    assert single.mean("assets") == pytest.approx(0.5 * np.mean(failures), rel=1e-9)
+    assert single.mean("customers") == pytest.approx(10 * single.mean("assets"), rel=1e-9)
+    assert single.assets.maximum == pytest.approx(max(failures), rel=1e-9)
+
+    curve = serial.curve("assets")
+    assert curve["exceedance_rate"].iloc[0] == pytest.approx(0.5)
+    assert (np.diff(curve["exceedance_rate"]) <= 1e-12).all()
+    assert (curve["annual_probability"] <= curve["exceedance_rate"]).all()
+
+
+def test_from_dynamic_model():
+    origin = shapely.Point(-122.8, 38.5)
+    scenario = EarthquakeScenario.from_dynamic_model(
+        origin, None, datetime.datetime(2020, 1, 1), radius_km=20, seed=4, min_magnitude=5.0
+    )
+    assert scenario.origin.distance(origin) < 0.3
+    assert 5.0 <= scenario.kwargs["Magnitude"] <= 8.0
+    again = EarthquakeScenario.from_dynamic_model(
+        origin, None, datetime.datetime(2020, 1, 1), radius_km=20, seed=4, min_magnitude=5.0
+    )
+    assert again.kwargs == scenario.kwargs
@@ -1,10 +1,14 @@
 """ Module for testing earthquake resilience scenario. """
 
 import datetime
+import math
+
+import numpy as np
+import pytest
 import shapely
 
 from erad.scenarios.earthquake_scenario import EarthquakeScenario
-from erad.scenarios.common import asset_list
+from erad.scenarios.common import AssetTypes, asset_list, synthetic_assets
 from erad.db import neo4j_
 
 
@@ -51,6 +55,67 @@ def test_earthquake_sceanario_from_point():
     assert 'survival_probability' in survical_prob['distribution_overhead_lines']['asset_1']
     assert isinstance(survical_prob['distribution_overhead_lines']['asset_1']['survival_probability'], float)
 
+def test_vectorized_pga_matches_scalar_attenuation():
+    counts = {asset_type.name: 50 for asset_type in AssetTypes}
+    table = synthetic_assets(shapely.box(-125, 35, -118, 42), counts, seed=2, as_table=True)
+    scenario = EarthquakeScenario(
+        shapely.geometry.Point(-122.8, 38.5), None, datetime.datetime(2020, 1, 1), Magnitude=7.3, Depth=33.0
+    )
+    table = scenario.calculate_survival_probability(table, None)
+
+    imcs = scenario.intensity_map.intersection(shapely.LineString([[0, 7.3], [100, 7.3]])).xy[0][0]
+    distances = scenario.distances_from_centroid(table.longitude, table.latitude)
+    for asset_type, index in table.groups():
+        survival = table.column("survival_probability")[index]
+        if asset_type not in scenario.probability_model:
+            assert np.isnan(survival).all()
+            continue
+        pgas = []
+        for distance in distances[index].tolist():
+            intensity = max(imcs + 3 - 4.3 * math.log10((33.0**2 + distance**2) ** 0.5), 0)
+            pgas.append(10 ** ((intensity / 3) - 1) / 9.81)
+        expected = scenario.probability_model[asset_type].probabilities(pgas, complement=True)
+        assert np.allclose(survival, expected, rtol=1e-12, atol=1e-15)
+
+    with pytest.raises(ValueError):
+        EarthquakeScenario.mcs_intensity(9.5)
+
+
+def test_shake_map_is_reused_and_extended(tmp_path):
+    scenario = EarthquakeScenario(
+        shapely.geometry.Point(-122.8, 38.5), None, datetime.datetime(2020, 1, 1), Magnitude=6.5, Depth=20.0
+    )
+    table, _ = asset_list(38.40, -122.95, 38.60, -122.65, samples=30, as_table=True)
+    exact = scenario.calculate_survival_probability(table.base_copy(), None).column("survival_probability")
+
+    scenario.shake_map_resolution = 0.005
+    scenario.shake_map_directory = tmp_path
+    sampled = scenario.calculate_survival_probability(table.base_copy(), None).column("survival_probability")
+    assert np.allclose(sampled, exact, equal_nan=True, atol=0.01)
+    grid = scenario._shake_maps[0.005]
+    scenario.calculate_survival_probability(table.base_copy(), None)
+    assert scenario._shake_maps[0.005] is grid
+
+    # Assets outside of the grid extend it
+    far, _ = asset_list(38.70, -122.50, 38.80, -122.40, samples=5, as_table=True)
+    scenario.calculate_survival_probability(far, None)
+    extended = scenario._shake_maps[0.005]
+    assert extended.bounds[2] > grid.bounds[2] + 0.1 and extended.bounds[0] <= grid.bounds[0]
+    assert not np.isnan(far.column("survival_probability")[far.type_codes == far.type_names.index("distribution_poles")]).any()
+    assert len(list(tmp_path.glob("shake_map_*.npz"))) == 2
+
+    # A new scenario instance reads the stored grid
+    other = EarthquakeScenario(
+        shapely.geometry.Point(-122.8, 38.5), None, datetime.datetime(2020, 1, 1), Magnitude=6.5, Depth=20.0
+    )
+    other.shake_map_resolution = 0.005
+    other.shake_map_directory = tmp_path
+    assert np.array_equal(other.shake_map(extended.bounds).values, extended.values)
+    assert other.fingerprint() != EarthquakeScenario(
+        shapely.geometry.Point(-122.8, 38.5), None, datetime.datetime(2020, 1, 1), Magnitude=6.5, Depth=20.0
+    ).fingerprint()
+
+
 def test_earthquake_scenario():
     assets, _ = asset_list()
     earthquake_1 = EarthquakeScenario.from_historical_earthquake_by_code("USP000GYZK")
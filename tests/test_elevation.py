@@ -0,0 +1,163 @@
+""" Module for testing DEM elevation lookups. """
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import threading
+import zipfile
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from erad.utils.elevation import ElevationProvider, srtm_tile_name
+
+
+def _write_tile(path, crs, west, north, size, shape, values, nodata=None):
+    with rasterio.open(
+        path, "w", driver="GTiff", height=shape[0], width=shape[1], count=1,
+        dtype="float32", crs=crs, transform=from_origin(west, north, size, size), nodata=nodata,
+    ) as dataset:
+        dataset.write(values.astype(np.float32), 1)
+
+
+def _plane(longitude, latitude):
+    return 100 + 2000 * (longitude + 123) + 500 * (latitude - 38)
+
+
+def test_bilinear_lookup_matches_plane(tmp_path):
+    size = 0.01
+    columns, rows = 100, 80
+    west, north = -123.0, 38.8
+    longitude = west + size * (np.arange(columns) + 0.5)
+    latitude = north - size * (np.arange(rows) + 0.5)
+    values = _plane(*np.meshgrid(longitude, latitude))
+    values[0, 0] = -9999
+    _write_tile(tmp_path / "tile.tif", "epsg:4326", west, north, size, (rows, columns), values, nodata=-9999)
+
+    provider = ElevationProvider(tmp_path, cache_directory=tmp_path / "cache")
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(-122.98, -122.02, 1000)
+    lat = rng.uniform(38.02, 38.78, 1000)
+    # Bilinear interpolation is exact for a plane between pixel centers
+    assert np.allclose(provider.elevation(lon, lat), _plane(lon, lat), atol=1e-2)
+
+    elevation = provider.elevation([-122.999, -121.0, -122.5], [38.799, 38.5, 38.5])
+    assert np.isnan(elevation[0]) and np.isnan(elevation[1])
+    assert elevation[2] == pytest.approx(_plane(-122.5, 38.5), abs=1e-2)
+
+    # Tile bands are converted once and reused by new providers
+    assert len(list((tmp_path / "cache").glob("*.npy"))) == 1
+    again = ElevationProvider(tmp_path / "tile.tif", cache_directory=tmp_path / "cache")
+    assert np.array_equal(again.elevation(lon, lat), provider.elevation(lon, lat))
+
+
+def test_projected_tile_and_tile_order(tmp_path):
+    import pyproj
+
+    transformer = pyproj.Transformer.from_crs("epsg:4326", "epsg:32610", always_xy=True)
+    west, north = transformer.transform(-122.6, 38.6)
+    size = 30.0
+    shape = (400, 400)
+    x = west + size * (np.arange(shape[1]) + 0.5)
+    y = north - size * (np.arange(shape[0]) + 0.5)
+    X, Y = np.meshgrid(x, y)
+    _write_tile(tmp_path / "a_utm.tif", "epsg:32610", west, north, size, shape, 0.01 * (X - west) + 5)
+    _write_tile(tmp_path / "b_flat.tif", "epsg:4326", -123.0, 39.0, 0.1, (10, 10), np.full((10, 10), -1.0))
+
+    provider = ElevationProvider(tmp_path, cache_directory=tmp_path / "cache")
+    lon, lat = np.array([-122.5, -122.55, -122.9]), np.array([38.55, 38.5, 38.9])
+    px, _ = transformer.transform(lon[:2], lat[:2])
+    elevation = provider.elevation(lon, lat)
+    # The first tile wins where tiles overlap
+    assert np.allclose(elevation[:2], 0.01 * (px - west) + 5, atol=1e-3)
+    assert elevation[2] == -1.0
+
+
+def test_vertical_units(tmp_path):
+    _write_tile(tmp_path / "tile.tif", "epsg:4326", -123.0, 39.0, 0.1, (10, 10), np.full((10, 10), 100.0))
+    lon, lat = [-122.5], [38.5]
+
+    meters = ElevationProvider(tmp_path, cache_directory=tmp_path / "cache")
+    assert meters.elevation(lon, lat)[0] == pytest.approx(100.0)
+    assert meters.elevation_ft(lon, lat)[0] == pytest.approx(328.084)
+
+    # Bands without declared units are read in the units of the provider
+    feet = ElevationProvider(tmp_path, cache_directory=tmp_path / "cache", units="ft")
+    assert feet.elevation(lon, lat)[0] == pytest.approx(30.48)
+    assert feet.elevation_ft(lon, lat)[0] == pytest.approx(100.0, rel=1e-5)
+    with pytest.raises(ValueError):
+        ElevationProvider(tmp_path, cache_directory=tmp_path / "cache", units="furlong")
+
+    # Units declared by the band take precedence
+    with rasterio.open(tmp_path / "tile.tif", "r+") as dataset:
+        dataset.units = ["ft"]
+    declared = ElevationProvider(tmp_path, cache_directory=tmp_path / "cache")
+    assert declared.tiles[0].units == "ft"
+    assert declared.elevation(lon, lat)[0] == pytest.approx(30.48)
+
+    with rasterio.open(tmp_path / "tile.tif", "r+") as dataset:
+        dataset.units = ["furlong"]
+    with pytest.raises(ValueError):
+        ElevationProvider(tmp_path, cache_directory=tmp_path / "cache")
+
+
+@pytest.fixture
+def srtm_server():
+    """Serves one zipped SRTM3 tile, N38W123, whose values are row + 2 * column."""
+    rows, columns = np.meshgrid(np.arange(1201), np.arange(1201), indexing="ij")
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("N38W123.hgt", (rows + 2 * columns).astype(">i2").tobytes())
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            if self.path != "/N38W123.hgt.zip":
+                self.send_error(404)
+                return
+            body = archive.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requests, httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_srtm_download_outside_local_tiles(tmp_path, srtm_server):
+    url, requests, httpd = srtm_server
+    assert srtm_tile_name(38, -123) == "N38W123" and srtm_tile_name(-1, 5) == "S01E005"
+    provider = ElevationProvider(tmp_path / "missing", cache_directory=tmp_path / "cache", download_url=url)
+    assert provider.tiles == []
+
+    # Pixel (600, 600) is at 38.5 N, 122.5 W, the sea tile N38W124 does not exist
+    elevation = provider.elevation([-122.5, -123.5], [38.5, 38.5])
+    assert elevation[0] == pytest.approx(1800, abs=1e-3) and np.isnan(elevation[1])
+    assert sorted(requests) == ["/N38W123.hgt.zip", "/N38W124.hgt.zip"]
+    assert (tmp_path / "cache" / "srtm" / "N38W123.hgt").exists()
+
+    # Downloaded and unavailable tiles are not requested again, nor by new providers
+    assert provider.elevation_ft([-122.5, -123.5], [38.5, 38.5])[0] == pytest.approx(1800 * 3.28084)
+    httpd.shutdown()
+    httpd.server_close()
+    again = ElevationProvider(tmp_path / "missing", cache_directory=tmp_path / "cache", download_url=url, timeout=5)
+    assert again.elevation(-122.5, 38.5) == pytest.approx(1800, abs=1e-3)
+    assert len(requests) == 2
+
+    # Unreachable service
+    with pytest.raises(FileNotFoundError, match="ERAD_DEM_DIR"):
+        again.elevation(-121.5, 38.5)
+
+
+def test_missing_tiles(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ElevationProvider(tmp_path / "missing")
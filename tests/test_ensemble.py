@@ -0,0 +1,44 @@
+""" Module for testing Monte Carlo survival ensembles. """
+
+import networkx as nx
+import numpy as np
+
+from erad.metrics import ensemble
+
+
+def _graph():
+    graph = nx.Graph()
+    graph.add_edge("substation", "bus_1", name="line_1")
+    graph.add_edge("bus_1", "bus_2", name="line_2")
+    graph.add_edge("bus_2", "load_1", name="service_1")
+    graph.add_edge("bus_1", "load_2", name="service_2")
+    return graph.to_directed()
+
+
+def test_realizations_are_reproducible():
+    probability = np.array([0.0, 0.3, 0.7, 1.0])
+
+    serial = ensemble.draw_survival_realizations(probability, 200, seed=5)
+    parallel = ensemble.draw_survival_realizations(probability, 200, seed=5, workers=2)
+
+    assert serial.shape == (200, 4)
+    assert np.array_equal(serial, parallel)
+    assert not serial[:, 0].any() and serial[:, 3].all()
+    assert abs(serial[:, 1].mean() - 0.3) < 0.1
+
+
+def test_customer_connectivity():
+    assets = {
+        "distribution_overhead_lines": {
+            "line_1": {"coordinates": (0, 0), "survival_probability": 1.0},
+            "line_2": {"coordinates": (0, 0), "survival_probability": 0.0},
+            "service_1": {"coordinates": (0, 0), "survival_probability": 1.0},
+            "service_2": {"coordinates": (0, 0)},
+        }
+    }
+    members = ensemble.SurvivalEnsemble.from_assets(assets, 10, seed=1)
+    assert members.survive(0) == {"line_1": 1, "line_2": 0, "service_1": 1, "service_2": 1}
+
+    metric = ensemble.customer_connectivity(_graph(), members, ["substation"])
+    metric = dict(zip(metric["load_name"], metric["metric"]))
+    assert metric == {"load_1": 0.0, "load_2": 1.0}
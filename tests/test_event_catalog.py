@@ -0,0 +1,129 @@
+""" Module for testing the historic event catalog. """
+
+import sqlite3
+import time
+from datetime import datetime
+
+import pandas as pd
+import pytest
+import shapely
+
+from erad.constants import HISTROIC_EARTHQUAKE_TABLE, HISTROIC_FIRE_TABLE, HISTROIC_HURRICANE_TABLE
+from erad.scenarios.catalog import EventCatalog
+from erad.scenarios.earthquake_scenario import EarthquakeScenario
+from erad.scenarios.fire_scenario import FireScenario, FireSelection
+from erad.scenarios.wind_scenario import WindScenario
+
+
+@pytest.fixture
+def source(tmp_path):
+    """Small database laid out like `erad_data.sqlite`, including its quirks."""
+    path = tmp_path / "erad_data.sqlite"
+    hurricanes = pd.DataFrame(
+        {
+            "SID ": ["2000001N01001"] * 4 + ["2000002N02002"] * 2,
+            "NAME ": ["ALPHA"] * 4 + ["BRAVO"] * 2,
+            "ISO_TIME ": [f"2000-01-0{i} 06:00:00" for i in range(1, 5)] + ["2000-02-01 00:00:00", "2000-02-01 03:00:00"],
+            "LAT (degrees_north)": ["25.0", "25.5", "26.0", "26.5", "30.0", "30.1"],
+            "LON (degrees_east)": ["-80.0", "-80.5", "-81.0", "-81.5", "-90.0", "-90.1"],
+            "WMO_WIND (kts)": ["100", " ", "90", "80", "50", "55"],
+            "WMO_PRES (mb)": ["950", "955", "960", "970", "990", " "],
+            "LANDFALL (km)": ["10", "0", "0", "20", "100", "90"],
+        }
+    )
+    earthquakes = pd.DataFrame(
+        {
+            "ID": ["EQ1", "EQ2"],
+            "Date": ["01/17/1994", "10/18/1989"],
+            "Time": ["12:30:55", "00:04:15"],
+            "Magnitude": [6.7, 6.9],
+            "Depth": [18.2, 17.0],
+            "Longitude": [-118.537, -121.883],
+            "Latitude": [34.213, 37.036],
+        }
+    )
+    polygon = shapely.MultiPolygon([shapely.box(-120.0, 38.0, -119.9, 38.1)])
+    fires = pd.DataFrame(
+        {
+            "firename": ["Horse Pasture"],
+            "globalid": ["{A183D683-4BAA-494B-9A99-700915935D1A}"],
+            "discoverydatetime": ["2017-07-01 12:00:00"],
+            "GEOMETRY": [shapely.to_wkb(polygon)],
+        }
+    )
+    with sqlite3.connect(path) as conn:
+        hurricanes.to_sql(HISTROIC_HURRICANE_TABLE, conn, index=False)
+        earthquakes.to_sql(HISTROIC_EARTHQUAKE_TABLE, conn, index=False)
+        fires.to_sql(HISTROIC_FIRE_TABLE, conn, index=False)
+    return path
+
+
+def test_hurricane_track_is_typed_and_filtered(source, tmp_path):
+    catalog = EventCatalog(source, tmp_path / "catalog")
+    track = catalog.hurricane_track("2000001N01001")
+
+    assert list(track["wind_kts"]) == [100.0, 90.0, 80.0]
+    assert track["timestamp"].iloc[0] == pd.Timestamp("2000-01-01 06:00:00")
+    assert catalog.hurricane_track("2000001N01001") is track
+    with pytest.raises(ValueError):
+        catalog.hurricane_track("2000002N02002'; DROP TABLE hurricanes; --")
+
+    scenario = WindScenario.from_historical_hurricane_by_sid("2000001N01001", catalog=catalog)
+    assert scenario.hurricane.name == "ALPHA"
+    assert [s.landfall_mi for s in scenario.hurricane.track] == pytest.approx([6.21371, 0, 12.42742])
+    assert scenario.hurricane.track[1].timestamp == datetime(2000, 1, 3, 6)
+    assert scenario.hurricane.track[0].wind_speed_mph == pytest.approx(115.078)
+
+
+def test_earthquake_lookup(source, tmp_path):
+    catalog = EventCatalog(source, tmp_path / "catalog")
+    record = catalog.earthquake("EQ2")
+    assert record.timestamp == datetime(1989, 10, 18, 0, 4, 15)
+    assert record.magnitude == 6.9
+
+    scenario = EarthquakeScenario.from_historical_earthquake_by_code("EQ1", catalog=catalog)
+    assert scenario.timestamp == datetime(1994, 1, 17, 12, 30, 55)
+    assert scenario.kwargs == {"Magnitude": 6.7, "Depth": 18.2}
+    assert (scenario.origin.x, scenario.origin.y) == (-118.537, 34.213)
+    with pytest.raises(AssertionError):
+        catalog.earthquake("missing")
+
+
+def test_fire_lookup(source, tmp_path):
+    catalog = EventCatalog(source, tmp_path / "catalog")
+    fire_data = FireScenario.fetch_historical_fire_data("Horse Pasture", FireSelection.NAME, catalog)
+    same_fire = FireScenario.fetch_historical_fire_data(
+        "{A183D683-4BAA-494B-9A99-700915935D1A}", FireSelection.UUID, catalog
+    )
+    assert fire_data.equals(same_fire)
+    assert shapely.from_wkb(fire_data.GEOMETRY[0]).equals(
+        shapely.MultiPolygon([shapely.box(-120.0, 38.0, -119.9, 38.1)])
+    )
+    with pytest.raises(ValueError):
+        catalog.fires("firename", "Unknown")
+
+    # Lookups on the same thread do not wait for a chunk iterator in progress
+    chunks = catalog.fire_chunks(chunksize=1)
+    assert list(next(chunks)["firename"]) == ["Horse Pasture"]
+    assert catalog.earthquake("EQ1").magnitude == 6.7
+    assert catalog.hurricane_track("2000002N02002")["name"].iloc[0] == "BRAVO"
+    chunks.close()
+
+
+def test_catalog_is_built_once_and_rebuilt_when_stale(source, tmp_path):
+    catalog = EventCatalog(source, tmp_path / "catalog")
+    catalog.hurricane_track("2000001N01001")
+    built = catalog.path.stat().st_mtime_ns
+
+    other = EventCatalog(source, tmp_path / "catalog")
+    assert other.is_current()
+    start = time.perf_counter()
+    for _ in range(100):
+        other.earthquake("EQ1")
+    assert (time.perf_counter() - start) / 100 < 1e-3
+    assert other.path.stat().st_mtime_ns == built
+
+    with sqlite3.connect(source) as conn:
+        conn.execute(f"UPDATE {HISTROIC_EARTHQUAKE_TABLE} SET Magnitude = 7.0 WHERE ID = 'EQ1'")
+    assert not other.is_current()
+    assert EventCatalog(source, tmp_path / "catalog").earthquake("EQ1").magnitude == 7.0
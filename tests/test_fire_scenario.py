@@ -1,8 +1,13 @@
 from erad.scenarios.fire_scenario import FireScenario
-from erad.scenarios.common import asset_list
+from erad.scenarios.common import asset_list, AssetTable
+from erad.scenarios.utilities import geodesic_distance
 
 
 from uuid import UUID
+import datetime
+
+import numpy as np
+import shapely
 
 def test_fire_scenario_from_name():
     assets, _ = asset_list()
@@ -18,4 +23,133 @@ def test_fire_scenario_from_uuid():
 def test_fire_scenario_plot():
     assets, _ = asset_list()
     Fire1 = FireScenario.from_historical_fire_by_name("Horse Pasture")
-    Fire1.plot()
\ No newline at end of file
+    Fire1.plot()
+
+def test_fire_scenario_indexed_matches_legacy():
+    polygon = shapely.Polygon(
+        [(-122.85, 38.45), (-122.75, 38.45), (-122.75, 38.55), (-122.85, 38.52)]
+    )
+    rng = np.random.default_rng(0)
+    size = 500
+    table = AssetTable(
+        np.arange(size).astype(str),
+        ["distribution_poles"] * size,
+        -122.8 + rng.normal(0, 0.1, size),
+        38.5 + rng.normal(0, 0.1, size),
+    )
+    fire = FireScenario(shapely.MultiPolygon([polygon]), None, datetime.datetime.now())
+
+    fire.calculate_survival_probability(table, None, False, indexed=False)
+    legacy = table.column("distance_to_boundary").copy()
+    fire.calculate_survival_probability(table, None, False)
+    indexed = table.column("distance_to_boundary")
+
+    inside = shapely.contains_xy(polygon, table.longitude, table.latitude)
+    assert inside.any() and not inside.all()
+    assert np.all(indexed[inside] == 0) and np.all(legacy[inside] == 0)
+    # Legacy search uses lon/lat space and can only overestimate the distance
+    assert np.all(indexed <= legacy * (1 + 1e-3) + 0.005)
+    assert np.allclose(
+        indexed[~inside],
+        fire.distances_from_boundary(table.longitude, table.latitude, projected=True)[~inside],
+    )
+
+def test_fire_increment_time_matches_full_evaluation():
+    rng = np.random.default_rng(1)
+    size = 2000
+    table = AssetTable(
+        np.arange(size).astype(str),
+        ["distribution_poles"] * size,
+        -122.8 + rng.normal(0, 0.05, size),
+        38.5 + rng.normal(0, 0.05, size),
+    )
+    start = datetime.datetime(2020, 8, 1)
+    perimeters = [
+        (start + datetime.timedelta(hours=hour), shapely.box(-122.8 - 0.005 * hour, 38.5, -122.79, 38.51 + 0.005 * hour))
+        for hour in range(1, 5)
+    ]
+    fire = FireScenario(shapely.MultiPolygon([shapely.box(-122.8, 38.5, -122.79, 38.51)]), None, start)
+    steps = list(fire.increment_time(table, perimeters))
+
+    assert len(steps) == 5 and len(steps[0].names) == size
+    assert all(0 < len(step.names) < size for step in steps[1:])
+    assert steps[-1].timestamp == perimeters[-1][0]
+
+    # Survival is the lowest one over all perimeters evaluated from scratch
+    survival = np.ones(size)
+    for _, perimeter in [(start, shapely.box(-122.8, 38.5, -122.79, 38.51))] + perimeters:
+        reference = table.base_copy()
+        FireScenario(shapely.MultiPolygon([perimeter]), None, start).calculate_survival_probability(
+            reference, None, False
+        )
+        survival = np.minimum(survival, reference.column("survival_probability"))
+    assert np.allclose(table.column("survival_probability"), survival, atol=1e-6)
+    near = reference.column("distance_to_boundary") < 0.2
+    assert np.allclose(
+        table.column("distance_to_boundary")[near], reference.column("distance_to_boundary")[near]
+    )
+
+
+def test_fire_increment_time_spread_model():
+    table = AssetTable(["a", "b"], ["distribution_poles"] * 2, [-122.7949, -122.70], [38.505, 38.505])
+    fire = FireScenario(shapely.MultiPolygon([shapely.box(-122.8, 38.5, -122.796, 38.51)]), None, None)
+    area = fire.area
+    steps = list(fire.increment_time(table, time_step=datetime.timedelta(minutes=30), steps=2, spread_rate_m_per_h=100))
+
+    assert steps[0].survival_probability[0] > 0
+    assert fire.area > area
+    # Asset about 95 m east of the starting front is reached after one hour at 100 m/h
+    assert table.column("survival_probability")[0] == 0
+    assert table.column("survival_probability")[1] > 0.99
+
+
+def test_fire_increment_time_updates_dict_assets_at_every_step():
+    assets = {
+        "distribution_poles": {
+            "a": {"coordinates": (38.505, -122.7949)},
+            "b": {"coordinates": (38.505, -122.70)},
+        }
+    }
+    fire = FireScenario(shapely.MultiPolygon([shapely.box(-122.8, 38.5, -122.796, 38.51)]), None, None)
+    steps = fire.increment_time(assets, time_step=datetime.timedelta(minutes=30), steps=2, spread_rate_m_per_h=100)
+
+    first = next(steps)
+    assert assets["distribution_poles"]["a"]["survival_probability"] == first.survival_probability[0] > 0
+    assert "distance_to_boundary" in assets["distribution_poles"]["b"]
+    # The consumer stops early, the updates of the steps it received are kept
+    next(steps)
+    next(steps)
+    steps.close()
+    assert assets["distribution_poles"]["a"]["survival_probability"] == 0
+
+
+def test_fire_scenario_indexed_matches_legacy_outside_conus():
+    # Perimeter in Tokyo, projected with an azimuthal equidistant CRS
+    polygon = shapely.Polygon([(139.70, 35.65), (139.75, 35.65), (139.75, 35.70), (139.70, 35.68)])
+    rng = np.random.default_rng(0)
+    size = 300
+    table = AssetTable(
+        np.arange(size).astype(str),
+        ["distribution_poles"] * size,
+        139.72 + rng.normal(0, 0.1, size),
+        35.67 + rng.normal(0, 0.1, size),
+    )
+    fire = FireScenario(shapely.MultiPolygon([polygon]), None, datetime.datetime.now())
+
+    fire.calculate_survival_probability(table, None, False, indexed=False)
+    legacy = table.column("distance_to_boundary").copy()
+    legacy_survival = table.column("survival_probability").copy()
+    fire.calculate_survival_probability(table, None, False)
+    indexed = table.column("distance_to_boundary")
+
+    boundary = shapely.get_coordinates(shapely.segmentize(polygon.boundary, 0.0001))
+    reference = np.array([
+        geodesic_distance(boundary[:, 0], boundary[:, 1], x, y).min()
+        for x, y in zip(table.longitude, table.latitude)
+    ])
+    inside = shapely.contains_xy(polygon, table.longitude, table.latitude)
+    assert inside.any() and not inside.all()
+    assert np.all(indexed[inside] == 0)
+    assert np.all(np.abs(indexed[~inside] - reference[~inside]) <= 1e-3 * reference[~inside] + 0.005)
+    assert np.all(indexed <= legacy * (1 + 1e-3) + 0.005)
+    assert np.allclose(table.column("survival_probability"), legacy_survival, atol=0.01)
@@ -0,0 +1,78 @@
+""" Module for testing the historic fire perimeter store. """
+
+import datetime
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import shapely
+
+from erad.constants import HISTROIC_FIRE_TABLE
+from erad.scenarios.catalog import EventCatalog
+from erad.scenarios.fire_scenario import FireScenario
+from erad.scenarios.fire_store import FirePerimeterStore
+from erad.scenarios.utilities import geodesic_distance
+
+REGION = (-122.95, 38.40, -122.65, 38.60)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    # Fire 0 overlaps the region, fire 1 is about 8.7 km east of it, fire 2 is far away
+    perimeters = [
+        shapely.MultiPolygon([shapely.box(-122.70, 38.50, -122.60, 38.55)]),
+        shapely.MultiPolygon([shapely.box(-122.55, 38.45, -122.50, 38.50)]),
+        shapely.MultiPolygon([shapely.box(-120.00, 36.00, -119.90, 36.10)]),
+    ]
+    fires = pd.DataFrame(
+        {
+            "firename": ["Near", "East", "Far"],
+            "globalid": ["{A}", "{B}", "{C}"],
+            "discoverydatetime": ["2017-07-01 12:00:00", "2018-08-01 00:00:00", None],
+            "acres": [100.0, 20.0, 5.0],
+            "GEOMETRY": [shapely.to_wkb(p) for p in perimeters],
+        }
+    )
+    source = tmp_path / "erad_data.sqlite"
+    with sqlite3.connect(source) as conn:
+        fires.to_sql(HISTROIC_FIRE_TABLE, conn, index=False)
+    return EventCatalog(source, tmp_path / "catalog")
+
+
+def test_store_queries(catalog, tmp_path):
+    store = FirePerimeterStore.from_catalog(catalog, tmp_path / "fires.parquet")
+    assert len(store) == 3
+    metadata = pq.read_schema(store.path).metadata
+    assert b"geo" in metadata
+    assert np.allclose(store.bounds[1], (-122.55, 38.45, -122.50, 38.50))
+
+    intersecting = store.query(REGION)
+    assert list(intersecting["firename"]) == ["Near"]
+    assert list(intersecting.index) == [0]
+
+    near = store.query(REGION, distance_km=10)
+    assert list(near["firename"]) == ["Near", "East"]
+    expected = geodesic_distance(-122.65, 38.475, -122.55, 38.475)
+    assert near.loc[1, "distance_km"] == pytest.approx(expected, rel=0.01)
+    assert list(store.query(REGION, distance_km=5)["firename"]) == ["Near"]
+
+    scenarios = store.scenarios(near)
+    assert all(isinstance(s, FireScenario) for s in scenarios)
+    assert scenarios[1].multipolygon.equals(shapely.MultiPolygon([shapely.box(-122.55, 38.45, -122.50, 38.50)]))
+    assert scenarios[0].timestamp == datetime.datetime(2017, 7, 1, 12)
+    assert store.scenario(2).timestamp is None
+
+
+def test_store_is_rebuilt_when_catalog_changes(catalog, tmp_path):
+    path = tmp_path / "fires.parquet"
+    FirePerimeterStore.from_catalog(catalog, path)
+    built = path.stat().st_mtime_ns
+    FirePerimeterStore.from_catalog(catalog, path)
+    assert path.stat().st_mtime_ns == built
+
+    with sqlite3.connect(catalog.source) as conn:
+        conn.execute(f"DELETE FROM {HISTROIC_FIRE_TABLE} WHERE firename = 'Far'")
+    catalog.close()
+    assert len(FirePerimeterStore.from_catalog(catalog, path)) == 2
@@ -0,0 +1,99 @@
+""" Module for testing flood water surface fitting. """
+
+from datetime import datetime
+import itertools
+
+from shapely import MultiPolygon, Point, Polygon
+import numpy as np
+import pandas as pd
+import pytest
+import stateplane
+
+from erad.scenarios import flood_scenario
+from erad.scenarios.common import AssetTable
+from erad.scenarios.flood_scenario import FloodScenario
+
+BOUNDS = (-122.95, 38.40, -122.65, 38.60)
+
+
+class PlaneElevation:
+    def elevation_ft(self, longitude, latitude):
+        return 20 + 30 * (np.asarray(longitude) + 122.8) - 10 * (np.asarray(latitude) - 38.5)
+
+
+@pytest.fixture
+def flood(tmp_path, monkeypatch):
+    monkeypatch.setattr(flood_scenario, "default_elevation_provider", PlaneElevation)
+    rng = np.random.default_rng(3)
+    lon_min, lat_min, lon_max, lat_max = BOUNDS
+    gauges = pd.DataFrame(
+        {
+            "GaugeLID": [f"GAUGE{i}" for i in range(20)],
+            "Longitude": rng.uniform(lon_min, lon_max, 20),
+            "Latitude": rng.uniform(lat_min, lat_max, 20),
+        }
+    )
+    gauges["elevation"] = PlaneElevation().elevation_ft(gauges.Longitude, gauges.Latitude)
+    gauges["geometry"] = [Point(lat, lon).wkt for lon, lat in zip(gauges.Longitude, gauges.Latitude)]
+    index = pd.date_range(datetime(2020, 1, 1), periods=24, freq="15min")
+    levels = pd.DataFrame(rng.uniform(0, 3, (len(index), len(gauges))), index=index, columns=gauges.GaugeLID)
+    levels.iloc[5, 2] = np.nan
+
+    files = {name: tmp_path / f"{name}.csv" for name in ["file_gaugues", "file_levels", "file_flow"]}
+    gauges.to_csv(files["file_gaugues"], index=False)
+    levels.to_csv(files["file_levels"])
+    levels.to_csv(files["file_flow"])
+    polygon = Polygon([(lat_min, lon_min), (lat_min, lon_max), (lat_max, lon_max), (lat_max, lon_min)])
+    return FloodScenario(MultiPolygon([polygon]), None, index[0], **files)
+
+
+def _scalar_water_levels(flood, timestamp, longitude, latitude):
+    """Per-gauge and per-asset fit of one timestep as originally written."""
+    x, y, z = [], [], []
+    for _, row in flood.gauges.iterrows():
+        level = flood.levels[row["GaugeLID"]][timestamp]
+        if np.isnan(level):
+            continue
+        x_i, y_i = stateplane.from_lonlat(row["Longitude"], row["Latitude"])
+        x.append(x_i)
+        y.append(y_i)
+        z.append(row["elevation"] + level)
+    x, y = np.array(x), np.array(y)
+    G = np.zeros((len(x), 16))
+    for k, (i, j) in enumerate(itertools.product(range(4), range(4))):
+        G[:, k] = x**i * y**j
+    m = np.linalg.lstsq(G, np.array(z), rcond=-1)[0]
+    result = []
+    for lon, lat in zip(longitude, latitude):
+        x_i, y_i = stateplane.from_lonlat(lon, lat)
+        result.append(sum(a * x_i**i * y_i**j for a, (i, j) in zip(m, itertools.product(range(4), range(4)))))
+    return np.array(result)
+
+
+def test_time_series_matches_single_timesteps(flood):
+    rng = np.random.default_rng(1)
+    size = 60
+    table = AssetTable(
+        np.arange(size).astype(str),
+        np.where(np.arange(size) % 2, "substation", "distribution_poles"),
+        rng.uniform(BOUNDS[0], BOUNDS[2], size),
+        rng.uniform(BOUNDS[1], BOUNDS[3], size),
+    )
+    series = flood.calculate_time_series(table)
+
+    assert series.survival_probability.shape == (size, len(flood.valid_timepoints))
+    assert "survival_probability" not in table.columns
+    for column, timestamp in [(0, series.timestamps[0]), (5, series.timestamps[5]), (17, series.timestamps[17])]:
+        expected = _scalar_water_levels(flood, timestamp, table.longitude, table.latitude)
+        # The design matrix is badly conditioned, fits agree to well below a millimeter
+        assert np.allclose(series.water_level_ft[:, column], expected, rtol=0, atol=1e-3)
+
+        single = table.base_copy()
+        flood.calculate_survival_probability(single, timestamp)
+        assert np.allclose(single.column("asset_water_level_ft"), series.water_level_ft[:, column], rtol=0, atol=1e-3)
+        assert np.allclose(single.column("submerge_depth_ft"), series.submerge_depth_ft[:, column], rtol=0, atol=1e-3)
+        assert np.allclose(single.column("survival_probability"), series.survival_probability[:, column], rtol=0, atol=1e-3)
+
+    worst = series.min_survival_probability()
+    assert np.array_equal(worst.min_survival_probability, series.survival_probability.min(axis=1))
+    assert series.matrix("submerge_depth_ft").shape == (len(flood.valid_timepoints), size)
@@ -1,5 +1,11 @@
-from erad.scenarios.wind_scenario import WindScenario
-from erad.scenarios.common import asset_list
+from datetime import datetime, timedelta
+
+import geopy.distance
+import numpy as np
+from shapely import LineString
+
+from erad.scenarios.wind_scenario import WindScenario, Hurricane, HurricaneStatus
+from erad.scenarios.common import asset_list, AssetTable
 from pprint import pprint as print
 
 def test_hurricane_scenario():
@@ -7,3 +13,104 @@ def test_hurricane_scenario():
     hurricane_1 = WindScenario.from_historical_hurricane_by_sid("1980001S13173")
     assets = hurricane_1.calculate_survival_probability(assets)
     print(assets)
+
+
+def test_hurricane_scenario_blocks_match_track_loop(synthetic_hurricane):
+    scenario = synthetic_hurricane
+    assets, _ = asset_list(38.46, -122.95, 38.53, -122.80, samples=40)
+    table = AssetTable.from_dict(assets)
+
+    blocked = scenario.calculate_survival_probability(table.base_copy(), block_size=70)
+    full = scenario.calculate_survival_probability(table.base_copy(), store_distances=True)
+    assert "distance_to_eye" not in blocked.columns
+    assert np.array_equal(blocked.column("survival_probability"), full.column("survival_probability"))
+    assert np.array_equal(blocked.column("min_distance_to_eye"), full.column("min_distance_to_eye"))
+
+    track = scenario.hurricane.track
+    for asset_type, index in table.groups():
+        probability_function = scenario.probability_model[asset_type]
+        for row in index[:20]:
+            distances = [
+                geopy.distance.geodesic((table.latitude[row], table.longitude[row]), (s.latitude, s.longitude)).km
+                for s in track
+            ]
+            assert np.allclose(full.column("distance_to_eye")[row], distances, rtol=0, atol=1e-9)
+            assert np.isclose(
+                full.column("survival_probability")[row],
+                np.prod([probability_function.probability(d) for d in distances]),
+                rtol=1e-9,
+                atol=1e-300,
+            )
+
+
+def test_hurricane_increment_time(synthetic_hurricane):
+    scenario = synthetic_hurricane
+    assets, _ = asset_list(38.46, -122.95, 38.53, -122.80, samples=40)
+    table = AssetTable.from_dict(assets)
+    expected = scenario.calculate_survival_probability(table.base_copy())
+
+    # Steps at the native track spacing reproduce the full track evaluation
+    stepped = table.base_copy()
+    steps = list(scenario.increment_time(stepped, timedelta(hours=3), influence_radius_km=1e4))
+    assert len(steps) == len(scenario.hurricane.track)
+    assert np.allclose(
+        stepped.column("survival_probability"), expected.column("survival_probability"), rtol=1e-12, atol=0
+    )
+
+    # Only assets within the influence radius of the eye are updated
+    updated = set()
+    for step in scenario.increment_time(assets, timedelta(minutes=20), influence_radius_km=5):
+        assert step.status.timestamp >= scenario.hurricane.track[0].timestamp
+        assert np.all(step.survival_probability <= 1)
+        updated.update(step.names)
+    assert 0 < len(updated) < len(table)
+    for asset_dict in assets.values():
+        for name, asset in asset_dict.items():
+            assert (asset["survival_probability"] < 1) == (name in updated)
+
+
+def test_hurricane_track_crossing_antimeridian():
+    track = [
+        HurricaneStatus(
+            timestamp=datetime(2020, 1, 1) + timedelta(hours=6 * i),
+            wind_speed_mph=100,
+            pressure_mb=960,
+            longitude=longitude,
+            latitude=20.0,
+            landfall_mi=0,
+        )
+        for i, longitude in enumerate([178.0, 179.5, -179.0, -177.5])
+    ]
+    hurricane = Hurricane(sid="TEST", name="TEST", track=track)
+    scenario = WindScenario(LineString([(s.longitude, s.latitude) for s in track]), None, hurricane)
+
+    # The eye moves the short way across the dateline
+    longitudes = np.array([s.longitude for s in scenario.interpolate_track(timedelta(hours=1))])
+    assert np.all((longitudes >= -180) & (longitudes < 180))
+    steps = (np.diff(longitudes) + 180) % 360 - 180
+    assert np.allclose(steps, 0.25)
+
+    # Assets on both sides of the dateline are within reach of the eye
+    assets = {
+        "distribution_poles": {
+            "west": {"coordinates": (20.0, 179.9)},
+            "east": {"coordinates": (20.0, -179.9)},
+            "far": {"coordinates": (20.0, 0.0)},
+        }
+    }
+    updated = set()
+    for step in scenario.increment_time(assets, timedelta(hours=1), influence_radius_km=50):
+        updated.update(step.names)
+    assert updated == {"west", "east"}
+
+
+def test_hurricane_increment_time_updates_dict_assets_at_every_step(synthetic_hurricane):
+    assets, _ = asset_list(38.46, -122.95, 38.53, -122.80, samples=40)
+    for step in synthetic_hurricane.increment_time(assets, timedelta(hours=3), influence_radius_km=1e4):
+        break
+    survival = {
+        name: asset["survival_probability"] for asset_dict in assets.values() for name, asset in asset_dict.items()
+    }
+    assert len(step.names) == len(survival)
+    assert all(survival[name] == probability for name, probability in zip(step.names, step.survival_probability))
+    assert min(survival.values()) < 1
@@ -0,0 +1,73 @@
+""" Module for testing hurricane catalog sweeps. """
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from erad.constants import HISTROIC_HURRICANE_TABLE
+from erad.scenarios.catalog import EventCatalog
+from erad.scenarios.common import AssetTable, asset_list
+from erad.scenarios.hurricane_sweep import sweep_hurricanes
+from erad.scenarios.wind_scenario import WindScenario
+
+
+def _catalog(tmp_path):
+    """Catalog with two storms crossing the assets, one passing 150 km away and one far away."""
+    rows = []
+    storms = {
+        "NEAR1": (-123.3, 38.3, 0.1, 0.04, 100),
+        "NEAR2": (-122.5, 38.9, -0.05, -0.08, 80),
+        "OFFSHORE": (-124.6, 38.0, 0.0, 0.1, 120),
+        "FAR": (-80.0, 25.0, -0.2, 0.1, 120),
+    }
+    for sid, (lon, lat, dlon, dlat, wind) in storms.items():
+        for i in range(8):
+            rows.append(
+                {
+                    "SID ": sid,
+                    "NAME ": sid.lower(),
+                    "ISO_TIME ": f"2000-01-01 {3 * i:02d}:00:00",
+                    "LAT (degrees_north)": str(lat + dlat * i),
+                    "LON (degrees_east)": str(lon + dlon * i),
+                    "WMO_WIND (kts)": str(wind),
+                    "WMO_PRES (mb)": "960",
+                    "LANDFALL (km)": "0",
+                }
+            )
+    source = tmp_path / "erad_data.sqlite"
+    with sqlite3.connect(source) as conn:
+        pd.DataFrame(rows).to_sql(HISTROIC_HURRICANE_TABLE, conn, index=False)
+    return EventCatalog(source, tmp_path / "catalog")
+
+
+def test_sweep_matches_individual_scenarios(tmp_path):
+    catalog = _catalog(tmp_path)
+    assets, _ = asset_list(38.46, -122.95, 38.53, -122.80, samples=20)
+
+    assert catalog.hurricanes_near((-122.95, 38.46, -122.80, 38.53), 100) == ["NEAR1", "NEAR2"]
+    sweep = sweep_hurricanes(assets, distance_km=200, catalog=catalog)
+    assert sweep.sids == ["NEAR1", "NEAR2", "OFFSHORE"]
+    assert sweep.survival_probability.shape == (3, len(AssetTable.from_dict(assets)))
+
+    for row, sid in enumerate(sweep.sids):
+        expected = WindScenario.from_historical_hurricane_by_sid(sid, catalog=catalog)
+        expected = expected.calculate_survival_probability(AssetTable.from_dict(assets))
+        assert np.allclose(sweep.survival_probability[row], expected.column("survival_probability"))
+        assert np.allclose(sweep.min_distance_km[row], expected.column("min_distance_to_eye"))
+
+    parallel = sweep_hurricanes(assets, distance_km=200, catalog=catalog, workers=2, chunksize=1)
+    assert np.array_equal(parallel.survival_probability, sweep.survival_probability)
+
+    summary = sweep.storm_summary()
+    assert list(summary["expected_failures"]) == sorted(summary["expected_failures"], reverse=True)
+    assert summary.set_index("sid").loc["OFFSHORE", "min_distance_km"] > 100
+    assets_summary = sweep.asset_summary()
+    assert len(assets_summary) == sweep.survival_probability.shape[1]
+    assert np.allclose(assets_summary["min_survival_probability"], sweep.survival_probability.min(axis=0))
+    assert sweep.matrix().loc["NEAR2"].equals(
+        pd.Series(sweep.survival_probability[1], index=sweep.names).rename_axis("asset").rename("NEAR2")
+    )
+
+    restricted = sweep_hurricanes(assets, distance_km=200, catalog=catalog, sids=["NEAR2", "FAR"])
+    assert restricted.sids == ["NEAR2"]
@@ -0,0 +1,57 @@
+""" Module for testing import time of scenario modules. """
+
+import json
+import subprocess
+import sys
+
+# Seconds allowed for importing all scenario modules in a fresh interpreter,
+# numpy, pandas and shapely account for most of it
+IMPORT_TIME_BUDGET = 2.0
+
+SCENARIO_MODULES = [
+    "erad.scenarios.earthquake_scenario",
+    "erad.scenarios.fire_scenario",
+    "erad.scenarios.flood_scenario",
+    "erad.scenarios.wind_scenario",
+]
+
+# Plotting, network and elevation dependencies that must load on first use
+LAZY_MODULES = [
+    "matplotlib",
+    "pyhigh",
+    "rasterio",
+    "requests",
+    "scipy",
+    "geopandas",
+    "stateplane",
+    "fiona",
+]
+
+SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+for module in {SCENARIO_MODULES!r}:
+    __import__(module)
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "elapsed": elapsed,
+    "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def _measure_import():
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_scenario_modules_import_lazily():
+    assert _measure_import()["loaded"] == []
+
+
+def test_scenario_import_time_budget():
+    # Best of a few runs so that a cold file system cache does not fail the test
+    elapsed = min(_measure_import()["elapsed"] for _ in range(3))
+    assert elapsed < IMPORT_TIME_BUDGET, f"Importing scenarios took {elapsed:.2f} s"
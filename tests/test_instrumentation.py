@@ -0,0 +1,66 @@
+""" Module for testing instrumentation registry. """
+
+import datetime
+import json
+
+import shapely
+
+from erad.scenarios.common import asset_list
+from erad.scenarios.earthquake_scenario import EarthquakeScenario
+from erad.utils.instrumentation import InstrumentationRegistry, registry
+from erad.utils.util import timeit
+
+
+class Unprintable:
+    def __repr__(self):
+        raise AssertionError("Arguments should not be formatted")
+
+
+def test_registry_profile(tmp_path):
+    instruments = InstrumentationRegistry()
+    for _ in range(10):
+        with instruments.span("block"):
+            instruments.count("rows_written", 3)
+    instruments.observe("batch_size", 0)
+    instruments.observe("batch_size", 100)
+
+    instruments.dump(tmp_path / "profile.json")
+    profile = json.loads((tmp_path / "profile.json").read_text())
+    assert profile["spans"]["block"]["count"] == 10
+    assert sum(profile["spans"]["block"]["buckets"].values()) == 10
+    assert profile["counters"] == {"rows_written": 30}
+    assert profile["histograms"]["batch_size"]["max"] == 100
+    assert profile["histograms"]["batch_size"]["p50"] == 0
+
+    instruments.enabled = False
+    with instruments.span("disabled"):
+        instruments.count("disabled")
+    assert "disabled" not in instruments.profile()["spans"]
+    instruments.reset()
+    assert instruments.profile()["counters"] == {}
+
+
+def test_timeit_records_span_without_formatting_arguments():
+    @timeit
+    def add(a, b):
+        return 1
+
+    registry.reset()
+    assert add(Unprintable(), b=Unprintable()) == 1
+    spans = registry.profile()["spans"]
+    assert spans[f"{__name__}.{add.__qualname__}"]["count"] == 1
+
+
+def test_scenario_instrumentation():
+    registry.reset()
+    assets, _ = asset_list(38.46, -122.95, 38.53, -122.80, samples=50)
+    scenario = EarthquakeScenario(
+        shapely.Point(-122.8, 38.5), None, datetime.datetime.now(), Magnitude=6.5, Depth=20.0
+    )
+    scenario.calculate_survival_probability(assets, None)
+
+    profile = registry.profile()
+    assert profile["counters"]["scenarios.assets_processed"] == sum(
+        len(asset_dict) for asset_dict in assets.values()
+    )
+    assert profile["spans"]["scenarios.EarthquakeScenario.calculate_survival_probability"]["count"] == 1
@@ -0,0 +1,231 @@
+""" Module for testing concurrent NOAA gauge fetching against a local server. """
+
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+
+from shapely import MultiPolygon, Point, Polygon
+import numpy as np
+import pandas as pd
+import pytest
+import requests as http
+
+from erad.scenarios.flood_scenario import FloodScenario
+from erad.utils.noaa_utils import (
+    GaugeClient,
+    NationalShapefileCache,
+    _extract,
+    forecast_tag,
+    read_gauges,
+    stageflow_frames,
+)
+
+
+def _stageflow(gauge_id):
+    offset = int(gauge_id[-1]) % 3
+    times = pd.date_range("2024-01-01", periods=6, freq="15min", tz="UTC").strftime("%Y-%m-%dT%H:%M:%SZ")
+    return {
+        "observed": {"data": [
+            {"validTime": t, "primary": offset + i, "secondary": 10 * (offset + i)} for i, t in enumerate(times[:4])
+        ]},
+        # The forecast starts at the last observation
+        "forecast": {"data": [
+            {"validTime": t, "primary": -1, "secondary": -1} for t in times[3 + offset % 2:]
+        ]},
+    }
+
+
+@pytest.fixture
+def server():
+    requests = []
+    # Archives served by path as (body, Last-Modified header)
+    files = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_file(self, send_body):
+            body, modified = files[self.path]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Last-Modified", modified)
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def do_HEAD(self):
+            requests.append(("HEAD", self.path))
+            self._send_file(False)
+
+        def do_GET(self):
+            if self.path in files:
+                requests.append(("GET", self.path))
+                self._send_file(True)
+                return
+            requests.append(self.path)
+            parts = self.path.strip("/").split("/")
+            if len(parts) != 3 or parts[2] != "stageflow" or parts[1] == "MISSING":
+                self.send_error(404)
+                return
+            if parts[1] == "BROKEN":
+                self.send_error(503)
+                return
+            body = json.dumps(_stageflow(parts[1])).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.files = files
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requests, httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_and_replay(server, tmp_path):
+    base_url, requests, httpd = server
+    gauges = [f"GAUGE{i}" for i in range(6)]
+    client = GaugeClient(base_url, workers=4, cache_directory=tmp_path)
+    flows, levels = stageflow_frames(client.fetch(gauges + ["GAUGE0"]))
+    client.close()
+
+    assert sorted(requests) == sorted(f"/gauges/{gauge}/stageflow" for gauge in gauges)
+    assert list(levels.columns) == gauges and list(flows.columns) == gauges
+    assert len(levels) == 6 and levels.index.is_monotonic_increasing
+    # Observations win over forecasts at the same time
+    assert levels["GAUGE1"].iloc[3] == 4 and levels["GAUGE1"].iloc[4] == -1
+    assert flows["GAUGE2"].iloc[0] == 20
+    # Gauges with identical responses share one stored body
+    assert len(list((tmp_path / "objects").iterdir())) == 3
+    assert len(list((tmp_path / "requests").iterdir())) == 6
+    assert levels.attrs["replayed"] == {}
+
+    httpd.shutdown()
+    offline = GaugeClient(base_url, workers=4, cache_directory=tmp_path, offline=True)
+    replayed_flows, replayed_levels = stageflow_frames(offline.fetch(gauges))
+    pd.testing.assert_frame_equal(replayed_levels, levels)
+    pd.testing.assert_frame_equal(replayed_flows, flows)
+    assert sorted(replayed_levels.attrs["replayed"]) == gauges
+
+    # Unreachable service falls back to recent cached responses only
+    unreachable = GaugeClient(base_url, cache_directory=tmp_path, timeout=1)
+    responses = unreachable.fetch(["GAUGE3"])
+    assert responses["GAUGE3"] == _stageflow("GAUGE3") and list(responses.replayed) == ["GAUGE3"]
+    stale = time.time() - 2 * 3600
+    request_file = offline.cache._request_file(offline.stageflow_url("GAUGE3"))
+    os.utime(request_file, (stale, stale))
+    with pytest.raises(LookupError):
+        unreachable.fetch(["GAUGE3"])
+    assert GaugeClient(base_url, cache_directory=tmp_path, timeout=1, max_replay_age=None).fetch(["GAUGE3"])
+    assert offline.fetch(["GAUGE3"])["GAUGE3"] == _stageflow("GAUGE3")
+    with pytest.raises(LookupError):
+        offline.fetch(["GAUGE9"])
+
+
+def test_http_errors_are_not_replayed(server, tmp_path):
+    base_url, _, _ = server
+    client = GaugeClient(base_url, cache_directory=tmp_path)
+    client.cache.put(client.stageflow_url("BROKEN"), json.dumps(_stageflow("GAUGE1")).encode())
+    with pytest.raises(http.HTTPError):
+        client.fetch(["BROKEN"])
+
+
+def test_flood_gauges_in_polygon(server, tmp_path):
+    base_url, requests, _ = server
+    flood = FloodScenario.__new__(FloodScenario)
+    flood.gauges = pd.DataFrame({"GaugeLID": ["GAUGE1", "GAUGE2"]})
+    flood.kwargs = {"gauge_client": GaugeClient(base_url, cache_directory=tmp_path)}
+    flows, levels = flood.gauges_in_polygon()
+    assert list(levels.columns) == ["GAUGE1", "GAUGE2"] and len(requests) == 2
+    with pytest.raises(http.HTTPError):
+        GaugeClient(base_url, cache_directory=tmp_path).fetch(["MISSING"])
+
+
+def _national_shapefile(folder, tag, size=200, seed=0):
+    """Writes a national shapefile archive with the layout of the NOAA downloads."""
+    import geopandas as gpd
+
+    rng = np.random.default_rng(seed)
+    longitude = rng.uniform(-124, -120, size)
+    latitude = rng.uniform(37, 40, size)
+    gauges = gpd.GeoDataFrame(
+        {"GaugeLID": [f"G{seed}_{i}" for i in range(size)], "Latitude": latitude, "Longitude": longitude},
+        geometry=gpd.points_from_xy(longitude, latitude),
+        crs="epsg:4326",
+    )
+    source = folder / f"source_{seed}"
+    source.mkdir()
+    gauges.to_file(source / f"national_shapefile_{tag}.shp")
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for path in sorted(source.iterdir()):
+            tar.add(path, arcname=path.name)
+    return gauges, archive.getvalue()
+
+
+def test_national_shapefile_cache(server, tmp_path):
+    base_url, requests, httpd = server
+    gauges, archive = _national_shapefile(tmp_path, "obs")
+    httpd.files["/national_shapefile_obs.tgz"] = (archive, "Mon, 01 Jan 2024 10:00:00 GMT")
+    cache = NationalShapefileCache(base_url, tmp_path / "cache", max_age=timedelta(0))
+
+    first = cache.shapefile("obs")
+    assert first.parent.name == "obs_20240101T100000Z"
+    assert cache.shapefile("obs") == first
+    assert [r for r in requests if r[0] == "GET"] == [("GET", "/national_shapefile_obs.tgz")]
+
+    # A new validity time is downloaded next to the previous one
+    updated, archive = _national_shapefile(tmp_path, "obs", seed=1)
+    httpd.files["/national_shapefile_obs.tgz"] = (archive, "Mon, 01 Jan 2024 11:00:00 GMT")
+    second = cache.shapefile("obs")
+    assert second.parent.name == "obs_20240101T110000Z" and second != first
+    # Recent extractions are reused without contacting the service
+    calls = len(requests)
+    assert NationalShapefileCache(base_url, tmp_path / "cache").shapefile("obs") == second
+    assert len(requests) == calls
+
+    polygon = MultiPolygon([Polygon([(38, -123), (38, -121.5), (39.5, -121), (39, -123)])])
+    expected = [
+        row.GaugeLID for row in updated.itertuples()
+        if polygon.contains(Point(row.Latitude, row.Longitude))
+    ]
+    assert expected and read_gauges(second, polygon).GaugeLID.tolist() == expected
+
+    httpd.shutdown()
+    offline = NationalShapefileCache(base_url, tmp_path / "cache", offline=True)
+    assert offline.shapefile("obs") == second
+    with pytest.raises(LookupError):
+        offline.shapefile("fcst_f024")
+    assert forecast_tag(0) == "obs" and forecast_tag(1) == "fcst_f024"
+
+
+@pytest.mark.parametrize("data_filter", [True, False])
+def test_extract_rejects_members_outside_target(tmp_path, monkeypatch, data_filter):
+    if not data_filter:
+        # Python versions before 3.11.4 have no extraction filters
+        monkeypatch.delattr(tarfile, "data_filter", raising=False)
+
+    def archive(name, names):
+        path = tmp_path / name
+        with tarfile.open(path, "w:gz") as tar:
+            for member_name in names:
+                info = tarfile.TarInfo(member_name)
+                info.size = 4
+                tar.addfile(info, io.BytesIO(b"data"))
+        return path
+
+    _extract(archive("safe.tgz", ["a/gauges.shp"]), tmp_path / "safe")
+    assert (tmp_path / "safe" / "a" / "gauges.shp").read_bytes() == b"data"
+    with pytest.raises(tarfile.TarError):
+        _extract(archive("unsafe.tgz", ["../escaped.shp"]), tmp_path / "unsafe")
+    assert not (tmp_path / "escaped.shp").exists()
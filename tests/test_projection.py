@@ -0,0 +1,43 @@
+""" Module for testing batch stateplane projections. """
+
+import numpy as np
+import stateplane
+
+from erad.utils import projection
+
+
+def test_from_lonlat_matches_stateplane():
+    rng = np.random.default_rng(0)
+    # Points on both sides of the California zone 2 / zone 3 boundary, in Nevada and offshore
+    longitude = np.concatenate([rng.uniform(-123, -119, 50), [-115.1, -126.0]])
+    latitude = np.concatenate([rng.uniform(37, 39.5, 50), [36.2, 36.0]])
+
+    epsg = projection.identify_stateplanes(longitude, latitude)
+    expected_epsg = [stateplane.identify(lon, lat) for lon, lat in zip(longitude, latitude)]
+    assert epsg.tolist() == expected_epsg and len(set(expected_epsg)) > 2
+
+    x, y = projection.from_lonlat(longitude, latitude)
+    expected = np.array([stateplane.from_lonlat(lon, lat) for lon, lat in zip(longitude, latitude)])
+    assert np.allclose(x, expected[:, 0]) and np.allclose(y, expected[:, 1])
+
+    x, y = projection.from_lonlat(longitude, latitude, epsg[0])
+    expected = np.array([stateplane.from_lonlat(lon, lat, epsg[0]) for lon, lat in zip(longitude, latitude)])
+    assert np.allclose(x, expected[:, 0]) and np.allclose(y, expected[:, 1])
+
+    lon, lat = projection.to_lonlat(x, y, epsg[0])
+    assert np.allclose(lon, longitude) and np.allclose(lat, latitude)
+
+
+def test_missing_coordinates():
+    epsg = projection.identify_stateplanes([np.nan, -122.8], [np.nan, 38.5])
+    assert epsg[0] is None and epsg[1] == stateplane.identify(-122.8, 38.5)
+    x, y = projection.from_lonlat([np.nan, -122.8], [np.nan, 38.5])
+    assert np.isnan(x[0]) and np.isfinite(x[1])
+
+
+def test_first_match_keeps_lowest_zone():
+    point_index = np.array([2, 0, 2, 1, 0, 2])
+    zone_index = np.array([7, 5, 3, 4, 1, 9])
+    points, zones = projection._first_match(point_index, zone_index)
+    assert points.tolist() == [0, 1, 2]
+    assert zones.tolist() == [1, 4, 3]
@@ -0,0 +1,64 @@
+""" Module for testing on-disk cache of scenario results. """
+
+import datetime
+
+import numpy as np
+import shapely
+
+from erad.scenarios.cache import ScenarioResultCache
+from erad.scenarios.common import AssetTable
+from erad.scenarios.earthquake_scenario import EarthquakeScenario
+
+
+def _assets(count=50):
+    rng = np.random.default_rng(0)
+    return {
+        "distribution_poles": {
+            f"pole_{i}": {"coordinates": (37.9 + rng.normal(0, 0.2), -121.7 + rng.normal(0, 0.2))}
+            for i in range(count)
+        },
+        "substation": {"sub_1": {"coordinates": (37.92, -121.72)}},
+    }
+
+
+def _scenario(magnitude=6.5):
+    return EarthquakeScenario(
+        shapely.geometry.Point(-121.72, 37.92),
+        None,
+        datetime.datetime(2020, 1, 1),
+        Magnitude=magnitude,
+        Depth=30.0,
+    )
+
+
+def test_cached_results_match_computed_results(tmp_path):
+    expected = _scenario().calculate_survival_probability(_assets(), None)
+
+    scenario = _scenario()
+    scenario.result_cache = ScenarioResultCache(tmp_path)
+    first = scenario.calculate_survival_probability(_assets(), None)
+    second = scenario.calculate_survival_probability(_assets(), None)
+    table = scenario.calculate_survival_probability(AssetTable.from_dict(_assets()), None)
+
+    assert scenario.result_cache.misses == 1
+    assert scenario.result_cache.hits == 2
+    assert first == expected
+    assert second == expected
+    assert table.to_dict() == expected
+
+    _scenario(magnitude=7.0).calculate_survival_probability(_assets(), None)
+    assert scenario.result_cache.invalidate(scenario=scenario) == 1
+    scenario.calculate_survival_probability(_assets(), None)
+    assert scenario.result_cache.misses == 2
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ScenarioResultCache(tmp_path, max_size_mb=0.005)
+    for magnitude in [5.0, 6.0, 7.0]:
+        scenario = _scenario(magnitude)
+        scenario.result_cache = cache
+        scenario.calculate_survival_probability(_assets(300), None)
+
+    assert cache.size_mb <= 0.005
+    assert len(list(tmp_path.glob("*.npz"))) < 3
+    assert cache.invalidate(scenario=scenario) == 1
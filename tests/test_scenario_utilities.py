@@ -0,0 +1,83 @@
+""" Module for testing scenario utility functions. """
+
+import datetime
+
+import geopy.distance
+import numpy as np
+import shapely
+from shapely.ops import nearest_points
+
+from erad.scenarios.utilities import ProbabilityFunctionBuilder, geodesic_distance
+from erad.scenarios.fire_scenario import FireScenario
+
+
+def test_batch_probabilities_match_scalar_probability():
+
+    probability_function = ProbabilityFunctionBuilder("lognorm", [0.3, 0.25, 0.4])
+    values = np.linspace(0, 3, 50)
+
+    probabilities = probability_function.probabilities(values)
+    assert probabilities.shape == values.shape
+    assert np.array_equal(
+        probabilities, [probability_function.probability(v) for v in values]
+    )
+    assert np.array_equal(
+        probability_function.probabilities(values, complement=True), 1 - probabilities
+    )
+
+
+def test_geodesic_distance_matches_geopy():
+    rng = np.random.default_rng(0)
+    longitude = -122.8 + rng.normal(0, 1, 100)
+    latitude = 38.5 + rng.normal(0, 1, 100)
+
+    distances = geodesic_distance(-122.8, 38.5, longitude, latitude)
+    expected = [
+        geopy.distance.geodesic((38.5, -122.8), (lat, lon)).km
+        for lon, lat in zip(longitude, latitude)
+    ]
+    assert np.allclose(distances, expected, rtol=0, atol=1e-9)
+
+
+def test_distances_from_boundary():
+    polygon = shapely.Polygon(
+        [(-122.85, 38.45), (-122.75, 38.45), (-122.75, 38.55), (-122.85, 38.52)]
+    )
+    scenario = FireScenario(shapely.MultiPolygon([polygon]), None, datetime.datetime.now())
+    rng = np.random.default_rng(0)
+    longitude = -122.8 + rng.normal(0, 0.3, 200)
+    latitude = 38.5 + rng.normal(0, 0.3, 200)
+
+    distances = scenario.distances_from_boundary(longitude, latitude)
+    # Nearest boundary point in lon/lat space and geopy distance, as originally written
+    expected = []
+    for x, y in zip(longitude, latitude):
+        p1, p2 = nearest_points(polygon.boundary, shapely.Point(x, y))
+        expected.append(geopy.distance.geodesic((p1.y, p1.x), (p2.y, p2.x)).km)
+    assert np.allclose(distances, expected, rtol=0, atol=1e-6)
+
+    # Minimum geodesic distance to a densified boundary is the reference
+    boundary = shapely.get_coordinates(shapely.segmentize(polygon.boundary, 0.0001))
+    reference = np.array(
+        [geodesic_distance(boundary[:, 0], boundary[:, 1], x, y).min() for x, y in zip(longitude, latitude)]
+    )
+    projected = scenario.distances_from_boundary(longitude, latitude, projected=True)
+    assert np.all(np.abs(projected - reference) <= 1e-3 * reference + 0.02)
+    assert np.all(distances >= reference - 1e-4)
+
+
+def test_projected_distances_outside_stateplane_zones():
+    # Fire perimeter in Tokyo, far from every stateplane zone
+    polygon = shapely.box(139.70, 35.65, 139.75, 35.70)
+    scenario = FireScenario(shapely.MultiPolygon([polygon]), None, datetime.datetime.now())
+    assert "aeqd" in scenario.projected_crs.to_proj4()
+
+    rng = np.random.default_rng(0)
+    longitude = 139.725 + rng.normal(0, 0.2, 100)
+    latitude = 35.675 + rng.normal(0, 0.2, 100)
+    boundary = shapely.get_coordinates(shapely.segmentize(polygon.boundary, 0.0001))
+    reference = np.array(
+        [geodesic_distance(boundary[:, 0], boundary[:, 1], x, y).min() for x, y in zip(longitude, latitude)]
+    )
+    projected = scenario.distances_from_boundary(longitude, latitude, projected=True)
+    assert np.all(np.abs(projected - reference) <= 1e-3 * reference + 0.02)
@@ -0,0 +1,91 @@
+""" Module for testing gridded parametric wind fields. """
+
+import numpy as np
+
+from erad.scenarios.common import AssetTable, asset_list
+from erad.scenarios.grid import RegularGrid
+from erad.scenarios.utilities import ProbabilityFunctionBuilder
+from erad.scenarios.wind_field import (
+    holland_wind_speed,
+    peak_gust_grid,
+    radius_of_maximum_winds,
+)
+
+
+def test_regular_grid_bilinear_sampling(tmp_path):
+    grid = RegularGrid.from_function(
+        (-123.0, 38.0, -122.0, 39.0), 0.05, lambda lon, lat: 3 * lon - 2 * lat + 1
+    )
+    rng = np.random.default_rng(0)
+    longitude = rng.uniform(-123.0, -122.0, 100)
+    latitude = rng.uniform(38.0, 39.0, 100)
+
+    assert np.allclose(grid.sample(longitude, latitude), 3 * longitude - 2 * latitude + 1)
+    assert np.isnan(grid.sample(-121.0, 38.5))
+
+    grid.save(tmp_path / "grid.npz")
+    loaded = RegularGrid.load(tmp_path / "grid.npz")
+    assert np.array_equal(loaded.values, grid.values)
+
+
+def test_holland_profile_peaks_at_radius_of_maximum_winds():
+    rmax = radius_of_maximum_winds(1013 - 960, 25.0)
+    distances = np.linspace(1, 300, 3000)
+    speeds = holland_wind_speed(distances, 120, 960, 25.0)
+
+    assert np.isclose(speeds.max(), 120, rtol=1e-4)
+    assert abs(distances[np.argmax(speeds)] - rmax) < 0.2
+    assert speeds[-1] < speeds.max() / 2
+
+
+def test_peak_gust_grid_matches_direct_evaluation(tmp_path, synthetic_hurricane):
+    scenario = synthetic_hurricane
+    track = scenario.interpolate_track(scenario.hurricane.track[1].timestamp - scenario.hurricane.track[0].timestamp)
+    bounds = (-122.95, 38.46, -122.80, 38.53)
+    grid = peak_gust_grid(track, bounds, resolution=0.002, cache_directory=tmp_path)
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+    assert np.array_equal(
+        peak_gust_grid(track, bounds, resolution=0.002, cache_directory=tmp_path).values, grid.values
+    )
+
+    rng = np.random.default_rng(0)
+    longitude = rng.uniform(bounds[0], bounds[2], 50)
+    latitude = rng.uniform(bounds[1], bounds[3], 50)
+    direct = np.max(
+        [
+            1.3 * holland_wind_speed(
+                np.array([
+                    np.hypot((lon - s.longitude) * 87.5, (lat - s.latitude) * 111.0)
+                    for lon, lat in zip(longitude, latitude)
+                ]),
+                s.wind_speed_mph,
+                s.pressure_mb,
+                s.latitude,
+            )
+            for s in track
+        ],
+        axis=0,
+    )
+    assert np.allclose(grid.sample(longitude, latitude), direct, rtol=0.01)
+
+
+def test_wind_field_survival_probability(synthetic_hurricane):
+    scenario = synthetic_hurricane
+    assets, _ = asset_list(38.46, -122.95, 38.53, -122.80, samples=40)
+    fragility_curves = {
+        asset_type: ProbabilityFunctionBuilder("lognorm", [0.3, 0, 100]) for asset_type in assets
+    }
+    table = scenario.calculate_survival_probability_from_wind_field(
+        AssetTable.from_dict(assets), fragility_curves
+    )
+    assets = scenario.calculate_survival_probability_from_wind_field(assets, fragility_curves)
+    assert scenario.calculate_survival_probability_from_wind_field({}, fragility_curves) == {}
+
+    assert len(scenario._wind_fields) == 1
+    gusts = table.column("peak_gust_mph")
+    assert np.all(gusts > 0)
+    for asset_type, index in table.groups():
+        expected = 1 - fragility_curves[asset_type].probabilities(gusts[index])
+        assert np.allclose(table.column("survival_probability")[index], expected)
+        name = table.names[index[0]]
+        assert assets[asset_type][name]["survival_probability"] == table.column("survival_probability")[index[0]]